@@ -0,0 +1,117 @@
+"""固定的每host并发数与adaptive(AIMD)自动调整的对比，模拟一个处理能力有限、过载后变慢并拒绝请求的服务端
+服务端同时只处理--capacity个请求，每个耗时--service秒，其余请求排队(首字节时间随之变长)，排队超过--backlog个时直接返回503
+fixed-N 为max_host_clients=N的固定并发，adaptive 以--clients为上限自动调整，统计成功请求的吞吐量、端到端耗时和503数
+运行：python benchmarks/adaptive_concurrency.py --requests 2000
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次发送，不关闭Nagle时每个请求会多等一次延迟确认(约40ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            overloaded = server.waiting >= server.backlog
+            if not overloaded:
+                server.waiting += 1
+        if overloaded:
+            self.reply(503)
+            return
+        with server.workers:
+            with server.lock:
+                server.waiting -= 1
+            time.sleep(server.service)
+        self.reply(200)
+
+    def reply(self, code):
+        body = b'ok'
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LimitedServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port, capacity, service, backlog):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.workers = threading.BoundedSemaphore(capacity)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.service = service
+        self.backlog = backlog
+
+
+async def run(url, requests, clients, host_clients, adaptive):
+    client = await pycurl_client.RequestAsync.create(max_clients=clients, max_host_clients=host_clients,
+                                                     adaptive=adaptive)
+    latencies = []
+    rejected = 0
+
+    async def fetch():
+        nonlocal rejected
+        start = time.perf_counter()
+        response = await client.get(url)
+        if response.http_code == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            rejected += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    limit = client.host_stats()[url.split('/')[2]].get('limit', host_clients)
+    client.close()
+    latencies.sort()
+    return (len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1],
+            rejected, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--capacity', type=int, default=8)
+    parser.add_argument('--service', type=float, default=0.01)
+    parser.add_argument('--backlog', type=int, default=16)
+    parser.add_argument('--port', type=int, default=8395)
+    args = parser.parse_args()
+
+    server = LimitedServer(args.port, args.capacity, args.service, args.backlog)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % args.port
+
+    try:
+        print('%-12s %10s %12s %12s %8s %8s' % ('limit', 'ok req/s', 'median ms', 'p99 ms', '503', 'final'))
+        cases = [('fixed-%d' % args.clients, args.clients, False),
+                 ('fixed-%d' % args.capacity, args.capacity, False),
+                 ('adaptive', args.clients, True)]
+        for name, host_clients, adaptive in cases:
+            rate, median, p99, rejected, limit = asyncio.run(run(url, args.requests, args.clients, host_clients,
+                                                                 adaptive))
+            print('%-12s %10.0f %12.1f %12.1f %8d %8d' % (name, rate, median, p99, rejected, limit))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
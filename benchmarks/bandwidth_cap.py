@@ -0,0 +1,94 @@
+"""整个连接池共用的带宽上限：大量并发下载时合计吞吐量与max_recv_speed的对比
+服务端返回--size字节的响应体，--files个文件以--clients的并发同时下载，大小文件混合(每--mix个文件中有一个是--size的4倍)，
+分别统计不限速和限速--cap MB/s时RequestThread和RequestAsync的合计吞吐量，限速后并发数不变
+运行：python benchmarks/bandwidth_cap.py --files 64 --cap 4
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl_client
+
+CHUNK = b'x' * 65536
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        size = int(self.path.strip('/'))
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        while size > 0:
+            self.wfile.write(CHUNK[:size])
+            size -= len(CHUNK)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def sizes(args):
+    return [args.size * (4 if index % args.mix == 0 else 1) for index in range(args.files)]
+
+
+async def run_async(url, args, cap):
+    # 关闭pipewait，HTTP/1.1下同一host的请求不必等待已有连接的响应
+    client = await pycurl_client.RequestAsync.create(max_clients=args.clients, max_recv_speed=cap, pipewait=False)
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[client.get(url + str(size)) for size in sizes(args)])
+    elapsed = time.perf_counter() - start
+    client.close()
+    return sum(len(response.content) for response in responses) / elapsed / 2 ** 20
+
+
+def run_thread(url, args, cap):
+    client = pycurl_client.RequestThread(max_clients=args.clients, max_recv_speed=cap)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as executor:
+        responses = list(executor.map(lambda size: client.get(url + str(size)), sizes(args)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return sum(len(response.content) for response in responses) / elapsed / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=64)
+    parser.add_argument('--size', type=int, default=2 ** 18)
+    parser.add_argument('--mix', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--cap', type=float, default=4)
+    parser.add_argument('--port', type=int, default=8397)
+    args = parser.parse_args()
+
+    server = Server(('127.0.0.1', args.port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % args.port
+    cap = int(args.cap * 2 ** 20)
+
+    try:
+        print('%-16s %12s %12s' % ('client', 'cap MB/s', 'got MB/s'))
+        for limit in (None, cap):
+            label = '-' if limit is None else '%.1f' % args.cap
+            print('%-16s %12s %12.2f' % ('RequestThread', label, run_thread(url, args, limit)))
+            print('%-16s %12s %12.2f' % ('RequestAsync', label, asyncio.run(run_async(url, args, limit))))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""连接池中每个curl对象各自解析CA证书文件(CAINFO)与所有curl对象共用一个解析好的pycurl.CaStore，建立TLS连接的CPU时间对比
+libcurl 7.87以上会在每个curl对象(所属的multi)内缓存解析结果，旧版本每个新连接都重新解析；无论哪种，CaStore在整个进程内只解析一次
+CA文件为certifi证书包加上测试证书的CA，每次请求都新建连接并校验证书，只统计客户端线程的CPU时间(time.thread_time)
+运行：python benchmarks/ca_store.py --handles 100 --requests 5
+"""
+import os
+import sys
+import ssl
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import certifi
+import pycurl
+
+CERT_DIR = Path(__file__).resolve().parent.parent / 'pycurl' / 'pycurl' / 'pycurl-REL_7_45_2' / 'tests' / 'certs'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(url, ca_path, handles, requests, use_store):
+    start = time.thread_time()
+    store = pycurl.CaStore(cafile=ca_path) if use_store else None
+    for _ in range(handles):
+        # 每个新curl对象相当于发布、扩容或切换代理后新建的连接池成员
+        curl = pycurl.Curl()
+        curl.setopt(pycurl.URL, url)
+        curl.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+        curl.setopt(pycurl.FRESH_CONNECT, 1)
+        curl.setopt(pycurl.FORBID_REUSE, 1)
+        if store is not None:
+            curl.set_ca_store(store)
+        else:
+            curl.setopt(pycurl.CAINFO, ca_path)
+        for _ in range(requests):
+            curl.perform()
+            assert curl.getinfo(pycurl.RESPONSE_CODE) == 200
+        curl.close()
+    elapsed = time.thread_time() - start
+    return elapsed * 1000 / (handles * requests)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handles', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8392)
+    args = parser.parse_args()
+
+    if not hasattr(pycurl, 'CaStore'):
+        sys.exit('pycurl.CaStore需要libcurl使用OpenSSL 1.1.0以上版本')
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(CERT_DIR / 'server.crt'), str(CERT_DIR / 'server.key'))
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'https://localhost:%d/' % args.port
+
+    with tempfile.NamedTemporaryFile('wb', suffix='.pem', delete=False) as bundle:
+        bundle.write(Path(certifi.where()).read_bytes())
+        bundle.write((CERT_DIR / 'ca.crt').read_bytes())
+    try:
+        print('%-10s %18s' % ('trust', 'cpu ms/connection'))
+        for use_store in (False, True):
+            print('%-10s %18.3f' % ('CaStore' if use_store else 'CAINFO', run(url, bundle.name, args.handles, args.requests, use_store)))
+    finally:
+        os.unlink(bundle.name)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
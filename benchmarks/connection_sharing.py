@@ -0,0 +1,119 @@
+"""RequestThread开启share_connections共享连接池前后，每1000个请求新建的连接(TLS握手)次数和吞吐量对比
+服务端统计accept到的连接数，客户端统计CURLINFO_NUM_CONNECTS
+运行：python benchmarks/connection_sharing.py --threads 20 --requests 2000 --hosts 8
+"""
+import sys
+import ssl
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl
+from pycurl_client import RequestThread
+
+CERT_DIR = Path(__file__).resolve().parent.parent / 'pycurl' / 'pycurl' / 'pycurl-REL_7_45_2' / 'tests' / 'certs'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TLSServer(ThreadingHTTPServer):
+    """每个新连接做一次TLS握手，connections记录握手次数"""
+    daemon_threads = True
+
+    def __init__(self, port):
+        super().__init__(('127.0.0.1', port), Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(str(CERT_DIR / 'server.crt'), str(CERT_DIR / 'server.key'))
+        self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        try:
+            request.do_handshake()
+        except (ssl.SSLError, OSError):
+            return
+        with self.lock:
+            self.connections += 1
+        super().finish_request(request, client_address)
+
+
+class CountingRequestThread(RequestThread):
+    """每次请求结束后累加CURLINFO_NUM_CONNECTS"""
+
+    def __init__(self, *args, **kwargs):
+        self.connects = 0
+        self.connects_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _finish(self, curl, response):
+        try:
+            response.content = curl.perform_rb()
+            response.http_code = curl.getinfo(pycurl.RESPONSE_CODE)
+            with self.connects_lock:
+                self.connects += curl.getinfo(pycurl.NUM_CONNECTS)
+        finally:
+            self._put_curl(curl)
+        return response
+
+
+def run(urls, threads, requests, shared):
+    http = CountingRequestThread(max_clients=threads, share_connections=shared)
+    http.verify = False
+
+    def fetch(i):
+        # 轮流访问多个host，单个curl对象的连接缓存(默认5个)装不下所有host时才能看出共享的效果
+        response = http.get(urls[i % len(urls)])
+        assert response.http_code == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - start
+    http.close()
+    return http.connects, requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8391)
+    args = parser.parse_args()
+
+    servers = [TLSServer(args.port + i) for i in range(args.hosts)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = ['https://localhost:%d/' % server.server_address[1] for server in servers]
+
+    print('%-8s %14s %14s %10s' % ('share', 'connects/1000', 'handshakes', 'req/s'))
+    for shared in (False, True):
+        before = sum(server.connections for server in servers)
+        connects, rate = run(urls, args.threads, args.requests, shared)
+        handshakes = sum(server.connections for server in servers) - before
+        print('%-8s %14.1f %14d %10.0f' % ('yes' if shared else 'no', connects * 1000.0 / args.requests,
+                                           handshakes, rate))
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
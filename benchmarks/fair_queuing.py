@@ -0,0 +1,84 @@
+"""一个大任务和几个小任务共用一个RequestAsync时小任务的完成时间：全部在同一个队列(先到先得)与每个任务一个命名队列(DRR)对比
+大任务先一次性提交--big个请求，小任务随后各提交--small个请求，服务端每个请求耗时--delay秒，
+统计每个小任务从提交到全部完成的时间，以及大任务的总耗时
+运行：python benchmarks/fair_queuing.py --big 5000 --jobs 4 --small 50
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl_client
+
+DELAY = 0.005
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run(url, args, named):
+    client = await pycurl_client.RequestAsync.create(max_clients=args.clients)
+    start = time.perf_counter()
+    big = asyncio.gather(*[client.get(url + 'big', queue='big' if named else 'default') for _ in range(args.big)])
+    await asyncio.sleep(0.1)
+
+    async def job(index):
+        queue = 'job%d' % index if named else 'default'
+        job_start = time.perf_counter()
+        await asyncio.gather(*[client.get(url + 'small', queue=queue) for _ in range(args.small)])
+        return time.perf_counter() - job_start
+
+    durations = await asyncio.gather(*[job(index) for index in range(args.jobs)])
+    await big
+    elapsed = time.perf_counter() - start
+    client.close()
+    return statistics.median(durations), max(durations), elapsed
+
+
+def main():
+    global DELAY
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--big', type=int, default=5000)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--small', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=DELAY)
+    parser.add_argument('--port', type=int, default=8396)
+    args = parser.parse_args()
+    DELAY = args.delay
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % args.port
+
+    try:
+        print('%-10s %16s %16s %12s' % ('queues', 'small median s', 'small max s', 'total s'))
+        for name, named in (('shared', False), ('named', True)):
+            median, worst, elapsed = asyncio.run(run(url, args, named))
+            print('%-10s %16.2f %16.2f %12.2f' % (name, median, worst, elapsed))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
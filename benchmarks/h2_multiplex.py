@@ -0,0 +1,53 @@
+"""比较RequestAsync在不同连接策略下访问同一个HTTP/2源站的TLS握手数和吞吐量
+运行：python benchmarks/h2_multiplex.py --requests 2000 --clients 50
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl
+from pycurl_client import RequestAsync
+from h2server import H2Server
+
+POLICIES = {
+    # 每个请求独占连接，相当于没有连接策略时的行为
+    'no-multiplex': dict(pipelining=pycurl.PIPE_NOTHING, pipewait=False),
+    # 默认的HTTP/2友好策略
+    'multiplex': dict(),
+}
+
+
+async def run(server, policy, requests, clients):
+    http = await RequestAsync.create(max_clients=clients, **POLICIES[policy])
+    url = 'https://127.0.0.1:%d/' % server.port
+    server.reset()
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[http.get(url, verify=False) for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    http.close()
+    assert all(response.http_code == 200 for response in responses)
+    return server.stats['connections'], requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.01, help='服务器每个响应的延迟(秒)')
+    parser.add_argument('--port', type=int, default=8443)
+    args = parser.parse_args()
+
+    server = H2Server(port=args.port, delay=args.delay).start()
+    print('%-14s %12s %12s' % ('policy', 'handshakes', 'req/s'))
+    for policy in POLICIES:
+        handshakes, throughput = asyncio.run(run(server, policy, args.requests, args.clients))
+        print('%-14s %12d %12.0f' % (policy, handshakes, throughput))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""基准测试使用的本地HTTP/2服务器，统计TLS握手(连接)数和请求数，依赖h2库(pip install h2)"""
+import ssl
+import asyncio
+import threading
+from pathlib import Path
+
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import RequestReceived, ConnectionTerminated
+from h2.exceptions import ProtocolError, StreamClosedError
+
+CERT_DIR = Path(__file__).resolve().parent.parent / 'pycurl' / 'pycurl' / 'pycurl-REL_7_45_2' / 'tests' / 'certs'
+
+
+class H2Protocol(asyncio.Protocol):
+    """每个请求在delay秒后返回body"""
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.conn = H2Connection(H2Configuration(client_side=False, header_encoding='utf-8'))
+
+    def connection_made(self, transport):
+        self.server.stats['connections'] += 1
+        self.transport = transport
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        try:
+            events = self.conn.receive_data(data)
+        except ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, RequestReceived):
+                self.server.stats['requests'] += 1
+                delay = self.server.delay_for(self.server.stats['requests'])
+                asyncio.get_running_loop().call_later(delay, self.respond, event.stream_id)
+            elif isinstance(event, ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    def respond(self, stream_id):
+        if self.transport.is_closing():
+            return
+        body = self.server.body
+        try:
+            self.conn.send_headers(stream_id, [(':status', '200'), ('content-length', str(len(body)))])
+            self.conn.send_data(stream_id, body, end_stream=True)
+        except StreamClosedError:
+            return
+        self.transport.write(self.conn.data_to_send())
+
+
+class H2Server(object):
+    """在后台线程中运行的HTTP/2服务器，stats记录connections(即TLS握手数)和requests"""
+    def __init__(self, port=8443, delay=0.0, body=b'x' * 1024):
+        self.port = port
+        self.delay = delay
+        self.body = body
+        self.stats = {'connections': 0, 'requests': 0}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._server = None
+
+    def delay_for(self, request_number):
+        """第request_number个请求的响应延迟，子类可以覆盖"""
+        return self.delay
+
+    def start(self):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(str(CERT_DIR / 'server.crt'), str(CERT_DIR / 'server.key'))
+        context.set_alpn_protocols(['h2'])
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            self._loop.create_server(lambda: H2Protocol(self), '127.0.0.1', self.port, ssl=context),
+            self._loop).result()
+        return self
+
+    def reset(self):
+        self.stats = {'connections': 0, 'requests': 0}
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
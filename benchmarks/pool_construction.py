@@ -0,0 +1,96 @@
+"""curl对象池的构建耗时：每个curl对象单独新建并设置选项与从设置好的模板duphandle克隆对比
+fresh 与改动前的RequestThread/RequestAsync相同，每个curl对象都执行Curl()、setopt、证书库设置和impersonate
+clone 只配置一次模板，其余curl对象由duphandle复制选项，再关联share
+最后给出RequestThread和RequestAsync.create构建max_clients个curl对象的总耗时
+运行：python benchmarks/pool_construction.py --handles 1000
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import certifi
+import pycurl
+import pycurl_client
+
+
+def configure(curl, share, target):
+    """改动前每个curl对象都要执行的设置"""
+    curl.setopt(pycurl.NOSIGNAL, 1)
+    curl.setopt(pycurl.ENCODING, '')
+    if share is not None:
+        curl.setopt(pycurl.SHARE, share)
+    pycurl_client._set_ca_path(curl, certifi.where())
+    curl.impersonate(target, 1)
+    curl.setopt(pycurl.PIPEWAIT, 1)
+
+
+def build_fresh(handles, share, target):
+    return [configure(curl, share, target) or curl for curl in (pycurl.Curl() for _ in range(handles))]
+
+
+def build_clone(handles, share, target):
+    template = pycurl.Curl()
+    configure(template, None, target)
+    curls = []
+    for _ in range(handles):
+        curl = template.duphandle()
+        curl.setopt(pycurl.SHARE, share)
+        curls.append(curl)
+    template.close()
+    return curls
+
+
+def measure(build, handles, share, target, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        curls = build(handles, share, target)
+        elapsed = time.perf_counter() - start
+        for curl in curls:
+            curl.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+async def build_async(handles):
+    start = time.perf_counter()
+    client = await pycurl_client.RequestAsync.create(max_clients=handles)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handles', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--target', default='chrome110')
+    args = parser.parse_args()
+
+    share = pycurl.CurlShare()
+    share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+    share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+    # 第一次使用时解析证书文件，不计入对比
+    build_fresh(1, share, args.target)[0].close()
+
+    print('%-16s %12s %16s' % ('build', 'total ms', 'us per handle'))
+    for name, build in (('fresh', build_fresh), ('clone', build_clone)):
+        elapsed = measure(build, args.handles, share, args.target, args.rounds)
+        print('%-16s %12.2f %16.2f' % (name, elapsed, elapsed * 1000 / args.handles))
+
+    start = time.perf_counter()
+    client = pycurl_client.RequestThread(max_clients=args.handles)
+    elapsed = (time.perf_counter() - start) * 1000
+    client.close()
+    print('%-16s %12.2f %16.2f' % ('RequestThread', elapsed, elapsed * 1000 / args.handles))
+    elapsed = asyncio.run(build_async(args.handles))
+    print('%-16s %12.2f %16.2f' % ('RequestAsync', elapsed, elapsed * 1000 / args.handles))
+    share.close()
+
+
+if __name__ == '__main__':
+    main()
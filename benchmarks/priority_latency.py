@@ -0,0 +1,85 @@
+"""交互请求与大量批量请求共用一个RequestAsync时交互请求的等待时间：全部同一priority(先到先得)与交互请求priority=0、批量请求priority=10对比
+批量请求一次性提交，交互请求在此期间每隔--interval秒提交一个，服务端每个请求耗时--delay秒
+运行：python benchmarks/priority_latency.py --batch 2000 --interactive 50
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl_client
+
+DELAY = 0.005
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run(url, args, batch_priority):
+    client = await pycurl_client.RequestAsync.create(max_clients=args.clients)
+    batch = [asyncio.ensure_future(client.get(url + 'batch', priority=batch_priority))
+             for _ in range(args.batch)]
+    latencies = []
+
+    async def interactive():
+        start = time.perf_counter()
+        await client.get(url + 'interactive', priority=0)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    for _ in range(args.interactive):
+        await asyncio.sleep(args.interval)
+        tasks.append(asyncio.ensure_future(interactive()))
+    await asyncio.gather(*tasks)
+    await asyncio.gather(*batch)
+    client.close()
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], latencies[-1]
+
+
+def main():
+    global DELAY
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--interactive', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=DELAY)
+    parser.add_argument('--port', type=int, default=8394)
+    args = parser.parse_args()
+    DELAY = args.delay
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % args.port
+
+    try:
+        print('%-14s %12s %12s %12s' % ('batch', 'median ms', 'p99 ms', 'max ms'))
+        for name, batch_priority in (('same', 0), ('priority=10', 10)):
+            median, p99, worst = asyncio.run(run(url, args, batch_priority))
+            print('%-14s %12.1f %12.1f %12.1f' % (name, median, p99, worst))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""多个线程通过同一个CurlShare共享cookie/dns/ssl会话时的吞吐量，与不共享时对比
+运行：python benchmarks/share_contention.py --threads 64 --requests 200
+"""
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'n=%d' % id(self))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def worker(url, share, requests):
+    curl = pycurl.Curl()
+    curl.setopt(pycurl.NOSIGNAL, 1)
+    curl.setopt(pycurl.URL, url)
+    curl.setopt(pycurl.COOKIEFILE, '')
+    curl.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+    if share is not None:
+        curl.setopt(pycurl.SHARE, share)
+    for _ in range(requests):
+        # 每次都重新解析域名，让所有线程频繁访问共享的DNS缓存和cookie
+        curl.setopt(pycurl.FRESH_CONNECT, 1)
+        curl.perform()
+    curl.close()
+
+
+def run(url, threads, requests, shared):
+    share = None
+    if shared:
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+    workers = [threading.Thread(target=worker, args=(url, share, requests)) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if share is not None:
+        share.close()
+    return threads * requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8390)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://localhost:%d/' % args.port
+
+    print('%-10s %12s' % ('share', 'req/s'))
+    for shared in (False, True):
+        print('%-10s %12.0f' % ('yes' if shared else 'no', run(url, args.threads, args.requests, shared)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""进程重启后第一次连接的TLS握手耗时：不带会话缓存(完整握手)与从会话缓存文件恢复会话(简化握手)对比
+每轮模拟一次重启：新建curl对象和空的SslSessionCache，从上一轮dump()的结果加载会话，统计第一次请求的APPCONNECT_TIME
+服务端为带测试证书的本地HTTPS服务，RTT接近0，实际网络中完整握手还要多一个往返
+运行：python benchmarks/tls_resume.py --restarts 200
+"""
+import sys
+import ssl
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pycurl
+
+CERT_DIR = Path(__file__).resolve().parent.parent / 'pycurl' / 'pycurl' / 'pycurl-REL_7_45_2' / 'tests' / 'certs'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def first_request(url, cache):
+    """新进程中的第一次请求，返回TLS握手完成的耗时(毫秒)"""
+    curl = pycurl.Curl()
+    curl.setopt(pycurl.URL, url)
+    curl.setopt(pycurl.CAINFO, str(CERT_DIR / 'ca.crt'))
+    curl.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+    if cache is not None:
+        curl.set_ssl_session_cache(cache)
+    curl.perform()
+    assert curl.getinfo(pycurl.RESPONSE_CODE) == 200
+    elapsed = (curl.getinfo(pycurl.APPCONNECT_TIME) - curl.getinfo(pycurl.CONNECT_TIME)) * 1000
+    curl.close()
+    return elapsed
+
+
+def run(url, restarts, use_cache):
+    saved = []
+    times = []
+    resumed = 0
+    for _ in range(restarts):
+        cache = None
+        if use_cache:
+            cache = pycurl.SslSessionCache()
+            cache.load(saved)
+        times.append(first_request(url, cache))
+        if use_cache:
+            resumed += cache.stats()['resumed']
+            saved = cache.dump()
+    return statistics.median(times), max(times), resumed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--restarts', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8393)
+    args = parser.parse_args()
+
+    if not hasattr(pycurl, 'SslSessionCache'):
+        sys.exit('pycurl.SslSessionCache需要libcurl使用OpenSSL 1.1.1以上版本')
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(CERT_DIR / 'server.crt'), str(CERT_DIR / 'server.key'))
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'https://localhost:%d/' % args.port
+
+    try:
+        print('%-14s %14s %14s %10s' % ('sessions', 'median ms', 'max ms', 'resumed'))
+        for use_cache in (False, True):
+            median, worst, resumed = run(url, args.restarts, use_cache)
+            print('%-14s %14.3f %14.3f %10d' % ('file' if use_cache else 'none', median, worst, resumed))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -347,6 +347,7 @@ ignore this message.''')
 
         # Recognize --avoid-stdio on Unix so that it can be tested
         self.check_avoid_stdio()
+        self.check_free_threading()
 
     def detect_ssl_lib_from_libcurl_dll(self, libcurl_dll_path):
         ssl_lib_detected = None
@@ -461,6 +462,7 @@ ignore this message.''')
             self.using_openssl()
 
         self.check_avoid_stdio()
+        self.check_free_threading()
 
         # make pycurl binary work on windows xp.
         # we use inet_ntop which was added in vista and implement a fallback.
@@ -493,6 +495,11 @@ ignore this message.''')
         if scan_argv(self.argv, '--avoid-stdio') is not None:
             self.extra_compile_args.append("-DPYCURL_AVOID_STDIO")
 
+    def check_free_threading(self):
+        if ('PYCURL_SETUP_OPTIONS' in os.environ and '--enable-free-threading' in os.environ['PYCURL_SETUP_OPTIONS']) \
+                or scan_argv(self.argv, '--enable-free-threading') is not None:
+            self.define_macros.append(('PYCURL_FREE_THREADING', 1))
+
     def get_curl_version_info(self, dll_path):
         import ctypes
 
@@ -591,9 +598,10 @@ def strip_pycurl_options(argv):
         options = [
             '--curl-dir=', '--libcurl-lib-name=', '--use-libcurl-dll',
             '--avoid-stdio', '--with-openssl', '--openssl-dir=',
+            '--enable-free-threading',
         ]
     else:
-        options = ['--openssl-dir=', '--curl-config=', '--avoid-stdio']
+        options = ['--openssl-dir=', '--curl-config=', '--avoid-stdio', '--enable-free-threading']
     for option in options:
         scan_argv(argv, option)
 
@@ -614,6 +622,7 @@ def get_extension(argv, split_extension_source=False):
     if split_extension_source:
         sources = [
             os.path.join("src", "docstrings.c"),
+            os.path.join("src", "castore.c"),
             os.path.join("src", "easy.c"),
             os.path.join("src", "easycb.c"),
             os.path.join("src", "easyinfo.c"),
@@ -624,6 +633,7 @@ def get_extension(argv, split_extension_source=False):
             os.path.join("src", "oscompat.c"),
             os.path.join("src", "pythoncompat.c"),
             os.path.join("src", "share.c"),
+            os.path.join("src", "sslsession.c"),
             os.path.join("src", "stringcompat.c"),
             os.path.join("src", "threadsupport.c"),
             os.path.join("src", "util.c"),
@@ -902,18 +912,17 @@ in COPYING-LGPL_ and COPYING-MIT_ files in the source distribution.
         'Operating System :: Microsoft :: Windows',
         'Operating System :: POSIX',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
+        'Programming Language :: Python :: 3.13',
         'Topic :: Internet :: File Transfer Protocol (FTP)',
         'Topic :: Internet :: WWW/HTTP',
     ],
     packages=[PY_PACKAGE],
     package_dir={ PY_PACKAGE: os.path.join('python', 'curl') },
-    python_requires='>=3.5',
+    python_requires='>=3.9',
     platforms='All',
 )
 
@@ -929,6 +938,7 @@ PycURL Unix options:
  --with-mbedtls                      libcurl is linked against mbedTLS
  --with-wolfssl                      libcurl is linked against wolfSSL
  --with-sectransp                    libcurl is linked against Secure Transport
+ --enable-free-threading             do not re-enable the GIL on free-threaded Python (experimental)
 '''
 
 windows_help = '''\
@@ -941,6 +951,7 @@ PycURL Windows options:
  --with-openssl                        libcurl is linked against OpenSSL/LibreSSL/BoringSSL
  --with-ssl                            legacy alias for --with-openssl
  --link-arg=foo.lib                    also link against specified library
+ --enable-free-threading               do not re-enable the GIL on free-threaded Python (experimental)
 '''
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+#include "pycurl.h"
+#include "docstrings.h"
+
+#if defined(HAVE_PYCURL_CA_STORE)
+
+/*************************************************************************
+// CurlCaStoreObject
+**************************************************************************/
+
+static char *ca_store_keywords[] = {"cafile", "cadata", NULL};
+
+
+/* constructor */
+PYCURL_INTERNAL CurlCaStoreObject *
+do_ca_store_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
+{
+    pycurl_state *st = pycurl_get_state_by_type(subtype);
+    CurlCaStoreObject *self;
+    PyObject *cafile = Py_None, *cadata = Py_None;
+    PyObject *path = NULL;
+    PyObject *encoded_obj;
+    char *buffer;
+    Py_ssize_t length;
+    int res;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OO:CaStore", ca_store_keywords, &cafile, &cadata)) {
+        return NULL;
+    }
+    if (cafile == Py_None && cadata == Py_None) {
+        PyErr_SetString(PyExc_TypeError, "CaStore requires cafile or cadata");
+        return NULL;
+    }
+
+    self = (CurlCaStoreObject *) subtype->tp_alloc(subtype, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->store = X509_STORE_new();
+    if (self->store == NULL) {
+        Py_DECREF(self);
+        return (CurlCaStoreObject *) PyErr_NoMemory();
+    }
+
+    if (cafile != Py_None) {
+        if (!PyUnicode_FSConverter(cafile, &path)) {
+            goto error;
+        }
+        /* parsing a CA bundle takes a while, let other threads run */
+        Py_BEGIN_ALLOW_THREADS
+        res = X509_STORE_load_locations(self->store, PyBytes_AS_STRING(path), NULL);
+        Py_END_ALLOW_THREADS
+        if (res != 1) {
+            const char *reason = ERR_reason_error_string(ERR_peek_last_error());
+            PyErr_Format(st->error, "cannot load CA certificates from %s: %s",
+                         PyBytes_AS_STRING(path), reason != NULL ? reason : "unknown error");
+            ERR_clear_error();
+            goto error;
+        }
+        Py_CLEAR(path);
+    }
+
+    if (cadata != Py_None) {
+        if (!PyText_Check(cadata) ||
+            PyText_AsStringAndSize(cadata, &buffer, &length, &encoded_obj) != 0) {
+            PyErr_SetString(PyExc_TypeError, "cadata must be a byte string or a Unicode string with ASCII code points only");
+            goto error;
+        }
+        res = add_ca_certs(st, self->store, buffer, length);
+        Py_XDECREF(encoded_obj);
+        if (res != 0) {
+            goto error;
+        }
+    }
+
+    return self;
+
+error:
+    Py_XDECREF(path);
+    Py_DECREF(self);
+    return NULL;
+}
+
+
+PYCURL_INTERNAL void
+do_ca_store_dealloc(CurlCaStoreObject *self)
+{
+    PyTypeObject *tp = Py_TYPE(self);
+
+    if (self->weakreflist != NULL) {
+        PyObject_ClearWeakRefs((PyObject *) self);
+    }
+    /* SSL contexts of open connections hold their own references */
+    if (self->store != NULL) {
+        X509_STORE_free(self->store);
+        self->store = NULL;
+    }
+    tp->tp_free(self);
+    Py_DECREF(tp);
+}
+
+
+/* --------------- type --------------- */
+
+static PyMemberDef curlcastoreobject_members[] = {
+    {"__weaklistoffset__", T_PYSSIZET, offsetof(CurlCaStoreObject, weakreflist), READONLY},
+    {NULL}
+};
+
+static PyType_Slot CurlCaStore_Type_slots[] = {
+    {Py_tp_dealloc, do_ca_store_dealloc},
+    {Py_tp_doc, (void *) ca_store_doc},
+    {Py_tp_members, curlcastoreobject_members},
+    {Py_tp_new, do_ca_store_new},
+    {0, NULL}
+};
+
+PyType_Spec CurlCaStore_Type_spec = {
+    "pycurl.CaStore",
+    sizeof(CurlCaStoreObject),
+    0,
+    Py_TPFLAGS_DEFAULT,
+    CurlCaStore_Type_slots
+};
+
+#endif /* HAVE_PYCURL_CA_STORE */
+
+/* vi:ts=4:et:nowrap
+ */
@@ -7,12 +7,12 @@
 **************************************************************************/
 
 PYCURL_INTERNAL void
-util_curlslist_update(CurlSlistObject **old, struct curl_slist *slist)
+util_curlslist_update(CurlObject *self, CurlSlistObject **old, struct curl_slist *slist)
 {
     /* Decref previous object */
     Py_XDECREF(*old);
     /* Create a new object */
-    *old = PyObject_New(CurlSlistObject, p_CurlSlist_Type);
+    *old = PyObject_New(CurlSlistObject, PYCURL_STATE(self)->curl_slist_type);
     assert(*old != NULL);
     /* Store curl_slist into the new object */
     (*old)->slist = slist;
@@ -20,72 +20,27 @@ util_curlslist_update(CurlSlistObject **old, struct curl_slist *slist)
 
 PYCURL_INTERNAL void
 do_curlslist_dealloc(CurlSlistObject *self) {
+    PyTypeObject *tp = Py_TYPE(self);
+
     if (self->slist != NULL) {
         curl_slist_free_all(self->slist);
         self->slist = NULL;
     }
-    CurlSlist_Type.tp_free(self);
+    tp->tp_free(self);
+    Py_DECREF(tp);
 }
 
-PYCURL_INTERNAL PyTypeObject CurlSlist_Type = {
-#if PY_MAJOR_VERSION >= 3
-    PyVarObject_HEAD_INIT(NULL, 0)
-#else
-    PyObject_HEAD_INIT(NULL)
-    0,                          /* ob_size */
-#endif
-    "pycurl.CurlSlist",         /* tp_name */
-    sizeof(CurlSlistObject),    /* tp_basicsize */
-    0,                          /* tp_itemsize */
-    (destructor)do_curlslist_dealloc, /* tp_dealloc */
-    0,                          /* tp_print / tp_vectorcall_offset */
-    0,                          /* tp_getattr */
-    0,                          /* tp_setattr */
-    0,                          /* tp_reserved / tp_as_async */
-    0,                          /* tp_repr */
-    0,                          /* tp_as_number */
-    0,                          /* tp_as_sequence */
-    0,                          /* tp_as_mapping */
-    0,                          /* tp_hash */
-    0,                          /* tp_call */
-    0,                          /* tp_str */
-    0,                          /* tp_getattro */
-    0,                          /* tp_setattro */
-    0,                          /* tp_as_buffer */
-    0,                          /* tp_flags */
-    0,                          /* tp_doc */
-    0,                          /* tp_traverse */
-    0,                          /* tp_clear */
-    0,                          /* tp_richcompare */
-    0,                          /* tp_weaklistoffset */
-    0,                          /* tp_iter */
-    0,                          /* tp_iternext */
-    0,                          /* tp_methods */
-    0,                          /* tp_members */
-    0,                          /* tp_getset */
-    0,                          /* tp_base */
-    0,                          /* tp_dict */
-    0,                          /* tp_descr_get */
-    0,                          /* tp_descr_set */
-    0,                          /* tp_dictoffset */
-    0,                          /* tp_init */
-    0,                          /* tp_alloc */
-    0,                          /* tp_new */
-    0,                          /* tp_free */
-    0,                          /* tp_is_gc */
-    0,                          /* tp_bases */
-    0,                          /* tp_mro */
-    0,                          /* tp_cache */
-    0,                          /* tp_subclasses */
-    0,                          /* tp_weaklist */
-#if PY_MAJOR_VERSION >= 3
-    0,                          /* tp_del */
-    0,                          /* tp_version_tag */
-    0,                          /* tp_finalize */
-#if PY_VERSION_HEX >= 0x03080000
-    0,                          /* tp_vectorcall */
-#endif
-#endif
+static PyType_Slot CurlSlist_Type_slots[] = {
+    {Py_tp_dealloc, do_curlslist_dealloc},
+    {0, NULL}
+};
+
+PyType_Spec CurlSlist_Type_spec = {
+    "pycurl.CurlSlist",
+    sizeof(CurlSlistObject),
+    0,
+    Py_TPFLAGS_DEFAULT,
+    CurlSlist_Type_slots
 };
 
 
@@ -99,7 +54,7 @@ util_curlhttppost_update(CurlObject *obj, struct curl_httppost *httppost, PyObje
     /* Decref previous object */
     Py_XDECREF(obj->httppost);
     /* Create a new object */
-    obj->httppost = PyObject_New(CurlHttppostObject, p_CurlHttppost_Type);
+    obj->httppost = PyObject_New(CurlHttppostObject, PYCURL_STATE(obj)->curl_httppost_type);
     assert(obj->httppost != NULL);
     /* Store curl_httppost and reflist into the new object */
     obj->httppost->httppost = httppost;
@@ -108,73 +63,28 @@ util_curlhttppost_update(CurlObject *obj, struct curl_httppost *httppost, PyObje
 
 PYCURL_INTERNAL void
 do_curlhttppost_dealloc(CurlHttppostObject *self) {
+    PyTypeObject *tp = Py_TYPE(self);
+
     if (self->httppost != NULL) {
         curl_formfree(self->httppost);
         self->httppost = NULL;
     }
     Py_CLEAR(self->reflist);
-    CurlHttppost_Type.tp_free(self);
+    tp->tp_free(self);
+    Py_DECREF(tp);
 }
 
-PYCURL_INTERNAL PyTypeObject CurlHttppost_Type = {
-#if PY_MAJOR_VERSION >= 3
-    PyVarObject_HEAD_INIT(NULL, 0)
-#else
-    PyObject_HEAD_INIT(NULL)
-    0,                          /* ob_size */
-#endif
-    "pycurl.CurlHttppost",      /* tp_name */
-    sizeof(CurlHttppostObject), /* tp_basicsize */
-    0,                          /* tp_itemsize */
-    (destructor)do_curlhttppost_dealloc, /* tp_dealloc */
-    0,                          /* tp_print / tp_vectorcall_offset */
-    0,                          /* tp_getattr */
-    0,                          /* tp_setattr */
-    0,                          /* tp_reserved / tp_as_async */
-    0,                          /* tp_repr */
-    0,                          /* tp_as_number */
-    0,                          /* tp_as_sequence */
-    0,                          /* tp_as_mapping */
-    0,                          /* tp_hash */
-    0,                          /* tp_call */
-    0,                          /* tp_str */
-    0,                          /* tp_getattro */
-    0,                          /* tp_setattro */
-    0,                          /* tp_as_buffer */
-    0,                          /* tp_flags */
-    0,                          /* tp_doc */
-    0,                          /* tp_traverse */
-    0,                          /* tp_clear */
-    0,                          /* tp_richcompare */
-    0,                          /* tp_weaklistoffset */
-    0,                          /* tp_iter */
-    0,                          /* tp_iternext */
-    0,                          /* tp_methods */
-    0,                          /* tp_members */
-    0,                          /* tp_getset */
-    0,                          /* tp_base */
-    0,                          /* tp_dict */
-    0,                          /* tp_descr_get */
-    0,                          /* tp_descr_set */
-    0,                          /* tp_dictoffset */
-    0,                          /* tp_init */
-    0,                          /* tp_alloc */
-    0,                          /* tp_new */
-    0,                          /* tp_free */
-    0,                          /* tp_is_gc */
-    0,                          /* tp_bases */
-    0,                          /* tp_mro */
-    0,                          /* tp_cache */
-    0,                          /* tp_subclasses */
-    0,                          /* tp_weaklist */
-#if PY_MAJOR_VERSION >= 3
-    0,                          /* tp_del */
-    0,                          /* tp_version_tag */
-    0,                          /* tp_finalize */
-#if PY_VERSION_HEX >= 0x03080000
-    0,                          /* tp_vectorcall */
-#endif
-#endif
+static PyType_Slot CurlHttppost_Type_slots[] = {
+    {Py_tp_dealloc, do_curlhttppost_dealloc},
+    {0, NULL}
+};
+
+PyType_Spec CurlHttppost_Type_spec = {
+    "pycurl.CurlHttppost",
+    sizeof(CurlHttppostObject),
+    0,
+    Py_TPFLAGS_DEFAULT,
+    CurlHttppost_Type_slots
 };
 
 
@@ -188,7 +98,7 @@ PYCURL_INTERNAL void
 assert_curl_state(const CurlObject *self)
 {
     assert(self != NULL);
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_Curl_Type) == 1);
+    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) PYCURL_STATE(self)->curl_type) == 1);
 #ifdef WITH_THREAD
     (void) pycurl_get_thread_state(self);
 #endif
@@ -201,12 +111,16 @@ check_curl_state(const CurlObject *self, int flags, const char *name)
 {
     assert_curl_state(self);
     if ((flags & 1) && self->handle == NULL) {
-        PyErr_Format(ErrorObject, "cannot invoke %s() - no curl handle", name);
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - no curl handle", name);
+        return -1;
+    }
+    if ((flags & 1) && PYCURL_INHERITED(self)) {
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - curl handle was inherited across fork(), use duphandle()", name);
         return -1;
     }
 #ifdef WITH_THREAD
     if ((flags & 2) && pycurl_get_thread_state(self) != NULL) {
-        PyErr_Format(ErrorObject, "cannot invoke %s() - perform() is currently running", name);
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - perform() is currently running", name);
         return -1;
     }
 #endif
@@ -252,8 +166,8 @@ util_curl_init(CurlObject *self)
     }
 
     /* Set default USERAGENT */
-    assert(g_pycurl_useragent);
-    res = curl_easy_setopt(self->handle, CURLOPT_USERAGENT, g_pycurl_useragent);
+    assert(PYCURL_STATE(self)->useragent);
+    res = curl_easy_setopt(self->handle, CURLOPT_USERAGENT, PYCURL_STATE(self)->useragent);
     if (res != CURLE_OK) {
         return (-1);
     }
@@ -268,7 +182,7 @@ do_curl_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
     int res;
     int *ptr;
 
-    if (subtype == p_Curl_Type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
+    if (subtype == pycurl_get_state_by_type(subtype)->curl_type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
         return NULL;
     }
 
@@ -284,6 +198,7 @@ do_curl_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
             assert(*ptr == 0);
 
     /* Initialize curl handle */
+    self->fork_generation = pycurl_fork_generation;
     self->handle = curl_easy_init();
     if (self->handle == NULL)
         goto error;
@@ -296,7 +211,7 @@ do_curl_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
 
 error:
     Py_DECREF(self);    /* this also closes self->handle */
-    PyErr_SetString(ErrorObject, "initializing curl failed");
+    PyErr_SetString(pycurl_get_state_by_type(subtype)->error, "initializing curl failed");
     return NULL;
 }
 
@@ -321,7 +236,9 @@ do_curl_duphandle(CurlObject *self)
         ++ptr)
             assert(*ptr == 0);
 
-    /* Clone the curl handle */
+    /* Clone the curl handle. Cloning only copies options, so it is also
+     * how a handle inherited across fork() is brought back to life. */
+    dup->fork_generation = pycurl_fork_generation;
     dup->handle = curl_easy_duphandle(self->handle);
     if (dup->handle == NULL)
         goto error;
@@ -416,6 +333,24 @@ do_curl_duphandle(CurlObject *self)
 
     /* Assign and incref ca certs related references */
     dup->ca_certs_obj = my_Py_XNewRef(self->ca_certs_obj);
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    /* a session cache inherited across fork() cannot be used, the clone of
+     * a template from the parent process starts without one */
+    if (self->ssl_session_cache != NULL &&
+        !PYCURL_INHERITED((CurlSslSessionCacheObject *) self->ssl_session_cache)) {
+        dup->ssl_session_cache = my_Py_NewRef(self->ssl_session_cache);
+    }
+    if (dup->ssl_session_cache != NULL) {
+        curl_easy_setopt(dup->handle, CURLOPT_SSL_CTX_DATA, dup);
+    } else if (self->ssl_session_cache != NULL && dup->ca_certs_obj == NULL) {
+        /* only the inherited cache needed the callback */
+        curl_easy_setopt(dup->handle, CURLOPT_SSL_CTX_FUNCTION, NULL);
+    }
+#endif
+    /* ssl_ctx_callback() is called with the handle whose options it uses */
+    if (dup->ca_certs_obj != NULL) {
+        curl_easy_setopt(dup->handle, CURLOPT_SSL_CTX_DATA, dup);
+    }
 
     /* Assign and incref every curl_slist allocated by setopt */
     dup->httpheader = (CurlSlistObject *)my_Py_XNewRef((PyObject *)self->httpheader);
@@ -446,7 +381,7 @@ do_curl_duphandle(CurlObject *self)
 error:
     Py_CLEAR(dup->dict);
     Py_DECREF(dup);    /* this also closes dup->handle */
-    PyErr_SetString(ErrorObject, "cloning curl failed");
+    PyErr_SetString(PYCURL_STATE(self)->error, "cloning curl failed");
     return NULL;
 }
 
@@ -531,6 +466,9 @@ util_curl_xdecref(CurlObject *self, int flags, CURL *handle)
     if (flags & PYCURL_MEMGROUP_CACERTS) {
         /* Decrement refcounts for ca certs related references. */
         Py_CLEAR(self->ca_certs_obj);
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+        Py_CLEAR(self->ssl_session_cache);
+#endif
     }
 
     if (flags & PYCURL_MEMGROUP_SLIST) {
@@ -565,7 +503,7 @@ util_curl_close(CurlObject *self)
     /* Zero handle and thread-state to disallow any operations to be run
      * from now on */
     assert(self != NULL);
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_Curl_Type) == 1);
+    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) PYCURL_STATE(self)->curl_type) == 1);
     handle = self->handle;
     self->handle = NULL;
     if (handle == NULL) {
@@ -582,15 +520,23 @@ util_curl_close(CurlObject *self)
     self->state = NULL;
 #endif
 
-    /* Decref multi stuff which uses this handle */
-    util_curl_xdecref(self, PYCURL_MEMGROUP_MULTI, handle);
-    /* Decref share which uses this handle */
-    util_curl_xdecref(self, PYCURL_MEMGROUP_SHARE, handle);
+    if (PYCURL_INHERITED(self)) {
+        /* The handle's connections, TLS state and share belong to the
+         * parent process. Cleaning it up here could shut down the parent's
+         * connections or wait on a share lock that was held during fork(),
+         * so the libcurl handle is leaked instead. */
+        util_curl_xdecref(self, PYCURL_MEMGROUP_MULTI | PYCURL_MEMGROUP_SHARE, NULL);
+    } else {
+        /* Decref multi stuff which uses this handle */
+        util_curl_xdecref(self, PYCURL_MEMGROUP_MULTI, handle);
+        /* Decref share which uses this handle */
+        util_curl_xdecref(self, PYCURL_MEMGROUP_SHARE, handle);
 
-    /* Cleanup curl handle - must be done without the gil */
-    Py_BEGIN_ALLOW_THREADS
-    curl_easy_cleanup(handle);
-    Py_END_ALLOW_THREADS
+        /* Cleanup curl handle - must be done without the gil */
+        Py_BEGIN_ALLOW_THREADS
+        curl_easy_cleanup(handle);
+        Py_END_ALLOW_THREADS
+    }
     handle = NULL;
 
     /* Decref easy related objects */
@@ -605,19 +551,22 @@ util_curl_close(CurlObject *self)
 PYCURL_INTERNAL void
 do_curl_dealloc(CurlObject *self)
 {
+    PyTypeObject *tp = Py_TYPE(self);
+
     PyObject_GC_UnTrack(self);
     CPy_TRASHCAN_BEGIN(self, do_curl_dealloc);
 
     Py_CLEAR(self->dict);
     util_curl_close(self);
 
-    Curl_Type.tp_free(self);
+    tp->tp_free(self);
+    Py_DECREF(tp);
     CPy_TRASHCAN_END(self);
 }
 
 
 static PyObject *
-do_curl_close(CurlObject *self)
+util_curl_close_checked(CurlObject *self)
 {
     if (check_curl_state(self, 2, "close") != 0) {
         return NULL;
@@ -627,6 +576,26 @@ do_curl_close(CurlObject *self)
 }
 
 
+static PyObject *
+do_curl_close(CurlObject *self, PyObject *Py_UNUSED(ignored))
+{
+    PyObject *multi_stack, *res;
+
+    /* closing removes the handle from its multi stack, which changes the
+     * multi object as well */
+    Py_BEGIN_CRITICAL_SECTION(self);
+    multi_stack = (PyObject *) self->multi_stack;
+    Py_XINCREF(multi_stack);
+    Py_END_CRITICAL_SECTION();
+
+    Py_BEGIN_CRITICAL_SECTION2(self, multi_stack != NULL ? multi_stack : (PyObject *) self);
+    res = util_curl_close_checked(self);
+    Py_END_CRITICAL_SECTION2();
+    Py_XDECREF(multi_stack);
+    return res;
+}
+
+
 /* ------------------------ impersonate ------------------------ */
 
 PYCURL_INTERNAL PyObject *
@@ -681,6 +650,7 @@ do_curl_traverse(CurlObject *self, visitproc visit, void *arg)
 #undef VISIT
 #define VISIT(v)    if ((v) != NULL && ((err = visit(v, arg)) != 0)) return err
 
+    VISIT((PyObject *) Py_TYPE(self));
     VISIT(self->dict);
     VISIT((PyObject *) self->multi_stack);
     VISIT((PyObject *) self->share);
@@ -709,6 +679,9 @@ do_curl_traverse(CurlObject *self, visitproc visit, void *arg)
     VISIT(self->postfields_obj);
 
     VISIT(self->ca_certs_obj);
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    VISIT(self->ssl_session_cache);
+#endif
 
     VISIT((PyObject *) self->httpheader);
 #if LIBCURL_VERSION_NUM >= MAKE_LIBCURL_VERSION(7, 37, 0)
@@ -750,8 +723,8 @@ do_curl_reset(CurlObject *self)
 
     res = util_curl_init(self);
     if (res < 0) {
+        PyErr_SetString(PYCURL_STATE(self)->error, "resetting curl failed");
         Py_DECREF(self);    /* this also closes self->handle */
-        PyErr_SetString(ErrorObject, "resetting curl failed");
         return NULL;
     }
 
@@ -779,24 +752,54 @@ static PyObject *do_curl_setstate(CurlObject *self, PyObject *args)
 
 /* --------------- methods --------------- */
 
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_errstr_locked, do_curl_errstr, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_errstr_raw_locked, do_curl_errstr_raw, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_getinfo_locked, do_curl_getinfo, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_getinfo_raw_locked, do_curl_getinfo_raw, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_pause_locked, do_curl_pause, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_perform_locked, do_curl_perform, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_perform_rb_locked, do_curl_perform_rb, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_perform_rs_locked, do_curl_perform_rs, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_setopt_locked, do_curl_setopt, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_setopt_string_locked, do_curl_setopt_string, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_impersonate_locked, do_curl_impersonate, CurlObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_unsetopt_locked, do_curl_unsetopt, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_reset_locked, do_curl_reset, CurlObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curl_duphandle_locked, do_curl_duphandle, CurlObject)
+#if defined(HAVE_CURL_OPENSSL)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_set_ca_certs_locked, do_curl_set_ca_certs, CurlObject)
+#endif
+#if defined(HAVE_PYCURL_CA_STORE)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_set_ca_store_locked, do_curl_set_ca_store, CurlObject)
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+PYCURL_LOCKED_METHOD_VARARGS(do_curl_set_ssl_session_cache_locked, do_curl_set_ssl_session_cache, CurlObject)
+#endif
+
 PYCURL_INTERNAL PyMethodDef curlobject_methods[] = {
     {"close", (PyCFunction)do_curl_close, METH_NOARGS, curl_close_doc},
-    {"errstr", (PyCFunction)do_curl_errstr, METH_NOARGS, curl_errstr_doc},
-    {"errstr_raw", (PyCFunction)do_curl_errstr_raw, METH_NOARGS, curl_errstr_raw_doc},
-    {"getinfo", (PyCFunction)do_curl_getinfo, METH_VARARGS, curl_getinfo_doc},
-    {"getinfo_raw", (PyCFunction)do_curl_getinfo_raw, METH_VARARGS, curl_getinfo_raw_doc},
-    {"pause", (PyCFunction)do_curl_pause, METH_VARARGS, curl_pause_doc},
-    {"perform", (PyCFunction)do_curl_perform, METH_NOARGS, curl_perform_doc},
-    {"perform_rb", (PyCFunction)do_curl_perform_rb, METH_NOARGS, curl_perform_rb_doc},
-    {"perform_rs", (PyCFunction)do_curl_perform_rs, METH_NOARGS, curl_perform_rs_doc},
-    {"setopt", (PyCFunction)do_curl_setopt, METH_VARARGS, curl_setopt_doc},
-    {"setopt_string", (PyCFunction)do_curl_setopt_string, METH_VARARGS, curl_setopt_string_doc},
-    {"impersonate", (PyCFunction)do_curl_impersonate, METH_VARARGS, curl_setopt_string_doc},
-    {"unsetopt", (PyCFunction)do_curl_unsetopt, METH_VARARGS, curl_unsetopt_doc},
-    {"reset", (PyCFunction)do_curl_reset, METH_NOARGS, curl_reset_doc},
-    {"duphandle", (PyCFunction)do_curl_duphandle, METH_NOARGS, curl_duphandle_doc},
+    {"errstr", (PyCFunction)do_curl_errstr_locked, METH_NOARGS, curl_errstr_doc},
+    {"errstr_raw", (PyCFunction)do_curl_errstr_raw_locked, METH_NOARGS, curl_errstr_raw_doc},
+    {"getinfo", (PyCFunction)do_curl_getinfo_locked, METH_VARARGS, curl_getinfo_doc},
+    {"getinfo_raw", (PyCFunction)do_curl_getinfo_raw_locked, METH_VARARGS, curl_getinfo_raw_doc},
+    {"pause", (PyCFunction)do_curl_pause_locked, METH_VARARGS, curl_pause_doc},
+    {"perform", (PyCFunction)do_curl_perform_locked, METH_NOARGS, curl_perform_doc},
+    {"perform_rb", (PyCFunction)do_curl_perform_rb_locked, METH_NOARGS, curl_perform_rb_doc},
+    {"perform_rs", (PyCFunction)do_curl_perform_rs_locked, METH_NOARGS, curl_perform_rs_doc},
+    {"setopt", (PyCFunction)do_curl_setopt_locked, METH_VARARGS, curl_setopt_doc},
+    {"setopt_string", (PyCFunction)do_curl_setopt_string_locked, METH_VARARGS, curl_setopt_string_doc},
+    {"impersonate", (PyCFunction)do_curl_impersonate_locked, METH_VARARGS, curl_setopt_string_doc},
+    {"unsetopt", (PyCFunction)do_curl_unsetopt_locked, METH_VARARGS, curl_unsetopt_doc},
+    {"reset", (PyCFunction)do_curl_reset_locked, METH_NOARGS, curl_reset_doc},
+    {"duphandle", (PyCFunction)do_curl_duphandle_locked, METH_NOARGS, curl_duphandle_doc},
 #if defined(HAVE_CURL_OPENSSL)
-    {"set_ca_certs", (PyCFunction)do_curl_set_ca_certs, METH_VARARGS, curl_set_ca_certs_doc},
+    {"set_ca_certs", (PyCFunction)do_curl_set_ca_certs_locked, METH_VARARGS, curl_set_ca_certs_doc},
+#endif
+#if defined(HAVE_PYCURL_CA_STORE)
+    {"set_ca_store", (PyCFunction)do_curl_set_ca_store_locked, METH_VARARGS, curl_set_ca_store_doc},
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    {"set_ssl_session_cache", (PyCFunction)do_curl_set_ssl_session_cache_locked, METH_VARARGS, curl_set_ssl_session_cache_doc},
 #endif
     {"__getstate__", (PyCFunction)do_curl_getstate, METH_NOARGS, NULL},
     {"__setstate__", (PyCFunction)do_curl_setstate, METH_VARARGS, NULL},
@@ -806,9 +809,6 @@ PYCURL_INTERNAL PyMethodDef curlobject_methods[] = {
 
 /* --------------- setattr/getattr --------------- */
 
-
-#if PY_MAJOR_VERSION >= 3
-
 PYCURL_INTERNAL PyObject *
 do_curl_getattro(PyObject *o, PyObject *n)
 {
@@ -816,8 +816,10 @@ do_curl_getattro(PyObject *o, PyObject *n)
     if( !v && PyErr_ExceptionMatches(PyExc_AttributeError) )
     {
         PyErr_Clear();
+        Py_BEGIN_CRITICAL_SECTION(o);
         v = my_getattro(o, n, ((CurlObject *)o)->dict,
-                        curlobject_constants, curlobject_methods);
+                        PYCURL_STATE(o)->curlobject_constants, curlobject_methods);
+        Py_END_CRITICAL_SECTION();
     }
     return v;
 }
@@ -825,84 +827,42 @@ do_curl_getattro(PyObject *o, PyObject *n)
 PYCURL_INTERNAL int
 do_curl_setattro(PyObject *o, PyObject *name, PyObject *v)
 {
+    int res;
+
     assert_curl_state((CurlObject *)o);
-    return my_setattro(&((CurlObject *)o)->dict, name, v);
+    Py_BEGIN_CRITICAL_SECTION(o);
+    res = my_setattro(&((CurlObject *)o)->dict, name, v);
+    Py_END_CRITICAL_SECTION();
+    return res;
 }
 
-#else /* PY_MAJOR_VERSION >= 3 */
 
-PYCURL_INTERNAL PyObject *
-do_curl_getattr(CurlObject *co, char *name)
-{
-    assert_curl_state(co);
-    return my_getattr((PyObject *)co, name, co->dict,
-                      curlobject_constants, curlobject_methods);
-}
+/* --------------- type --------------- */
 
-PYCURL_INTERNAL int
-do_curl_setattr(CurlObject *co, char *name, PyObject *v)
-{
-    assert_curl_state(co);
-    return my_setattr(&co->dict, name, v);
-}
+static PyMemberDef curlobject_members[] = {
+    {"__weaklistoffset__", T_PYSSIZET, offsetof(CurlObject, weakreflist), READONLY},
+    {NULL}
+};
+
+static PyType_Slot Curl_Type_slots[] = {
+    {Py_tp_dealloc, do_curl_dealloc},
+    {Py_tp_getattro, do_curl_getattro},
+    {Py_tp_setattro, do_curl_setattro},
+    {Py_tp_doc, (void *) curl_doc},
+    {Py_tp_traverse, do_curl_traverse},
+    {Py_tp_clear, do_curl_clear},
+    {Py_tp_methods, curlobject_methods},
+    {Py_tp_members, curlobject_members},
+    {Py_tp_new, do_curl_new},
+    {0, NULL}
+};
 
-#endif /* PY_MAJOR_VERSION >= 3 */
-
-PYCURL_INTERNAL PyTypeObject Curl_Type = {
-#if PY_MAJOR_VERSION >= 3
-    PyVarObject_HEAD_INIT(NULL, 0)
-#else
-    PyObject_HEAD_INIT(NULL)
-    0,                          /* ob_size */
-#endif
-    "pycurl.Curl",              /* tp_name */
-    sizeof(CurlObject),         /* tp_basicsize */
-    0,                          /* tp_itemsize */
-    (destructor)do_curl_dealloc, /* tp_dealloc */
-    0,                          /* tp_print */
-#if PY_MAJOR_VERSION >= 3
-    0,                          /* tp_getattr */
-    0,                          /* tp_setattr */
-#else
-    (getattrfunc)do_curl_getattr,  /* tp_getattr */
-    (setattrfunc)do_curl_setattr,  /* tp_setattr */
-#endif
-    0,                          /* tp_reserved */
-    0,                          /* tp_repr */
-    0,                          /* tp_as_number */
-    0,                          /* tp_as_sequence */
-    0,                          /* tp_as_mapping */
-    0,                          /* tp_hash  */
-    0,                          /* tp_call */
-    0,                          /* tp_str */
-#if PY_MAJOR_VERSION >= 3
-    (getattrofunc)do_curl_getattro, /* tp_getattro */
-    (setattrofunc)do_curl_setattro, /* tp_setattro */
-#else
-    0,                          /* tp_getattro */
-    0,                          /* tp_setattro */
-#endif
-    0,                          /* tp_as_buffer */
-    PYCURL_TYPE_FLAGS,          /* tp_flags */
-    curl_doc,                   /* tp_doc */
-    (traverseproc)do_curl_traverse, /* tp_traverse */
-    (inquiry)do_curl_clear,     /* tp_clear */
-    0,                          /* tp_richcompare */
-    offsetof(CurlObject, weakreflist), /* tp_weaklistoffset */
-    0,                          /* tp_iter */
-    0,                          /* tp_iternext */
-    curlobject_methods,         /* tp_methods */
-    0,                          /* tp_members */
-    0,                          /* tp_getset */
-    0,                          /* tp_base */
-    0,                          /* tp_dict */
-    0,                          /* tp_descr_get */
-    0,                          /* tp_descr_set */
-    0,                          /* tp_dictoffset */
-    0,                          /* tp_init */
-    PyType_GenericAlloc,        /* tp_alloc */
-    (newfunc)do_curl_new,       /* tp_new */
-    PyObject_GC_Del,            /* tp_free */
+PyType_Spec Curl_Type_spec = {
+    "pycurl.Curl",
+    sizeof(CurlObject),
+    0,
+    PYCURL_TYPE_FLAGS,
+    Curl_Type_slots
 };
 
 /* vi:ts=4:et:nowrap
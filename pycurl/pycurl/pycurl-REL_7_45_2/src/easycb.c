@@ -30,7 +30,7 @@ util_write_callback(int flags, char *ptr, size_t size, size_t nmemb, void *strea
         goto done;
     total_size = (int)(size * nmemb);
     if (total_size < 0 || (size_t)total_size / size != nmemb) {
-        PyErr_SetString(ErrorObject, "integer overflow in write callback");
+        PyErr_SetString(PYCURL_STATE(self)->error, "integer overflow in write callback");
         goto verbose_error;
     }
 
@@ -56,7 +56,7 @@ util_write_callback(int flags, char *ptr, size_t size, size_t nmemb, void *strea
         ret = (size_t) PyLong_AsLong(result);
     }
     else {
-        PyErr_SetString(ErrorObject, "write callback must return int or None");
+        PyErr_SetString(PYCURL_STATE(self)->error, "write callback must return int or None");
         goto verbose_error;
     }
 
@@ -87,7 +87,7 @@ header_callback(char *ptr, size_t size, size_t nmemb, void *stream)
 /* convert protocol address from C to python, returns a tuple of protocol
    specific values */
 static PyObject *
-convert_protocol_address(struct sockaddr* saddr, unsigned int saddrlen)
+convert_protocol_address(pycurl_state *st, struct sockaddr* saddr, unsigned int saddrlen)
 {
     PyObject *res_obj = NULL;
 
@@ -104,7 +104,7 @@ convert_protocol_address(struct sockaddr* saddr, unsigned int saddrlen)
             }
 
             if (inet_ntop(saddr->sa_family, &sin->sin_addr, addr_str, INET_ADDRSTRLEN) == NULL) {
-                PyErr_SetFromErrno(ErrorObject);
+                PyErr_SetFromErrno(st->error);
                 PyMem_Free(addr_str);
                 goto error;
             }
@@ -123,7 +123,7 @@ convert_protocol_address(struct sockaddr* saddr, unsigned int saddrlen)
             }
 
             if (inet_ntop(saddr->sa_family, &sin6->sin6_addr, addr_str, INET6_ADDRSTRLEN) == NULL) {
-                PyErr_SetFromErrno(ErrorObject);
+                PyErr_SetFromErrno(st->error);
                 PyMem_Free(addr_str);
                 goto error;
             }
@@ -148,7 +148,7 @@ convert_protocol_address(struct sockaddr* saddr, unsigned int saddrlen)
     default:
         /* We (currently) only support IPv4/6 addresses.  Can curl even be used
            with anything else? */
-        PyErr_SetString(ErrorObject, "Unsupported address family");
+        PyErr_SetString(st->error, "Unsupported address family");
     }
 
 error:
@@ -174,7 +174,7 @@ opensocket_callback(void *clientp, curlsocktype purpose,
     self = (CurlObject *)clientp;
     PYCURL_ACQUIRE_THREAD();
 
-    converted_address = convert_protocol_address(&address->addr, address->addrlen);
+    converted_address = convert_protocol_address(PYCURL_STATE(self), &address->addr, address->addrlen);
     if (converted_address == NULL) {
         goto verbose_error;
     }
@@ -184,7 +184,7 @@ opensocket_callback(void *clientp, curlsocktype purpose,
         Py_DECREF(converted_address);
         goto verbose_error;
     }
-    python_address = PyObject_Call(curl_sockaddr_type, arglist, NULL);
+    python_address = PyObject_Call(PYCURL_STATE(self)->curl_sockaddr_type, arglist, NULL);
     Py_DECREF(arglist);
     if (python_address == NULL) {
         goto verbose_error;
@@ -220,11 +220,11 @@ opensocket_callback(void *clientp, curlsocktype purpose,
 #endif
             goto done;
         } else {
-            PyErr_SetString(ErrorObject, "Open socket callback returned an object whose fileno method did not return an integer");
+            PyErr_SetString(PYCURL_STATE(self)->error, "Open socket callback returned an object whose fileno method did not return an integer");
             ret = CURL_SOCKET_BAD;
         }
     } else {
-        PyErr_SetString(ErrorObject, "Open socket callback's return value must be a socket");
+        PyErr_SetString(PYCURL_STATE(self)->error, "Open socket callback's return value must be a socket");
         ret = CURL_SOCKET_BAD;
         goto verbose_error;
     }
@@ -349,7 +349,7 @@ verbose_error:
 
 #ifdef HAVE_CURL_7_19_6_OPTS
 static PyObject *
-khkey_to_object(const struct curl_khkey *khkey)
+khkey_to_object(pycurl_state *st, const struct curl_khkey *khkey)
 {
     PyObject *arglist, *ret;
 
@@ -376,7 +376,7 @@ khkey_to_object(const struct curl_khkey *khkey)
         return NULL;
     }
 
-    ret = PyObject_Call(khkey_type, arglist, NULL);
+    ret = PyObject_Call(st->khkey_type, arglist, NULL);
     Py_DECREF(arglist);
     return ret;
 }
@@ -397,11 +397,11 @@ ssh_key_cb(CURL *easy, const struct curl_khkey *knownkey,
     self = (CurlObject *)clientp;
     PYCURL_ACQUIRE_THREAD();
 
-    knownkey_obj = khkey_to_object(knownkey);
+    knownkey_obj = khkey_to_object(PYCURL_STATE(self), knownkey);
     if (knownkey_obj == NULL) {
         goto silent_error;
     }
-    foundkey_obj = khkey_to_object(foundkey);
+    foundkey_obj = khkey_to_object(PYCURL_STATE(self), foundkey);
     if (foundkey_obj == NULL) {
         goto silent_error;
     }
@@ -500,13 +500,13 @@ seek_callback(void *stream, curl_off_t offset, int origin)
     else if (PyInt_Check(result)) {
         int ret_code = PyInt_AsLong(result);
         if (ret_code < 0 || ret_code > 2) {
-            PyErr_Format(ErrorObject, "invalid return value for seek callback %d not in (0, 1, 2)", ret_code);
+            PyErr_Format(PYCURL_STATE(self)->error, "invalid return value for seek callback %d not in (0, 1, 2)", ret_code);
             goto verbose_error;
         }
         ret = ret_code;    /* pass the return code from the callback */
     }
     else {
-        PyErr_SetString(ErrorObject, "seek callback must return 0 (CURL_SEEKFUNC_OK), 1 (CURL_SEEKFUNC_FAIL), 2 (CURL_SEEKFUNC_CANTSEEK) or None");
+        PyErr_SetString(PYCURL_STATE(self)->error, "seek callback must return 0 (CURL_SEEKFUNC_OK), 1 (CURL_SEEKFUNC_FAIL), 2 (CURL_SEEKFUNC_CANTSEEK) or None");
         goto verbose_error;
     }
 
@@ -546,7 +546,7 @@ read_callback(char *ptr, size_t size, size_t nmemb, void *stream)
         goto done;
     total_size = (int)(size * nmemb);
     if (total_size < 0 || (size_t)total_size / size != nmemb) {
-        PyErr_SetString(ErrorObject, "integer overflow in read callback");
+        PyErr_SetString(PYCURL_STATE(self)->error, "integer overflow in read callback");
         goto verbose_error;
     }
 
@@ -566,7 +566,7 @@ read_callback(char *ptr, size_t size, size_t nmemb, void *stream)
         Py_ssize_t r;
         r = PyByteStr_AsStringAndSize(result, &buf, &obj_size);
         if (r != 0 || obj_size < 0 || obj_size > total_size) {
-            PyErr_Format(ErrorObject, "invalid return value for read callback (%ld bytes returned when at most %ld bytes were wanted)", (long)obj_size, (long)total_size);
+            PyErr_Format(PYCURL_STATE(self)->error, "invalid return value for read callback (%ld bytes returned when at most %ld bytes were wanted)", (long)obj_size, (long)total_size);
             goto verbose_error;
         }
         memcpy(ptr, buf, obj_size);
@@ -601,7 +601,7 @@ read_callback(char *ptr, size_t size, size_t nmemb, void *stream)
         r = PyByteStr_AsStringAndSize(encoded, &buf, &obj_size);
         if (r != 0 || obj_size < 0 || obj_size > total_size) {
             Py_DECREF(encoded);
-            PyErr_Format(ErrorObject, "invalid return value for read callback (%ld bytes returned after encoding to utf-8 when at most %ld bytes were wanted)", (long)obj_size, (long)total_size);
+            PyErr_Format(PYCURL_STATE(self)->error, "invalid return value for read callback (%ld bytes returned after encoding to utf-8 when at most %ld bytes were wanted)", (long)obj_size, (long)total_size);
             goto verbose_error;
         }
         memcpy(ptr, buf, obj_size);
@@ -624,7 +624,7 @@ read_callback(char *ptr, size_t size, size_t nmemb, void *stream)
     }
     else {
     type_error:
-        PyErr_SetString(ErrorObject, "read callback must return a byte string or Unicode string with ASCII code points only");
+        PyErr_SetString(PYCURL_STATE(self)->error, "read callback must return a byte string or Unicode string with ASCII code points only");
         goto verbose_error;
     }
 
@@ -763,7 +763,7 @@ debug_callback(CURL *curlobj, curl_infotype type,
     if (self->debug_cb == NULL)
         goto silent_error;
     if ((int)total_size < 0 || (size_t)((int)total_size) != total_size) {
-        PyErr_SetString(ErrorObject, "integer overflow in debug callback");
+        PyErr_SetString(PYCURL_STATE(self)->error, "integer overflow in debug callback");
         goto verbose_error;
     }
 
@@ -828,7 +828,7 @@ ioctl_callback(CURL *curlobj, int cmd, void *stream)
     else if (PyInt_Check(result)) {
         ret = (int) PyInt_AsLong(result);
         if (ret >= CURLIOE_LAST || ret < 0) {
-            PyErr_SetString(ErrorObject, "ioctl callback returned invalid value");
+            PyErr_SetString(PYCURL_STATE(self)->error, "ioctl callback returned invalid value");
             goto verbose_error;
         }
     }
@@ -844,13 +844,13 @@ verbose_error:
 
 
 #if defined(HAVE_CURL_OPENSSL)
-/* internal helper that load certificates from buffer, returns -1 on error  */
-static int
-add_ca_certs(SSL_CTX *context, void *data, Py_ssize_t len)
+/* internal helper that load certificates from buffer into store,
+ * returns -1 on error  */
+PYCURL_INTERNAL int
+add_ca_certs(pycurl_state *st, X509_STORE *store, void *data, Py_ssize_t len)
 {
     // this code was copied from _ssl module
     BIO *biobuf = NULL;
-    X509_STORE *store;
     int retval = 0, err, loaded = 0;
 
     if (len <= 0) {
@@ -870,7 +870,6 @@ add_ca_certs(SSL_CTX *context, void *data, Py_ssize_t len)
         return -1;
     }
 
-    store = SSL_CTX_get_cert_store(context);
     assert(store != NULL);
 
     while (1) {
@@ -904,7 +903,7 @@ add_ca_certs(SSL_CTX *context, void *data, Py_ssize_t len)
         ERR_clear_error();
         retval = 0;
     } else {
-        PyErr_SetString(ErrorObject, ERR_reason_error_string(err));
+        PyErr_SetString(st->error, ERR_reason_error_string(err));
         ERR_clear_error();
         retval = -1;
     }
@@ -914,6 +913,10 @@ add_ca_certs(SSL_CTX *context, void *data, Py_ssize_t len)
 }
 
 
+/* installed by set_ca_certs(), set_ca_store() and set_ssl_session_cache()
+ * with ptr being the handle, these do not change during a transfer. A
+ * CaStore and a session cache are used without running Python code, the
+ * GIL is only needed for certificates that have to be parsed. */
 PYCURL_INTERNAL CURLcode
 ssl_ctx_callback(CURL *curl, void *ssl_ctx, void *ptr)
 {
@@ -921,21 +924,53 @@ ssl_ctx_callback(CURL *curl, void *ssl_ctx, void *ptr)
     PYCURL_DECLARE_THREAD_STATE;
     int r;
 
-    UNUSED(curl);
-
-    /* acquire thread */
     self = (CurlObject *)ptr;
-    if (!PYCURL_ACQUIRE_THREAD())
-        return CURLE_FAILED_INIT;
 
-    r = add_ca_certs((SSL_CTX*)ssl_ctx,
-                         PyBytes_AS_STRING(self->ca_certs_obj),
-                         PyBytes_GET_SIZE(self->ca_certs_obj));
+    if (self->ca_certs_obj != NULL && PyBytes_Check(self->ca_certs_obj)) {
+        /* acquire thread */
+        if (!PYCURL_ACQUIRE_THREAD())
+            return CURLE_FAILED_INIT;
+
+        r = add_ca_certs(PYCURL_STATE(self), SSL_CTX_get_cert_store((SSL_CTX*)ssl_ctx),
+                             PyBytes_AS_STRING(self->ca_certs_obj),
+                             PyBytes_GET_SIZE(self->ca_certs_obj));
+
+        if (r != 0)
+            PyErr_Print();
+
+        PYCURL_RELEASE_THREAD();
+        if (r != 0)
+            return CURLE_FAILED_INIT;
+    }
+#if defined(HAVE_PYCURL_CA_STORE)
+    else if (self->ca_certs_obj != NULL) {
+        X509_STORE *store = ((CurlCaStoreObject *) self->ca_certs_obj)->store;
+        X509_STORE *curl_store = SSL_CTX_get_cert_store((SSL_CTX *) ssl_ctx);
+
+        if (!X509_STORE_up_ref(store))
+            return CURLE_OUT_OF_MEMORY;
+        /* the shared store has no per-handle flags, keep the ones libcurl
+         * set on its own store (such as X509_V_FLAG_PARTIAL_CHAIN) in the
+         * parameters of the context, which take precedence */
+        if (curl_store != NULL) {
+            X509_VERIFY_PARAM_set_flags(SSL_CTX_get0_param((SSL_CTX *) ssl_ctx),
+                                        X509_VERIFY_PARAM_get_flags(X509_STORE_get0_param(curl_store)));
+        }
+        /* releases the store libcurl created for the context */
+        SSL_CTX_set_cert_store((SSL_CTX *) ssl_ctx, store);
+    }
+#endif
 
-    if (r != 0)
-        PyErr_Print();
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    if (self->ssl_session_cache != NULL) {
+        CurlSslSessionCacheObject *cache = (CurlSslSessionCacheObject *) self->ssl_session_cache;
 
-    PYCURL_RELEASE_THREAD();
-    return r == 0 ? CURLE_OK : CURLE_FAILED_INIT;
+        if (ssl_session_cache_attach(cache->cache, curl, (SSL_CTX *) ssl_ctx) != 0)
+            return CURLE_OUT_OF_MEMORY;
+    }
+#else
+    UNUSED(curl);
+#endif
+    return CURLE_OK;
 }
 #endif
@@ -209,6 +209,17 @@ do_curl_setopt_string_impl(CurlObject *self, int option, PyObject *obj)
     PyObject *encoded_obj;
     int res;
 
+#if defined(HAVE_PYCURL_CA_STORE)
+    /* a CaStore replaces the certificate store that libcurl fills from
+     * these options, refuse instead of silently ignoring them */
+    if ((option == CURLOPT_CAINFO || option == CURLOPT_CAPATH || option == CURLOPT_CRLFILE) &&
+        self->ca_certs_obj != NULL && !PyBytes_Check(self->ca_certs_obj)) {
+        PyErr_SetString(PYCURL_STATE(self)->error,
+                        "cannot set CAINFO, CAPATH or CRLFILE on a handle using a CaStore, call set_ca_store(None) first");
+        return NULL;
+    }
+#endif
+
     /* Check that the option specified a string as well as the input */
     switch (option) {
     case CURLOPT_CAINFO:
@@ -796,7 +807,7 @@ do_curl_setopt_list(CurlObject *self, int option, int which, PyObject *obj)
     }
     /* Finally, decref previous slist object and replace it with a
      * new one. */
-    util_curlslist_update(old_slist_obj, slist);
+    util_curlslist_update(self, old_slist_obj, slist);
 
     Py_RETURN_NONE;
 }
@@ -938,7 +949,7 @@ do_curl_setopt_share(CurlObject *self, PyObject *obj)
 
     if (self->share) {
         if (obj != Py_None) {
-            PyErr_SetString(ErrorObject, "Curl object already sharing. Unshare first.");
+            PyErr_SetString(PYCURL_STATE(self)->error, "Curl object already sharing. Unshare first.");
             return NULL;
         }
         else {
@@ -952,12 +963,18 @@ do_curl_setopt_share(CurlObject *self, PyObject *obj)
             Py_RETURN_NONE;
         }
     }
-    if (Py_TYPE(obj) != p_CurlShare_Type) {
+    if (Py_TYPE(obj) != PYCURL_STATE(self)->curl_share_type) {
         PyErr_SetString(PyExc_TypeError, "invalid arguments to setopt");
         return NULL;
     }
     share = (CurlShareObject*)obj;
+    if (PYCURL_INHERITED(share)) {
+        PyErr_SetString(PYCURL_STATE(self)->error, "CurlShare object was inherited across fork()");
+        return NULL;
+    }
+    Py_BEGIN_CRITICAL_SECTION(share);
     res = curl_easy_setopt(self->handle, CURLOPT_SHARE, share->share_handle);
+    Py_END_CRITICAL_SECTION();
     if (res != CURLE_OK) {
         CURLERROR_RETVAL();
     }
@@ -1186,3 +1203,123 @@ do_curl_set_ca_certs(CurlObject *self, PyObject *args)
     Py_RETURN_NONE;
 }
 #endif
+
+
+#if defined(HAVE_PYCURL_CA_STORE)
+/* use a shared CaStore for new connections, None detaches the store */
+PYCURL_INTERNAL PyObject *
+do_curl_set_ca_store(CurlObject *self, PyObject *args)
+{
+    PyObject *store;
+    int res;
+
+    if (!PyArg_ParseTuple(args, "O:set_ca_store", &store))
+        return NULL;
+    if (store != Py_None && !PyObject_TypeCheck(store, PYCURL_STATE(self)->curl_ca_store_type)) {
+        PyErr_SetString(PyExc_TypeError, "set_ca_store argument must be a CaStore or None");
+        return NULL;
+    }
+    if (check_curl_state(self, 1 | 2, "set_ca_store") != 0)
+        return NULL;
+
+    if (store == Py_None) {
+        if (self->ca_certs_obj != NULL && !PyBytes_Check(self->ca_certs_obj)) {
+            Py_CLEAR(self->ca_certs_obj);
+            /* the callback is still needed for the session cache */
+            if (self->ssl_session_cache == NULL) {
+                res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_FUNCTION, NULL);
+                if (res != CURLE_OK) {
+                    CURLERROR_RETVAL();
+                }
+            }
+        }
+        Py_RETURN_NONE;
+    }
+
+    /* the callback replaces the certificate store of every new SSL context,
+     * do not let libcurl parse its CA bundle or CRLs for each connection
+     * first, they would not be used */
+    res = curl_easy_setopt(self->handle, CURLOPT_CAINFO, NULL);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+    res = curl_easy_setopt(self->handle, CURLOPT_CAPATH, NULL);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+    res = curl_easy_setopt(self->handle, CURLOPT_CRLFILE, NULL);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+
+    res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_FUNCTION, (curl_ssl_ctx_callback) ssl_ctx_callback);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+
+    res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_DATA, self);
+    if (res != CURLE_OK) {
+        curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_FUNCTION, NULL);
+        CURLERROR_RETVAL();
+    }
+
+    /* keeps the X509_STORE alive, also for handles cloned by duphandle() */
+    Py_CLEAR(self->ca_certs_obj);
+    Py_INCREF(store);
+    self->ca_certs_obj = store;
+
+    Py_RETURN_NONE;
+}
+#endif
+
+
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+/* resume TLS sessions from a SslSessionCache, None detaches the cache */
+PYCURL_INTERNAL PyObject *
+do_curl_set_ssl_session_cache(CurlObject *self, PyObject *args)
+{
+    PyObject *cache;
+    int res;
+
+    if (!PyArg_ParseTuple(args, "O:set_ssl_session_cache", &cache))
+        return NULL;
+    if (cache != Py_None && !PyObject_TypeCheck(cache, PYCURL_STATE(self)->curl_ssl_session_cache_type)) {
+        PyErr_SetString(PyExc_TypeError, "set_ssl_session_cache argument must be a SslSessionCache or None");
+        return NULL;
+    }
+    if (check_curl_state(self, 1 | 2, "set_ssl_session_cache") != 0)
+        return NULL;
+    if (cache != Py_None && PYCURL_INHERITED((CurlSslSessionCacheObject *) cache)) {
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot use a session cache inherited across fork()");
+        return NULL;
+    }
+
+    if (cache == Py_None) {
+        Py_CLEAR(self->ssl_session_cache);
+        /* the callback is still needed for the ca certs */
+        if (self->ca_certs_obj == NULL) {
+            res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_FUNCTION, NULL);
+            if (res != CURLE_OK) {
+                CURLERROR_RETVAL();
+            }
+        }
+        Py_RETURN_NONE;
+    }
+
+    res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_FUNCTION, (curl_ssl_ctx_callback) ssl_ctx_callback);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+
+    res = curl_easy_setopt(self->handle, CURLOPT_SSL_CTX_DATA, self);
+    if (res != CURLE_OK) {
+        CURLERROR_RETVAL();
+    }
+
+    Py_CLEAR(self->ssl_session_cache);
+    Py_INCREF(cache);
+    self->ssl_session_cache = cache;
+
+    Py_RETURN_NONE;
+}
+#endif
@@ -28,17 +28,7 @@ do_curl_perform_rb(CurlObject *self)
 {
     PyObject *v, *io;
     
-    /* NOTE: this tuple is never freed. */
-    static PyObject *empty_tuple = NULL;
-    
-    if (empty_tuple == NULL) {
-        empty_tuple = PyTuple_New(0);
-        if (empty_tuple == NULL) {
-            return NULL;
-        }
-    }
-    
-    io = PyObject_Call(bytesio, empty_tuple, NULL);
+    io = PyObject_CallNoArgs(PYCURL_STATE(self)->bytesio);
     if (io == NULL) {
         return NULL;
     }
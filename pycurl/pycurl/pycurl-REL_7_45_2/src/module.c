@@ -11,35 +11,46 @@
 
 #define PYCURL_VERSION_PREFIX "PycURL/" PYCURL_VERSION_STRING
 
-/* needed for compatibility with python < 3.10, as suggested at:
- * https://docs.python.org/3.10/whatsnew/3.10.html#id2 */
-#if PY_VERSION_HEX < 0x030900A4
-#  define Py_SET_TYPE(obj, type) ((Py_TYPE(obj) = (type)), (void)0)
-#endif
-
 PYCURL_INTERNAL char *empty_keywords[] = { NULL };
 
-PYCURL_INTERNAL PyObject *bytesio = NULL;
-PYCURL_INTERNAL PyObject *stringio = NULL;
 
-/* Initialized during module init */
-PYCURL_INTERNAL char *g_pycurl_useragent = NULL;
+PYCURL_INTERNAL pycurl_state *
+pycurl_get_state(PyObject *module)
+{
+    void *st = PyModule_GetState(module);
+    assert(st != NULL);
+    return (pycurl_state *) st;
+}
 
-/* Type objects */
-PYCURL_INTERNAL PyObject *ErrorObject = NULL;
-PYCURL_INTERNAL PyTypeObject *p_Curl_Type = NULL;
-PYCURL_INTERNAL PyTypeObject *p_CurlSlist_Type = NULL;
-PYCURL_INTERNAL PyTypeObject *p_CurlHttppost_Type = NULL;
-PYCURL_INTERNAL PyTypeObject *p_CurlMulti_Type = NULL;
-PYCURL_INTERNAL PyTypeObject *p_CurlShare_Type = NULL;
-#ifdef HAVE_CURL_7_19_6_OPTS
-PYCURL_INTERNAL PyObject *khkey_type = NULL;
-#endif
-PYCURL_INTERNAL PyObject *curl_sockaddr_type = NULL;
+/* Returns the state of the pycurl module that defined `type' or one of
+ * its bases, which allows Python subclasses of Curl and friends. */
+PYCURL_INTERNAL pycurl_state *
+pycurl_get_state_by_type(PyTypeObject *type)
+{
+#if PY_VERSION_HEX >= 0x030B0000
+    PyObject *module = PyType_GetModuleByDef(type, &curlmodule);
+    assert(module != NULL);
+    return pycurl_get_state(module);
+#else
+    PyObject *mro = type->tp_mro;
+    Py_ssize_t i;
 
-PYCURL_INTERNAL PyObject *curlobject_constants = NULL;
-PYCURL_INTERNAL PyObject *curlmultiobject_constants = NULL;
-PYCURL_INTERNAL PyObject *curlshareobject_constants = NULL;
+    assert(mro != NULL);
+    for (i = 0; i < PyTuple_GET_SIZE(mro); i++) {
+        PyTypeObject *base = (PyTypeObject *) PyTuple_GET_ITEM(mro, i);
+        PyObject *module;
+
+        if (!(base->tp_flags & Py_TPFLAGS_HEAPTYPE))
+            continue;
+        /* only types created with PyType_FromModuleAndSpec have a module */
+        module = ((PyHeapTypeObject *) base)->ht_module;
+        if (module != NULL && PyModule_GetDef(module) == &curlmodule)
+            return pycurl_get_state(module);
+    }
+    assert(0);
+    return NULL;
+#endif
+}
 
 
 /* List of functions defined in this module */
@@ -73,7 +84,6 @@ do_global_init(PyObject *dummy, PyObject *args)
 {
     int res, option;
 
-    UNUSED(dummy);
     if (!PyArg_ParseTuple(args, "i:global_init", &option)) {
         return NULL;
     }
@@ -85,7 +95,7 @@ do_global_init(PyObject *dummy, PyObject *args)
 
     res = curl_global_init(option);
     if (res != CURLE_OK) {
-        PyErr_SetString(ErrorObject, "unable to set global option");
+        PyErr_SetString(pycurl_get_state(dummy)->error, "unable to set global option");
         return NULL;
     }
 
@@ -124,13 +134,12 @@ do_version_info(PyObject *dummy, PyObject *args)
     Py_ssize_t i;
     int stamp = CURLVERSION_NOW;
 
-    UNUSED(dummy);
     if (!PyArg_ParseTuple(args, "|i:version_info", &stamp)) {
         return NULL;
     }
     vi = curl_version_info((CURLversion) stamp);
     if (vi == NULL) {
-        PyErr_SetString(ErrorObject, "unable to get version info");
+        PyErr_SetString(pycurl_get_state(dummy)->error, "unable to get version info");
         return NULL;
     }
 
@@ -270,65 +279,106 @@ insint_worker(PyObject *d, PyObject *extra, char *name, long value)
 
 #define insint_c(d, name, value) \
     do { \
-        if (insint_worker(d, curlobject_constants, name, value) < 0) \
+        if (insint_worker(d, st->curlobject_constants, name, value) < 0) \
             goto error; \
     } while(0)
 
 #define insint_m(d, name, value) \
     do { \
-        if (insint_worker(d, curlmultiobject_constants, name, value) < 0) \
+        if (insint_worker(d, st->curlmultiobject_constants, name, value) < 0) \
             goto error; \
     } while(0)
 
 #define insint_s(d, name, value) \
     do { \
-        if (insint_worker(d, curlshareobject_constants, name, value) < 0) \
+        if (insint_worker(d, st->curlshareobject_constants, name, value) < 0) \
             goto error; \
     } while(0)
 
 
-#if PY_MAJOR_VERSION >= 3
-/* Used in Python 3 only, and even then this function seems to never get
- * called. Python 2 has no module cleanup:
- * http://stackoverflow.com/questions/20741856/run-a-function-when-a-c-extension-module-is-freed-on-python-2
- */
-static void do_curlmod_free(void *unused) {
-    PyMem_Free(g_pycurl_useragent);
-    g_pycurl_useragent = NULL;
+static int
+do_curlmod_traverse(PyObject *m, visitproc visit, void *arg)
+{
+    pycurl_state *st = pycurl_get_state(m);
+
+    Py_VISIT(st->error);
+    Py_VISIT(st->curl_type);
+    Py_VISIT(st->curl_slist_type);
+    Py_VISIT(st->curl_httppost_type);
+    Py_VISIT(st->curl_multi_type);
+    Py_VISIT(st->curl_share_type);
+    Py_VISIT(st->curl_ca_store_type);
+    Py_VISIT(st->curl_ssl_session_cache_type);
+    Py_VISIT(st->khkey_type);
+    Py_VISIT(st->curl_sockaddr_type);
+    Py_VISIT(st->curlobject_constants);
+    Py_VISIT(st->curlmultiobject_constants);
+    Py_VISIT(st->curlshareobject_constants);
+    Py_VISIT(st->bytesio);
+    Py_VISIT(st->stringio);
+    return 0;
 }
 
-static PyModuleDef curlmodule = {
-    PyModuleDef_HEAD_INIT,
-    "pycurl",           /* m_name */
-    pycurl_module_doc,  /* m_doc */
-    -1,                 /* m_size */
-    curl_methods,       /* m_methods */
-    NULL,               /* m_reload */
-    NULL,               /* m_traverse */
-    NULL,               /* m_clear */
-    do_curlmod_free     /* m_free */
-};
-#endif
+static int
+do_curlmod_clear(PyObject *m)
+{
+    pycurl_state *st = pycurl_get_state(m);
+
+    Py_CLEAR(st->error);
+    Py_CLEAR(st->curl_type);
+    Py_CLEAR(st->curl_slist_type);
+    Py_CLEAR(st->curl_httppost_type);
+    Py_CLEAR(st->curl_multi_type);
+    Py_CLEAR(st->curl_share_type);
+    Py_CLEAR(st->curl_ca_store_type);
+    Py_CLEAR(st->curl_ssl_session_cache_type);
+    Py_CLEAR(st->khkey_type);
+    Py_CLEAR(st->curl_sockaddr_type);
+    Py_CLEAR(st->curlobject_constants);
+    Py_CLEAR(st->curlmultiobject_constants);
+    Py_CLEAR(st->curlshareobject_constants);
+    Py_CLEAR(st->bytesio);
+    Py_CLEAR(st->stringio);
+    return 0;
+}
 
+static void
+do_curlmod_free(void *m)
+{
+    pycurl_state *st = pycurl_get_state((PyObject *) m);
 
-#if PY_MAJOR_VERSION >= 3
-#define PYCURL_MODINIT_RETURN_NULL return NULL
-PyMODINIT_FUNC PyInit_pycurl(void)
-#else
-#define PYCURL_MODINIT_RETURN_NULL return
-/* Initialization function for the module */
-#if defined(PyMODINIT_FUNC)
-PyMODINIT_FUNC
-#else
-#if defined(__cplusplus)
-extern "C"
-#endif
-DL_EXPORT(void)
-#endif
-initpycurl(void)
+    do_curlmod_clear((PyObject *) m);
+    PyMem_Free(st->useragent);
+    st->useragent = NULL;
+}
+
+
+static int
+add_type(PyObject *m, PyType_Spec *spec, PyTypeObject **type)
+{
+    *type = (PyTypeObject *) PyType_FromModuleAndSpec(m, spec, NULL);
+    if (*type == NULL)
+        return -1;
+    return 0;
+}
+
+#define add_type_modinit(m, spec, type) \
+    if (add_type(m, spec, type) < 0) \
+        goto error
+
+
+#if defined(PYCURL_NEED_SSL_TSL)
+/* ssl locks are process wide, set up by the first interpreter that
+ * imports pycurl */
+static int pycurl_ssl_initialized = 0;
 #endif
+
+
+static int
+do_curlmod_exec(PyObject *m)
 {
-    PyObject *m, *d;
+    pycurl_state *st = pycurl_get_state(m);
+    PyObject *d;
     const curl_version_info_data *vi;
     const char *libcurl_version;
     size_t libcurl_version_len, pycurl_version_len;
@@ -346,10 +396,6 @@ initpycurl(void)
     const char *runtime_ssl_lib;
 #endif
 
-    assert(Curl_Type.tp_weaklistoffset > 0);
-    assert(CurlMulti_Type.tp_weaklistoffset > 0);
-    assert(CurlShare_Type.tp_weaklistoffset > 0);
-
     /* Check the version, as this has caused nasty problems in
      * some cases. */
     vi = curl_version_info(CURLVERSION_NOW);
@@ -422,67 +468,39 @@ initpycurl(void)
     }
 #endif
 
-    /* Initialize the type of the new type objects here; doing it here
-     * is required for portability to Windows without requiring C++. */
-    p_Curl_Type = &Curl_Type;
-    p_CurlSlist_Type = &CurlSlist_Type;
-    p_CurlHttppost_Type = &CurlHttppost_Type;
-    p_CurlMulti_Type = &CurlMulti_Type;
-    p_CurlShare_Type = &CurlShare_Type;
-    Py_SET_TYPE(&Curl_Type, &PyType_Type);
-    Py_SET_TYPE(&CurlSlist_Type, &PyType_Type);
-    Py_SET_TYPE(&CurlHttppost_Type, &PyType_Type);
-    Py_SET_TYPE(&CurlMulti_Type, &PyType_Type);
-    Py_SET_TYPE(&CurlShare_Type, &PyType_Type);
-
-    /* Create the module and add the functions */
-    if (PyType_Ready(&Curl_Type) < 0)
-        goto error;
-
-    if (PyType_Ready(&CurlSlist_Type) < 0)
-        goto error;
-
-    if (PyType_Ready(&CurlHttppost_Type) < 0)
-        goto error;
-
-    if (PyType_Ready(&CurlMulti_Type) < 0)
-        goto error;
-
-    if (PyType_Ready(&CurlShare_Type) < 0)
-        goto error;
-
-
-#if PY_MAJOR_VERSION >= 3
-    m = PyModule_Create(&curlmodule);
-    if (m == NULL)
-        goto error;
-#else
-    /* returns a borrowed reference, XDECREFing it crashes the interpreter */
-    m = Py_InitModule3("pycurl", curl_methods, pycurl_module_doc);
-    if (m == NULL || !PyModule_Check(m))
-        goto error;
+    /* Create the types, they are owned by the module state */
+    add_type_modinit(m, &Curl_Type_spec, &st->curl_type);
+    add_type_modinit(m, &CurlSlist_Type_spec, &st->curl_slist_type);
+    add_type_modinit(m, &CurlHttppost_Type_spec, &st->curl_httppost_type);
+    add_type_modinit(m, &CurlMulti_Type_spec, &st->curl_multi_type);
+    add_type_modinit(m, &CurlShare_Type_spec, &st->curl_share_type);
+#if defined(HAVE_PYCURL_CA_STORE)
+    add_type_modinit(m, &CurlCaStore_Type_spec, &st->curl_ca_store_type);
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    add_type_modinit(m, &CurlSslSessionCache_Type_spec, &st->curl_ssl_session_cache_type);
 #endif
 
     /* Add error object to the module */
     d = PyModule_GetDict(m);
     assert(d != NULL);
-    ErrorObject = PyErr_NewException("pycurl.error", NULL, NULL);
-    if (ErrorObject == NULL)
+    st->error = PyErr_NewException("pycurl.error", NULL, NULL);
+    if (st->error == NULL)
         goto error;
-    if (PyDict_SetItemString(d, "error", ErrorObject) < 0) {
+    if (PyDict_SetItemString(d, "error", st->error) < 0) {
         goto error;
     }
 
-    curlobject_constants = PyDict_New();
-    if (curlobject_constants == NULL)
+    st->curlobject_constants = PyDict_New();
+    if (st->curlobject_constants == NULL)
         goto error;
 
-    curlmultiobject_constants = PyDict_New();
-    if (curlmultiobject_constants == NULL)
+    st->curlmultiobject_constants = PyDict_New();
+    if (st->curlmultiobject_constants == NULL)
         goto error;
 
-    curlshareobject_constants = PyDict_New();
-    if (curlshareobject_constants == NULL)
+    st->curlshareobject_constants = PyDict_New();
+    if (st->curlshareobject_constants == NULL)
         goto error;
 
     /* Add version strings to the module */
@@ -493,24 +511,35 @@ initpycurl(void)
      * replaced with the space; libcurl_version_len does not include
      * terminating null. */
     pycurl_version_len = PYCURL_VERSION_PREFIX_SIZE + libcurl_version_len + 1;
-    g_pycurl_useragent = PyMem_New(char, pycurl_version_len);
-    if (g_pycurl_useragent == NULL)
+    st->useragent = PyMem_New(char, pycurl_version_len);
+    if (st->useragent == NULL)
         goto error;
-    memcpy(g_pycurl_useragent, PYCURL_VERSION_PREFIX, PYCURL_VERSION_PREFIX_SIZE);
-    g_pycurl_useragent[PYCURL_VERSION_PREFIX_SIZE-1] = ' ';
-    memcpy(g_pycurl_useragent + PYCURL_VERSION_PREFIX_SIZE,
+    memcpy(st->useragent, PYCURL_VERSION_PREFIX, PYCURL_VERSION_PREFIX_SIZE);
+    st->useragent[PYCURL_VERSION_PREFIX_SIZE-1] = ' ';
+    memcpy(st->useragent + PYCURL_VERSION_PREFIX_SIZE,
         libcurl_version, libcurl_version_len);
-    g_pycurl_useragent[pycurl_version_len - 1] = 0;
+    st->useragent[pycurl_version_len - 1] = 0;
 #undef PYCURL_VERSION_PREFIX_SIZE
 
-    insstr_modinit(d, "version", g_pycurl_useragent);
+    insstr_modinit(d, "version", st->useragent);
     insint(d, "COMPILE_PY_VERSION_HEX", PY_VERSION_HEX);
     insint(d, "COMPILE_LIBCURL_VERSION_NUM", LIBCURL_VERSION_NUM);
 
     /* Types */
-    insobj2_modinit(d, NULL, "Curl", (PyObject *) p_Curl_Type);
-    insobj2_modinit(d, NULL, "CurlMulti", (PyObject *) p_CurlMulti_Type);
-    insobj2_modinit(d, NULL, "CurlShare", (PyObject *) p_CurlShare_Type);
+    Py_INCREF(st->curl_type);
+    insobj2_modinit(d, NULL, "Curl", (PyObject *) st->curl_type);
+    Py_INCREF(st->curl_multi_type);
+    insobj2_modinit(d, NULL, "CurlMulti", (PyObject *) st->curl_multi_type);
+    Py_INCREF(st->curl_share_type);
+    insobj2_modinit(d, NULL, "CurlShare", (PyObject *) st->curl_share_type);
+#if defined(HAVE_PYCURL_CA_STORE)
+    Py_INCREF(st->curl_ca_store_type);
+    insobj2_modinit(d, NULL, "CaStore", (PyObject *) st->curl_ca_store_type);
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    Py_INCREF(st->curl_ssl_session_cache_type);
+    insobj2_modinit(d, NULL, "SslSessionCache", (PyObject *) st->curl_ssl_session_cache_type);
+#endif
 
     /**
      ** the order of these constants mostly follows <curl/curl.h>
@@ -1457,6 +1486,7 @@ initpycurl(void)
     insint_s(d, "SH_SHARE", CURLSHOPT_SHARE);
     insint_s(d, "SH_UNSHARE", CURLSHOPT_UNSHARE);
 
+    insint_s(d, "LOCK_DATA_SHARE", CURL_LOCK_DATA_SHARE);
     insint_s(d, "LOCK_DATA_COOKIE", CURL_LOCK_DATA_COOKIE);
     insint_s(d, "LOCK_DATA_DNS", CURL_LOCK_DATA_DNS);
     insint_s(d, "LOCK_DATA_SSL_SESSION", CURL_LOCK_DATA_SSL_SESSION);
@@ -1467,42 +1497,40 @@ initpycurl(void)
     insint_s(d, "LOCK_DATA_PSL", CURL_LOCK_DATA_PSL);
 #endif
 
+    if (pycurl_atfork_init() != 0) {
+        goto error;
+    }
+
     /* Initialize callback locks if ssl is enabled */
 #if defined(PYCURL_NEED_SSL_TSL)
-    if (pycurl_ssl_init() != 0) {
+    if (!pycurl_ssl_initialized) {
+        if (pycurl_ssl_init() != 0) {
+            goto error;
+        }
+        pycurl_ssl_initialized = 1;
+    }
+#endif
+
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    if (ssl_session_cache_init() != 0) {
+        PyErr_SetString(PyExc_ImportError, "pycurl: failed to register SSL session cache data");
         goto error;
     }
 #endif
 
-#if PY_MAJOR_VERSION >= 3
     xio_module = PyImport_ImportModule("io");
     if (xio_module == NULL) {
         goto error;
     }
-    bytesio = PyObject_GetAttrString(xio_module, "BytesIO");
-    if (bytesio == NULL) {
+    st->bytesio = PyObject_GetAttrString(xio_module, "BytesIO");
+    if (st->bytesio == NULL) {
         goto error;
     }
-    stringio = PyObject_GetAttrString(xio_module, "StringIO");
-    if (stringio == NULL) {
-        goto error;
-    }
-#else
-    xio_module = PyImport_ImportModule("cStringIO");
-    if (xio_module == NULL) {
-        PyErr_Clear();
-        xio_module = PyImport_ImportModule("StringIO");
-        if (xio_module == NULL) {
-            goto error;
-        }
-    }
-    stringio = PyObject_GetAttrString(xio_module, "StringIO");
-    if (stringio == NULL) {
+    st->stringio = PyObject_GetAttrString(xio_module, "StringIO");
+    if (st->stringio == NULL) {
         goto error;
     }
-    bytesio = stringio;
-    Py_INCREF(bytesio);
-#endif
+    Py_CLEAR(xio_module);
 
     collections_module = PyImport_ImportModule("collections");
     if (collections_module == NULL) {
@@ -1517,53 +1545,74 @@ initpycurl(void)
     if (arglist == NULL) {
         goto error;
     }
-    khkey_type = PyObject_Call(named_tuple, arglist, NULL);
-    if (khkey_type == NULL) {
+    st->khkey_type = PyObject_Call(named_tuple, arglist, NULL);
+    if (st->khkey_type == NULL) {
+        goto error;
+    }
+    Py_CLEAR(arglist);
+    if (PyDict_SetItemString(d, "KhKey", st->khkey_type) < 0) {
         goto error;
     }
-    Py_DECREF(arglist);
-    PyDict_SetItemString(d, "KhKey", khkey_type);
 #endif
 
     arglist = Py_BuildValue("ss", "CurlSockAddr", "family socktype protocol addr");
     if (arglist == NULL) {
         goto error;
     }
-    curl_sockaddr_type = PyObject_Call(named_tuple, arglist, NULL);
-    if (curl_sockaddr_type == NULL) {
+    st->curl_sockaddr_type = PyObject_Call(named_tuple, arglist, NULL);
+    if (st->curl_sockaddr_type == NULL) {
+        goto error;
+    }
+    Py_CLEAR(arglist);
+    if (PyDict_SetItemString(d, "CurlSockAddr", st->curl_sockaddr_type) < 0) {
         goto error;
     }
-    Py_DECREF(arglist);
-    PyDict_SetItemString(d, "CurlSockAddr", curl_sockaddr_type);
-
-#if defined(WITH_THREAD) && (PY_MAJOR_VERSION < 3 || PY_MAJOR_VERSION == 3 && PY_MINOR_VERSION < 9)
-    /* Finally initialize global interpreter lock */
-    PyEval_InitThreads();
-#endif
 
-#if PY_MAJOR_VERSION >= 3
-    return m;
-#else
-    PYCURL_MODINIT_RETURN_NULL;
-#endif
+    Py_DECREF(named_tuple);
+    Py_DECREF(collections_module);
+    return 0;
 
 error:
-    Py_XDECREF(curlobject_constants);
-    Py_XDECREF(curlmultiobject_constants);
-    Py_XDECREF(curlshareobject_constants);
-    Py_XDECREF(ErrorObject);
+    /* whatever made it into the state is released by do_curlmod_free */
     Py_XDECREF(collections_module);
     Py_XDECREF(named_tuple);
     Py_XDECREF(xio_module);
-    Py_XDECREF(bytesio);
-    Py_XDECREF(stringio);
     Py_XDECREF(arglist);
-#ifdef HAVE_CURL_7_19_6_OPTS
-    Py_XDECREF(khkey_type);
-    Py_XDECREF(curl_sockaddr_type);
-#endif
-    PyMem_Free(g_pycurl_useragent);
     if (!PyErr_Occurred())
         PyErr_SetString(PyExc_ImportError, "curl module init failed");
-    PYCURL_MODINIT_RETURN_NULL;
+    return -1;
+}
+
+
+static PyModuleDef_Slot curlmodule_slots[] = {
+    {Py_mod_exec, do_curlmod_exec},
+#if PY_VERSION_HEX >= 0x030C0000
+    /* all state lives in the module, see pycurl_state */
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#if defined(Py_GIL_DISABLED) && defined(PYCURL_FREE_THREADING)
+    /* object state is protected by critical sections, see pycurl.h;
+     * opt-in until the free-threaded build is tested, see INSTALL.rst */
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL}
+};
+
+PyModuleDef curlmodule = {
+    PyModuleDef_HEAD_INIT,
+    "pycurl",               /* m_name */
+    pycurl_module_doc,      /* m_doc */
+    sizeof(pycurl_state),   /* m_size */
+    curl_methods,           /* m_methods */
+    curlmodule_slots,       /* m_slots */
+    do_curlmod_traverse,    /* m_traverse */
+    do_curlmod_clear,       /* m_clear */
+    do_curlmod_free         /* m_free */
+};
+
+
+PyMODINIT_FUNC
+PyInit_pycurl(void)
+{
+    return PyModuleDef_Init(&curlmodule);
 }
@@ -11,7 +11,7 @@ static void
 assert_multi_state(const CurlMultiObject *self)
 {
     assert(self != NULL);
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_CurlMulti_Type) == 1);
+    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) PYCURL_STATE(self)->curl_multi_type) == 1);
 #ifdef WITH_THREAD
     if (self->state != NULL) {
         assert(self->multi_handle != NULL);
@@ -25,12 +25,16 @@ check_multi_state(const CurlMultiObject *self, int flags, const char *name)
 {
     assert_multi_state(self);
     if ((flags & 1) && self->multi_handle == NULL) {
-        PyErr_Format(ErrorObject, "cannot invoke %s() - no multi handle", name);
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - no multi handle", name);
+        return -1;
+    }
+    if ((flags & 1) && PYCURL_INHERITED(self)) {
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - multi handle was inherited across fork()", name);
         return -1;
     }
 #ifdef WITH_THREAD
     if ((flags & 2) && self->state != NULL) {
-        PyErr_Format(ErrorObject, "cannot invoke %s() - multi_perform() is currently running", name);
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - multi_perform() is currently running", name);
         return -1;
     }
 #endif
@@ -51,7 +55,7 @@ do_multi_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
     CurlMultiObject *self;
     int *ptr;
 
-    if (subtype == p_CurlMulti_Type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
+    if (subtype == pycurl_get_state_by_type(subtype)->curl_multi_type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
         return NULL;
     }
 
@@ -74,10 +78,11 @@ do_multi_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
     }
     
     /* Allocate libcurl multi handle */
+    self->fork_generation = pycurl_fork_generation;
     self->multi_handle = curl_multi_init();
     if (self->multi_handle == NULL) {
         Py_DECREF(self);
-        PyErr_SetString(ErrorObject, "initializing curl-multi failed");
+        PyErr_SetString(pycurl_get_state_by_type(subtype)->error, "initializing curl-multi failed");
         return NULL;
     }
     return self;
@@ -94,12 +99,23 @@ util_multi_close(CurlMultiObject *self)
     
     if (self->multi_handle != NULL) {
         CURLM *multi_handle = self->multi_handle;
-        /* Allow threads because callbacks can be invoked */
-        PYCURL_BEGIN_ALLOW_THREADS
-        curl_multi_cleanup(multi_handle);
-        PYCURL_END_ALLOW_THREADS
+        /* a multi handle inherited across fork() is leaked, see
+         * util_curl_close() */
+        if (!PYCURL_INHERITED(self)) {
+            /* Allow threads because callbacks can be invoked */
+            PYCURL_BEGIN_ALLOW_THREADS
+            curl_multi_cleanup(multi_handle);
+            PYCURL_END_ALLOW_THREADS
+        }
         self->multi_handle = NULL;
     }
+
+    /* cleanup may have recorded socket removals, drop them as well */
+    PyMem_RawFree(self->socket_changes);
+    self->socket_changes = NULL;
+    self->socket_changes_len = self->socket_changes_size = 0;
+    self->record_socket_changes = 0;
+    self->socket_changes_lost = 0;
 }
 
 
@@ -116,6 +132,8 @@ util_multi_xdecref(CurlMultiObject *self)
 PYCURL_INTERNAL void
 do_multi_dealloc(CurlMultiObject *self)
 {
+    PyTypeObject *tp = Py_TYPE(self);
+
     PyObject_GC_UnTrack(self);
     CPy_TRASHCAN_BEGIN(self, do_multi_dealloc);
 
@@ -126,7 +144,8 @@ do_multi_dealloc(CurlMultiObject *self)
         PyObject_ClearWeakRefs((PyObject *) self);
     }
 
-    CurlMulti_Type.tp_free(self);
+    tp->tp_free(self);
+    Py_DECREF(tp);
     CPy_TRASHCAN_END(self);
 }
 
@@ -159,6 +178,7 @@ do_multi_traverse(CurlMultiObject *self, visitproc visit, void *arg)
 #undef VISIT
 #define VISIT(v)    if ((v) != NULL && ((err = visit(v, arg)) != 0)) return err
 
+    VISIT((PyObject *) Py_TYPE(self));
     VISIT(self->dict);
     VISIT(self->easy_object_dict);
 
@@ -221,6 +241,59 @@ verbose_error:
 }
 
 
+/* Socket callback used by record_socket_changes(). It only appends to
+ * self->socket_changes and thus runs without acquiring the GIL. libcurl
+ * only calls it from methods that set self->state, which makes
+ * socket_changes() refuse to run, so the array is never read while it is
+ * being reallocated. */
+static int
+multi_socket_record_callback(CURL *easy,
+                             curl_socket_t s,
+                             int what,
+                             void *userp,
+                             void *socketp)
+{
+    CurlMultiObject *self;
+    CurlSocketEvent *change;
+    Py_ssize_t i;
+
+    UNUSED(easy);
+    UNUSED(socketp);
+
+    self = (CurlMultiObject *)userp;
+
+    /* coalesce with the latest pending change for this socket, unless
+     * that change removed it: the descriptor may have been reused since */
+    for (i = self->socket_changes_len - 1; i >= 0; i--) {
+        change = &self->socket_changes[i];
+        if (change->fd == s) {
+            if (change->what != CURL_POLL_REMOVE) {
+                change->what = what;
+                return 0;
+            }
+            break;
+        }
+    }
+
+    if (self->socket_changes_len == self->socket_changes_size) {
+        Py_ssize_t size = self->socket_changes_size ? self->socket_changes_size * 2 : 16;
+        change = PyMem_RawRealloc(self->socket_changes, size * sizeof(CurlSocketEvent));
+        if (change == NULL) {
+            /* the change is lost and the caller's view of the sockets is
+             * wrong from now on, see check_socket_changes_lost() */
+            self->socket_changes_lost = 1;
+            return -1;
+        }
+        self->socket_changes = change;
+        self->socket_changes_size = size;
+    }
+    change = &self->socket_changes[self->socket_changes_len++];
+    change->fd = s;
+    change->what = what;
+    return 0;
+}
+
+
 static int
 multi_timer_callback(CURLM *multi,
                      long timeout_ms,
@@ -335,7 +408,7 @@ do_multi_setopt_charpp(CurlMultiObject *self, int option, int which, PyObject *o
     for (i = 0; i < len; i++) {
         PyObject *listitem = PyListOrTuple_GetItem(obj, i, which);
         if (!PyText_Check(listitem)) {
-            PyErr_SetString(ErrorObject, "list/tuple items must be strings");
+            PyErr_SetString(PYCURL_STATE(self)->error, "list/tuple items must be strings");
             goto done;
         }
         encoded_str = PyText_AsString_NoNUL(listitem, &encoded_obj);
@@ -399,6 +472,9 @@ do_multi_setopt_callable(CurlMultiObject *self, int option, PyObject *obj)
         curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETDATA, self);
         Py_INCREF(obj);
         self->s_cb = obj;
+        self->record_socket_changes = 0;
+        self->socket_changes_len = 0;
+        self->socket_changes_lost = 0;
         break;
     case CURLMOPT_TIMERFUNCTION:
         curl_multi_setopt(self->multi_handle, CURLMOPT_TIMERFUNCTION, t_cb);
@@ -428,6 +504,9 @@ do_multi_setopt_none(CurlMultiObject *self, int option, PyObject *obj)
         curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETFUNCTION, NULL);
         curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETDATA, NULL);
         Py_CLEAR(self->s_cb);
+        self->record_socket_changes = 0;
+        self->socket_changes_len = 0;
+        self->socket_changes_lost = 0;
         break;
     case CURLMOPT_TIMERFUNCTION:
         curl_multi_setopt(self->multi_handle, CURLMOPT_TIMERFUNCTION, NULL);
@@ -537,6 +616,19 @@ do_multi_assign(CurlMultiObject *self, PyObject *args)
 
 
 /* --------------- socket_action --------------- */
+
+/* Raises MemoryError once a socket change could not be recorded. The error
+ * sticks until recording is turned on again. */
+static int
+check_socket_changes_lost(CurlMultiObject *self)
+{
+    if (self->socket_changes_lost) {
+        PyErr_SetString(PyExc_MemoryError, "socket changes were lost because memory could not be allocated, call record_socket_changes() again");
+        return -1;
+    }
+    return 0;
+}
+
 static PyObject *
 do_multi_socket_action(CurlMultiObject *self, PyObject *args)
 {
@@ -555,6 +647,9 @@ do_multi_socket_action(CurlMultiObject *self, PyObject *args)
     res = curl_multi_socket_action(self->multi_handle, socket, ev_bitmask, &running);
     PYCURL_END_ALLOW_THREADS
 
+    if (check_socket_changes_lost(self) != 0) {
+        return NULL;
+    }
     if (res != CURLM_OK) {
         CURLERROR_MSG("multi_socket_action failed");
     }
@@ -578,6 +673,9 @@ do_multi_socket_all(CurlMultiObject *self)
     res = curl_multi_socket_all(self->multi_handle, &running);
     PYCURL_END_ALLOW_THREADS
 
+    if (check_socket_changes_lost(self) != 0) {
+        return NULL;
+    }
     /* We assume these errors are ok, otherwise raise exception */
     if (res != CURLM_OK && res != CURLM_CALL_MULTI_PERFORM) {
         CURLERROR_MSG("perform failed");
@@ -588,6 +686,134 @@ do_multi_socket_all(CurlMultiObject *self)
 }
 
 
+/* --------------- socket_action_many --------------- */
+
+static PyObject *
+do_multi_socket_action_many(CurlMultiObject *self, PyObject *args)
+{
+    CURLMcode res = CURLM_OK;
+    PyObject *actions, *item;
+    CurlSocketEvent *events;
+    Py_ssize_t len, i;
+    int which;
+    int running = -1;
+
+    if (!PyArg_ParseTuple(args, "O:socket_action_many", &actions))
+        return NULL;
+    if (check_multi_state(self, 1 | 2, "socket_action_many") != 0) {
+        return NULL;
+    }
+    which = PyListOrTuple_Check(actions);
+    if (!which) {
+        PyErr_SetString(PyExc_TypeError, "socket_action_many() argument must be a list or a tuple");
+        return NULL;
+    }
+
+    len = PyListOrTuple_Size(actions, which);
+    events = PyMem_New(CurlSocketEvent, len > 0 ? len : 1);
+    if (events == NULL) {
+        return PyErr_NoMemory();
+    }
+    for (i = 0; i < len; i++) {
+        int fd, ev_bitmask;
+        item = PyListOrTuple_GetItem(actions, i, which);
+        if (!PyTuple_Check(item) || !PyArg_ParseTuple(item, "ii", &fd, &ev_bitmask)) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_TypeError, "socket_action_many() items must be (sock_fd, ev_bitmask) tuples");
+            PyMem_Free(events);
+            return NULL;
+        }
+        events[i].fd = (curl_socket_t)fd;
+        events[i].what = ev_bitmask;
+    }
+
+    /* an empty batch still gives libcurl a chance to handle timeouts */
+    PYCURL_BEGIN_ALLOW_THREADS
+    if (len == 0) {
+        res = curl_multi_socket_action(self->multi_handle, CURL_SOCKET_TIMEOUT, 0, &running);
+    }
+    for (i = 0; i < len && res == CURLM_OK; i++) {
+        res = curl_multi_socket_action(self->multi_handle, events[i].fd, events[i].what, &running);
+    }
+    PYCURL_END_ALLOW_THREADS
+    PyMem_Free(events);
+
+    if (check_socket_changes_lost(self) != 0) {
+        return NULL;
+    }
+    if (res != CURLM_OK) {
+        CURLERROR_MSG("multi_socket_action failed");
+    }
+    /* Return a tuple with the result and the number of running handles */
+    return Py_BuildValue("(ii)", (int)res, running);
+}
+
+
+/* --------------- record_socket_changes/socket_changes --------------- */
+
+static PyObject *
+do_multi_record_socket_changes(CurlMultiObject *self, PyObject *args)
+{
+    int enable = 1;
+
+    if (!PyArg_ParseTuple(args, "|i:record_socket_changes", &enable))
+        return NULL;
+    if (check_multi_state(self, 1 | 2, "record_socket_changes") != 0) {
+        return NULL;
+    }
+
+    if (enable) {
+        const curl_socket_callback s_cb = multi_socket_record_callback;
+        curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETFUNCTION, s_cb);
+        curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETDATA, self);
+        Py_CLEAR(self->s_cb);
+    } else if (self->record_socket_changes) {
+        curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETFUNCTION, NULL);
+        curl_multi_setopt(self->multi_handle, CURLMOPT_SOCKETDATA, NULL);
+    }
+    self->record_socket_changes = enable ? 1 : 0;
+    self->socket_changes_len = 0;
+    self->socket_changes_lost = 0;
+    Py_RETURN_NONE;
+}
+
+
+static PyObject *
+do_multi_socket_changes(CurlMultiObject *self)
+{
+    PyObject *ret, *v;
+    Py_ssize_t i;
+
+    /* refused while a method that lets libcurl record changes runs without
+     * the GIL, the array may be reallocated at any time then */
+    if (check_multi_state(self, 1 | 2, "socket_changes") != 0) {
+        return NULL;
+    }
+    if (check_socket_changes_lost(self) != 0) {
+        return NULL;
+    }
+    if (!self->record_socket_changes) {
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot invoke socket_changes() - socket changes are not being recorded");
+        return NULL;
+    }
+
+    ret = PyList_New(self->socket_changes_len);
+    if (ret == NULL) {
+        return NULL;
+    }
+    for (i = 0; i < self->socket_changes_len; i++) {
+        v = Py_BuildValue("(ii)", (int)self->socket_changes[i].fd, self->socket_changes[i].what);
+        if (v == NULL) {
+            Py_DECREF(ret);
+            return NULL;
+        }
+        PyList_SET_ITEM(ret, i, v);
+    }
+    self->socket_changes_len = 0;
+    return ret;
+}
+
+
 /* --------------- perform --------------- */
 
 static PyObject *
@@ -623,12 +849,16 @@ check_multi_add_remove(const CurlMultiObject *self, const CurlObject *obj)
     /* check CurlMultiObject status */
     assert_multi_state(self);
     if (self->multi_handle == NULL) {
-        PyErr_SetString(ErrorObject, "cannot add/remove handle - multi-stack is closed");
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot add/remove handle - multi-stack is closed");
+        return -1;
+    }
+    if (PYCURL_INHERITED(self) || (obj->handle != NULL && PYCURL_INHERITED(obj))) {
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot add/remove handle - object was inherited across fork()");
         return -1;
     }
 #ifdef WITH_THREAD
     if (self->state != NULL) {
-        PyErr_SetString(ErrorObject, "cannot add/remove handle - multi_perform() already running");
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot add/remove handle - multi_perform() already running");
         return -1;
     }
 #endif
@@ -636,12 +866,12 @@ check_multi_add_remove(const CurlMultiObject *self, const CurlObject *obj)
     assert_curl_state(obj);
 #ifdef WITH_THREAD
     if (obj->state != NULL) {
-        PyErr_SetString(ErrorObject, "cannot add/remove handle - perform() of curl object already running");
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot add/remove handle - perform() of curl object already running");
         return -1;
     }
 #endif
     if (obj->multi_stack != NULL && obj->multi_stack != self) {
-        PyErr_SetString(ErrorObject, "cannot add/remove handle - curl object already on another multi-stack");
+        PyErr_SetString(PYCURL_STATE(self)->error, "cannot add/remove handle - curl object already on another multi-stack");
         return -1;
     }
     return 0;
@@ -649,23 +879,19 @@ check_multi_add_remove(const CurlMultiObject *self, const CurlObject *obj)
 
 
 static PyObject *
-do_multi_add_handle(CurlMultiObject *self, PyObject *args)
+util_multi_add_handle(CurlMultiObject *self, CurlObject *obj)
 {
-    CurlObject *obj;
     CURLMcode res;
 
-    if (!PyArg_ParseTuple(args, "O!:add_handle", p_Curl_Type, &obj)) {
-        return NULL;
-    }
     if (check_multi_add_remove(self, obj) != 0) {
         return NULL;
     }
     if (obj->handle == NULL) {
-        PyErr_SetString(ErrorObject, "curl object already closed");
+        PyErr_SetString(PYCURL_STATE(self)->error, "curl object already closed");
         return NULL;
     }
     if (obj->multi_stack == self) {
-        PyErr_SetString(ErrorObject, "curl object already on this multi-stack");
+        PyErr_SetString(PYCURL_STATE(self)->error, "curl object already on this multi-stack");
         return NULL;
     }
     
@@ -688,14 +914,27 @@ do_multi_add_handle(CurlMultiObject *self, PyObject *args)
 
 
 static PyObject *
-do_multi_remove_handle(CurlMultiObject *self, PyObject *args)
+do_multi_add_handle(CurlMultiObject *self, PyObject *args)
 {
     CurlObject *obj;
-    CURLMcode res;
+    PyObject *res;
 
-    if (!PyArg_ParseTuple(args, "O!:remove_handle", p_Curl_Type, &obj)) {
+    if (!PyArg_ParseTuple(args, "O!:add_handle", PYCURL_STATE(self)->curl_type, &obj)) {
         return NULL;
     }
+    /* the easy object's multi_stack changes together with the multi */
+    Py_BEGIN_CRITICAL_SECTION2(self, obj);
+    res = util_multi_add_handle(self, obj);
+    Py_END_CRITICAL_SECTION2();
+    return res;
+}
+
+
+static PyObject *
+util_multi_remove_handle(CurlMultiObject *self, CurlObject *obj)
+{
+    CURLMcode res;
+
     if (check_multi_add_remove(self, obj) != 0) {
         return NULL;
     }
@@ -707,7 +946,7 @@ do_multi_remove_handle(CurlMultiObject *self, PyObject *args)
         goto done;
     }
     if (obj->multi_stack != self) {
-        PyErr_SetString(ErrorObject, "curl object not on this multi-stack");
+        PyErr_SetString(PYCURL_STATE(self)->error, "curl object not on this multi-stack");
         return NULL;
     }
     /* Allow threads because callbacks can be invoked */
@@ -731,6 +970,23 @@ done:
 }
 
 
+static PyObject *
+do_multi_remove_handle(CurlMultiObject *self, PyObject *args)
+{
+    CurlObject *obj;
+    PyObject *res;
+
+    if (!PyArg_ParseTuple(args, "O!:remove_handle", PYCURL_STATE(self)->curl_type, &obj)) {
+        return NULL;
+    }
+    /* the easy object's multi_stack changes together with the multi */
+    Py_BEGIN_CRITICAL_SECTION2(self, obj);
+    res = util_multi_remove_handle(self, obj);
+    Py_END_CRITICAL_SECTION2();
+    return res;
+}
+
+
 /* --------------- fdset ---------------------- */
 
 static PyObject *
@@ -811,7 +1067,7 @@ do_multi_info_read(CurlMultiObject *self, PyObject *args)
         return NULL;
     }
     if (num_results <= 0) {
-        PyErr_SetString(ErrorObject, "argument to info_read must be greater than zero");
+        PyErr_SetString(PYCURL_STATE(self)->error, "argument to info_read must be greater than zero");
         return NULL;
     }
     if (check_multi_state(self, 1 | 2, "info_read") != 0) {
@@ -838,7 +1094,7 @@ do_multi_info_read(CurlMultiObject *self, PyObject *args)
             Py_DECREF(ok_list);
             CURLERROR_MSG("Unable to fetch curl handle from curl object");
         }
-        assert(PyObject_IsInstance((PyObject *) co, (PyObject *) p_Curl_Type) == 1);
+        assert(PyObject_IsInstance((PyObject *) co, (PyObject *) PYCURL_STATE(self)->curl_type) == 1);
         if (msg->msg != CURLMSG_DONE) {
             /* FIXME: what does this mean ??? */
         }
@@ -955,19 +1211,36 @@ static PyObject *do_curlmulti_setstate(CurlMultiObject *self, PyObject *args)
 
 /* --------------- methods --------------- */
 
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_close_locked, do_multi_close, CurlMultiObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_fdset_locked, do_multi_fdset, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_info_read_locked, do_multi_info_read, CurlMultiObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_perform_locked, do_multi_perform, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_socket_action_locked, do_multi_socket_action, CurlMultiObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_socket_all_locked, do_multi_socket_all, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_socket_action_many_locked, do_multi_socket_action_many, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_record_socket_changes_locked, do_multi_record_socket_changes, CurlMultiObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_socket_changes_locked, do_multi_socket_changes, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_setopt_locked, do_multi_setopt, CurlMultiObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_multi_timeout_locked, do_multi_timeout, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_assign_locked, do_multi_assign, CurlMultiObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_multi_select_locked, do_multi_select, CurlMultiObject)
+
 PYCURL_INTERNAL PyMethodDef curlmultiobject_methods[] = {
     {"add_handle", (PyCFunction)do_multi_add_handle, METH_VARARGS, multi_add_handle_doc},
-    {"close", (PyCFunction)do_multi_close, METH_NOARGS, multi_close_doc},
-    {"fdset", (PyCFunction)do_multi_fdset, METH_NOARGS, multi_fdset_doc},
-    {"info_read", (PyCFunction)do_multi_info_read, METH_VARARGS, multi_info_read_doc},
-    {"perform", (PyCFunction)do_multi_perform, METH_NOARGS, multi_perform_doc},
-    {"socket_action", (PyCFunction)do_multi_socket_action, METH_VARARGS, multi_socket_action_doc},
-    {"socket_all", (PyCFunction)do_multi_socket_all, METH_NOARGS, multi_socket_all_doc},
-    {"setopt", (PyCFunction)do_multi_setopt, METH_VARARGS, multi_setopt_doc},
-    {"timeout", (PyCFunction)do_multi_timeout, METH_NOARGS, multi_timeout_doc},
-    {"assign", (PyCFunction)do_multi_assign, METH_VARARGS, multi_assign_doc},
+    {"close", (PyCFunction)do_multi_close_locked, METH_NOARGS, multi_close_doc},
+    {"fdset", (PyCFunction)do_multi_fdset_locked, METH_NOARGS, multi_fdset_doc},
+    {"info_read", (PyCFunction)do_multi_info_read_locked, METH_VARARGS, multi_info_read_doc},
+    {"perform", (PyCFunction)do_multi_perform_locked, METH_NOARGS, multi_perform_doc},
+    {"socket_action", (PyCFunction)do_multi_socket_action_locked, METH_VARARGS, multi_socket_action_doc},
+    {"socket_all", (PyCFunction)do_multi_socket_all_locked, METH_NOARGS, multi_socket_all_doc},
+    {"socket_action_many", (PyCFunction)do_multi_socket_action_many_locked, METH_VARARGS, multi_socket_action_many_doc},
+    {"record_socket_changes", (PyCFunction)do_multi_record_socket_changes_locked, METH_VARARGS, multi_record_socket_changes_doc},
+    {"socket_changes", (PyCFunction)do_multi_socket_changes_locked, METH_NOARGS, multi_socket_changes_doc},
+    {"setopt", (PyCFunction)do_multi_setopt_locked, METH_VARARGS, multi_setopt_doc},
+    {"timeout", (PyCFunction)do_multi_timeout_locked, METH_NOARGS, multi_timeout_doc},
+    {"assign", (PyCFunction)do_multi_assign_locked, METH_VARARGS, multi_assign_doc},
     {"remove_handle", (PyCFunction)do_multi_remove_handle, METH_VARARGS, multi_remove_handle_doc},
-    {"select", (PyCFunction)do_multi_select, METH_VARARGS, multi_select_doc},
+    {"select", (PyCFunction)do_multi_select_locked, METH_VARARGS, multi_select_doc},
     {"__getstate__", (PyCFunction)do_curlmulti_getstate, METH_NOARGS, NULL},
     {"__setstate__", (PyCFunction)do_curlmulti_setstate, METH_VARARGS, NULL},
     {NULL, NULL, 0, NULL}
@@ -976,9 +1249,6 @@ PYCURL_INTERNAL PyMethodDef curlmultiobject_methods[] = {
 
 /* --------------- setattr/getattr --------------- */
 
-
-#if PY_MAJOR_VERSION >= 3
-
 PYCURL_INTERNAL PyObject *
 do_multi_getattro(PyObject *o, PyObject *n)
 {
@@ -988,8 +1258,10 @@ do_multi_getattro(PyObject *o, PyObject *n)
     if( !v && PyErr_ExceptionMatches(PyExc_AttributeError) )
     {
         PyErr_Clear();
+        Py_BEGIN_CRITICAL_SECTION(o);
         v = my_getattro(o, n, ((CurlMultiObject *)o)->dict,
-                        curlmultiobject_constants, curlmultiobject_methods);
+                        PYCURL_STATE(o)->curlmultiobject_constants, curlmultiobject_methods);
+        Py_END_CRITICAL_SECTION();
     }
     return v;
 }
@@ -997,84 +1269,42 @@ do_multi_getattro(PyObject *o, PyObject *n)
 PYCURL_INTERNAL int
 do_multi_setattro(PyObject *o, PyObject *n, PyObject *v)
 {
+    int res;
+
     assert_multi_state((CurlMultiObject *)o);
-    return my_setattro(&((CurlMultiObject *)o)->dict, n, v);
+    Py_BEGIN_CRITICAL_SECTION(o);
+    res = my_setattro(&((CurlMultiObject *)o)->dict, n, v);
+    Py_END_CRITICAL_SECTION();
+    return res;
 }
 
-#else /* PY_MAJOR_VERSION >= 3 */
 
-PYCURL_INTERNAL PyObject *
-do_multi_getattr(CurlMultiObject *co, char *name)
-{
-    assert_multi_state(co);
-    return my_getattr((PyObject *)co, name, co->dict,
-                      curlmultiobject_constants, curlmultiobject_methods);
-}
+/* --------------- type --------------- */
 
-PYCURL_INTERNAL int
-do_multi_setattr(CurlMultiObject *co, char *name, PyObject *v)
-{
-    assert_multi_state(co);
-    return my_setattr(&co->dict, name, v);
-}
+static PyMemberDef curlmultiobject_members[] = {
+    {"__weaklistoffset__", T_PYSSIZET, offsetof(CurlMultiObject, weakreflist), READONLY},
+    {NULL}
+};
 
-#endif /* PY_MAJOR_VERSION >= 3 */
+static PyType_Slot CurlMulti_Type_slots[] = {
+    {Py_tp_dealloc, do_multi_dealloc},
+    {Py_tp_getattro, do_multi_getattro},
+    {Py_tp_setattro, do_multi_setattro},
+    {Py_tp_doc, (void *) multi_doc},
+    {Py_tp_traverse, do_multi_traverse},
+    {Py_tp_clear, do_multi_clear},
+    {Py_tp_methods, curlmultiobject_methods},
+    {Py_tp_members, curlmultiobject_members},
+    {Py_tp_new, do_multi_new},
+    {0, NULL}
+};
 
-PYCURL_INTERNAL PyTypeObject CurlMulti_Type = {
-#if PY_MAJOR_VERSION >= 3
-    PyVarObject_HEAD_INIT(NULL, 0)
-#else
-    PyObject_HEAD_INIT(NULL)
-    0,                          /* ob_size */
-#endif
-    "pycurl.CurlMulti",         /* tp_name */
-    sizeof(CurlMultiObject),    /* tp_basicsize */
-    0,                          /* tp_itemsize */
-    (destructor)do_multi_dealloc, /* tp_dealloc */
-    0,                          /* tp_print */
-#if PY_MAJOR_VERSION >= 3
-    0,                          /* tp_getattr */
-    0,                          /* tp_setattr */
-#else
-    (getattrfunc)do_multi_getattr,  /* tp_getattr */
-    (setattrfunc)do_multi_setattr,  /* tp_setattr */
-#endif
-    0,                          /* tp_reserved */
-    0,                          /* tp_repr */
-    0,                          /* tp_as_number */
-    0,                          /* tp_as_sequence */
-    0,                          /* tp_as_mapping */
-    0,                          /* tp_hash  */
-    0,                          /* tp_call */
-    0,                          /* tp_str */
-#if PY_MAJOR_VERSION >= 3
-    (getattrofunc)do_multi_getattro, /* tp_getattro */
-    (setattrofunc)do_multi_setattro, /* tp_setattro */
-#else
-    0,                          /* tp_getattro */
-    0,                          /* tp_setattro */
-#endif
-    0,                          /* tp_as_buffer */
-    PYCURL_TYPE_FLAGS,          /* tp_flags */
-    multi_doc,                   /* tp_doc */
-    (traverseproc)do_multi_traverse, /* tp_traverse */
-    (inquiry)do_multi_clear,    /* tp_clear */
-    0,                          /* tp_richcompare */
-    offsetof(CurlMultiObject, weakreflist), /* tp_weaklistoffset */
-    0,                          /* tp_iter */
-    0,                          /* tp_iternext */
-    curlmultiobject_methods,    /* tp_methods */
-    0,                          /* tp_members */
-    0,                          /* tp_getset */
-    0,                          /* tp_base */
-    0,                          /* tp_dict */
-    0,                          /* tp_descr_get */
-    0,                          /* tp_descr_set */
-    0,                          /* tp_dictoffset */
-    0,                          /* tp_init */
-    PyType_GenericAlloc,        /* tp_alloc */
-    (newfunc)do_multi_new,      /* tp_new */
-    PyObject_GC_Del,            /* tp_free */
+PyType_Spec CurlMulti_Type_spec = {
+    "pycurl.CurlMulti",
+    sizeof(CurlMultiObject),
+    0,
+    PYCURL_TYPE_FLAGS,
+    CurlMulti_Type_slots
 };
 
 /* vi:ts=4:et:nowrap
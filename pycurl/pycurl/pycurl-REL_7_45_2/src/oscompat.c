@@ -1,5 +1,34 @@
 #include "pycurl.h"
 
+unsigned long pycurl_fork_generation = 0;
+
+#if !defined(WIN32)
+static void
+pycurl_atfork_child(void)
+{
+    /* only async-signal-safe work is allowed here */
+    ++pycurl_fork_generation;
+}
+#endif
+
+/* Registers the fork handler, once per process. */
+PYCURL_INTERNAL int
+pycurl_atfork_init(void)
+{
+#if !defined(WIN32)
+    static int registered = 0;
+
+    if (!registered) {
+        if (pthread_atfork(NULL, NULL, pycurl_atfork_child) != 0) {
+            PyErr_SetString(PyExc_ImportError, "pycurl: pthread_atfork() failed");
+            return -1;
+        }
+        registered = 1;
+    }
+#endif
+    return 0;
+}
+
 #if defined(WIN32)
 PYCURL_INTERNAL int
 dup_winsock(int sock, const struct curl_sockaddr *address)
@@ -3,6 +3,7 @@
 #endif
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <structmember.h>
 #include <pythread.h>
 #include <stddef.h>
 #include <stdlib.h>
@@ -16,6 +17,7 @@
 #include <netinet/in.h>
 #include <arpa/inet.h>
 #include <sys/un.h>
+#include <pthread.h>
 #endif
 
 #if defined(WIN32)
@@ -77,6 +79,11 @@ pycurl_inet_ntop (int family, void *addr, char *string, size_t string_size);
 #  error "Need libcurl version 7.19.0 or greater to compile pycurl."
 #endif
 
+/* heap types bound to the module, PyType_FromModuleAndSpec() */
+#if PY_VERSION_HEX < 0x03090000
+#  error "Need Python 3.9 or greater to compile pycurl."
+#endif
+
 #if LIBCURL_VERSION_NUM >= 0x071301 /* check for 7.19.1 or greater */
 #define HAVE_CURLOPT_USERNAME
 #define HAVE_CURLOPT_PROXYUSERNAME
@@ -246,6 +253,22 @@ pycurl_inet_ntop (int family, void *addr, char *string, size_t string_size);
 # define COMPILE_SUPPORTED_SSL_BACKEND_FOUND 0
 #endif /* HAVE_CURL_SSL */
 
+/* CaStore objects share one X509_STORE between SSL contexts, which needs
+ * X509_STORE_up_ref() from OpenSSL 1.1.0 */
+#if defined(HAVE_CURL_OPENSSL) && \
+    (OPENSSL_VERSION_NUMBER >= 0x10100000L || defined(OPENSSL_IS_BORINGSSL))
+# define HAVE_PYCURL_CA_STORE
+#endif
+
+/* SslSessionCache keeps client sessions outside of libcurl, which needs
+ * SSL_SESSION_is_resumable() from OpenSSL 1.1.1 and the URL API to key
+ * them by host and port */
+#if defined(HAVE_CURL_OPENSSL) && \
+    (OPENSSL_VERSION_NUMBER >= 0x10101000L || defined(OPENSSL_IS_BORINGSSL)) && \
+    LIBCURL_VERSION_NUM >= 0x073E00 /* check for 7.62.0 or greater */
+# define HAVE_PYCURL_SSL_SESSION_CACHE
+#endif
+
 #if defined(PYCURL_NEED_SSL_TSL)
 PYCURL_INTERNAL int pycurl_ssl_init(void);
 PYCURL_INTERNAL void pycurl_ssl_cleanup(void);
@@ -288,6 +311,39 @@ PYCURL_INTERNAL void pycurl_ssl_cleanup(void);
 #  define PYCURL_END_ALLOW_THREADS
 #endif
 
+/* Free-threaded builds (Py_GIL_DISABLED) have no GIL serializing access to
+ * callback pointers, slists and handle state, so methods run inside a
+ * critical section on the object. Critical sections are suspended while the
+ * thread state is detached, e.g. for the duration of curl_easy_perform().
+ * On builds with a GIL, and before python 3.13, they are no-ops. */
+#if PY_VERSION_HEX < 0x030D0000
+#  define Py_BEGIN_CRITICAL_SECTION(op) {
+#  define Py_END_CRITICAL_SECTION() }
+#  define Py_BEGIN_CRITICAL_SECTION2(a, b) {
+#  define Py_END_CRITICAL_SECTION2() }
+#endif
+
+#define PYCURL_LOCKED_METHOD_NOARGS(name, impl, type) \
+    static PyObject * \
+    name(type *self, PyObject *Py_UNUSED(ignored)) \
+    { \
+        PyObject *res; \
+        Py_BEGIN_CRITICAL_SECTION(self); \
+        res = (PyObject *) impl(self); \
+        Py_END_CRITICAL_SECTION(); \
+        return res; \
+    }
+#define PYCURL_LOCKED_METHOD_VARARGS(name, impl, type) \
+    static PyObject * \
+    name(type *self, PyObject *args) \
+    { \
+        PyObject *res; \
+        Py_BEGIN_CRITICAL_SECTION(self); \
+        res = impl(self, args); \
+        Py_END_CRITICAL_SECTION(); \
+        return res; \
+    }
+
 #if PY_MAJOR_VERSION >= 3
   #define PyInt_Type                   PyLong_Type
   #define PyInt_Check(op)              PyLong_Check(op)
@@ -356,7 +412,7 @@ create_and_set_error_object(struct CurlObject *self, int code);
 #define CURLERROR_RETVAL_MULTI_DONE() do {\
     PyObject *v; \
     v = Py_BuildValue("(i)", (int) (res)); \
-    if (v != NULL) { PyErr_SetObject(ErrorObject, v); Py_DECREF(v); } \
+    if (v != NULL) { PyErr_SetObject(PYCURL_STATE(self)->error, v); Py_DECREF(v); } \
     goto done; \
 } while (0)
 
@@ -365,7 +421,7 @@ create_and_set_error_object(struct CurlObject *self, int code);
 #define CURLERROR_MSG(msg) do {\
     PyObject *v; const char *m = (msg); \
     v = Py_BuildValue("(is)", (int) (res), (m)); \
-    if (v != NULL) { PyErr_SetObject(ErrorObject, v); Py_DECREF(v); } \
+    if (v != NULL) { PyErr_SetObject(PYCURL_STATE(self)->error, v); Py_DECREF(v); } \
     return NULL; \
 } while (0)
 
@@ -403,6 +459,43 @@ create_and_set_error_object(struct CurlObject *self, int code);
     (PYCURL_MEMGROUP_ATTRDICT | PYCURL_MEMGROUP_EASY | \
     PYCURL_MEMGROUP_MULTI | PYCURL_MEMGROUP_SHARE)
 
+#if defined(HAVE_PYCURL_CA_STORE)
+typedef struct CurlCaStoreObject {
+    PyObject_HEAD
+    PyObject *weakreflist;
+    X509_STORE *store;              /* parsed once, shared by all handles */
+} CurlCaStoreObject;
+#endif
+
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+typedef struct SslSessionEntry {
+    struct SslSessionEntry *next;   /* newest first */
+    char *key;                      /* "host:port" */
+    SSL_SESSION *session;
+    PY_LONG_LONG expires;           /* unix time */
+} SslSessionEntry;
+
+/* referenced by the Python object and by the SSL contexts it was attached
+ * to, which may be freed without the GIL */
+typedef struct SslSessionCache {
+    PyThread_type_lock lock;
+    int refcount;
+    int max_entries;
+    int count;
+    SslSessionEntry *entries;
+    unsigned long stored;           /* sessions received from servers */
+    unsigned long offered;          /* cached sessions offered to servers */
+    unsigned long resumed;          /* abbreviated handshakes */
+} SslSessionCache;
+
+typedef struct CurlSslSessionCacheObject {
+    PyObject_HEAD
+    PyObject *weakreflist;
+    SslSessionCache *cache;
+    unsigned long fork_generation;  /* see PYCURL_INHERITED() */
+} CurlSslSessionCacheObject;
+#endif
+
 typedef struct CurlSlistObject {
     PyObject_HEAD
     struct curl_slist *slist;
@@ -421,6 +514,7 @@ typedef struct CurlObject {
     // https://docs.python.org/3/extending/newtypes.html
     PyObject *weakreflist;
     CURL *handle;
+    unsigned long fork_generation;  /* see PYCURL_INHERITED() */
 #ifdef WITH_THREAD
     PyThreadState *state;
 #endif
@@ -468,18 +562,31 @@ typedef struct CurlObject {
     PyObject *writeheader_fp;
     /* reference to the object used for CURLOPT_POSTFIELDS */
     PyObject *postfields_obj;
-    /* reference to the object containing ca certs */
+    /* reference to the object containing ca certs, the string passed to
+     * set_ca_certs() or the CaStore passed to set_ca_store() */
     PyObject *ca_certs_obj;
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+    /* the SslSessionCache passed to set_ssl_session_cache() */
+    PyObject *ssl_session_cache;
+#endif
     /* misc */
     char error[CURL_ERROR_SIZE+1];
 } CurlObject;
 
+/* socket interest change recorded by the multi socket callback,
+ * also used for the (socket, event) pairs of socket_action_many() */
+typedef struct {
+    curl_socket_t fd;
+    int what;
+} CurlSocketEvent;
+
 typedef struct CurlMultiObject {
     PyObject_HEAD
     PyObject *dict;                 /* Python attributes dictionary */
     // https://docs.python.org/3/extending/newtypes.html
     PyObject *weakreflist;
     CURLM *multi_handle;
+    unsigned long fork_generation;  /* see PYCURL_INHERITED() */
 #ifdef WITH_THREAD
     PyThreadState *state;
 #endif
@@ -489,12 +596,30 @@ typedef struct CurlMultiObject {
     /* callbacks */
     PyObject *t_cb;
     PyObject *s_cb;
+    /* pending socket changes, see record_socket_changes() */
+    int record_socket_changes;
+    CurlSocketEvent *socket_changes;
+    Py_ssize_t socket_changes_len;
+    Py_ssize_t socket_changes_size;
+    int socket_changes_lost;        /* a change could not be stored */
 
     PyObject *easy_object_dict;
 } CurlMultiObject;
 
+typedef struct {
+    unsigned long acquisitions;
+    unsigned long contended;        /* acquisitions that had to wait */
+    PY_LONG_LONG wait_ns;
+    PY_LONG_LONG max_wait_ns;
+} ShareLockStats;
+
+/* One lock per curl_lock_data. libcurl asks for CURL_LOCK_ACCESS_SINGLE
+ * for every kind of shared data, so there is no use for a reader/writer
+ * lock. */
 typedef struct {
     PyThread_type_lock locks[CURL_LOCK_DATA_LAST];
+    /* updated while holding locks[data] */
+    ShareLockStats stats[CURL_LOCK_DATA_LAST];
 } ShareLock;
 
 typedef struct CurlShareObject {
@@ -503,11 +628,53 @@ typedef struct CurlShareObject {
     // https://docs.python.org/3/extending/newtypes.html
     PyObject *weakreflist;
     CURLSH *share_handle;
+    unsigned long fork_generation;  /* see PYCURL_INHERITED() */
 #ifdef WITH_THREAD
     ShareLock *lock;                /* lock object to implement CURLSHOPT_LOCKFUNC */
 #endif
 } CurlShareObject;
 
+/* Bumped in the child after every fork(). Objects remember the generation
+ * they were created in; an object from an older generation was inherited
+ * from the parent and its libcurl state (connections, TLS sessions, share
+ * locks that may have been held during the fork) must not be used or
+ * cleaned up in this process. */
+extern unsigned long pycurl_fork_generation;
+#define PYCURL_INHERITED(obj) ((obj)->fork_generation != pycurl_fork_generation)
+
+PYCURL_INTERNAL int
+pycurl_atfork_init(void);
+
+/* Per-module state. Every interpreter that imports pycurl gets its own
+ * copy, which is what allows loading it in subinterpreters with their own
+ * GIL (PEP 684). */
+typedef struct {
+    PyObject *error;
+    PyTypeObject *curl_type;
+    PyTypeObject *curl_slist_type;
+    PyTypeObject *curl_httppost_type;
+    PyTypeObject *curl_multi_type;
+    PyTypeObject *curl_share_type;
+    PyTypeObject *curl_ca_store_type;   /* NULL without HAVE_PYCURL_CA_STORE */
+    PyTypeObject *curl_ssl_session_cache_type;  /* NULL without HAVE_PYCURL_SSL_SESSION_CACHE */
+    PyObject *khkey_type;
+    PyObject *curl_sockaddr_type;
+    PyObject *curlobject_constants;
+    PyObject *curlmultiobject_constants;
+    PyObject *curlshareobject_constants;
+    PyObject *bytesio;
+    PyObject *stringio;
+    char *useragent;                /* default USERAGENT for new handles */
+} pycurl_state;
+
+PYCURL_INTERNAL pycurl_state *
+pycurl_get_state(PyObject *module);
+PYCURL_INTERNAL pycurl_state *
+pycurl_get_state_by_type(PyTypeObject *type);
+
+/* state of the module that defined the type of a pycurl object */
+#define PYCURL_STATE(obj) pycurl_get_state_by_type(Py_TYPE((PyObject *) (obj)))
+
 #ifdef WITH_THREAD
 
 PYCURL_INTERNAL PyThreadState *
@@ -525,6 +692,8 @@ PYCURL_INTERNAL void
 share_lock_lock(ShareLock *lock, curl_lock_data data);
 PYCURL_INTERNAL void
 share_lock_unlock(ShareLock *lock, curl_lock_data data);
+PYCURL_INTERNAL void
+share_lock_get_stats(ShareLock *lock, curl_lock_data data, ShareLockStats *stats);
 PYCURL_INTERNAL ShareLock *
 share_lock_new(void);
 PYCURL_INTERNAL void
@@ -569,6 +738,14 @@ do_curl_unsetopt(CurlObject *self, PyObject *args);
 PYCURL_INTERNAL PyObject *
 do_curl_set_ca_certs(CurlObject *self, PyObject *args);
 #endif
+#if defined(HAVE_PYCURL_CA_STORE)
+PYCURL_INTERNAL PyObject *
+do_curl_set_ca_store(CurlObject *self, PyObject *args);
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+PYCURL_INTERNAL PyObject *
+do_curl_set_ssl_session_cache(CurlObject *self, PyObject *args);
+#endif
 PYCURL_INTERNAL PyObject *
 do_curl_perform(CurlObject *self);
 PYCURL_INTERNAL PyObject *
@@ -591,7 +768,7 @@ PYCURL_INTERNAL PyObject *
 do_curl_setopt_filelike(CurlObject *self, int option, PyObject *obj);
 
 PYCURL_INTERNAL void
-util_curlslist_update(CurlSlistObject **old, struct curl_slist *slist);
+util_curlslist_update(CurlObject *self, CurlSlistObject **old, struct curl_slist *slist);
 PYCURL_INTERNAL void
 util_curlhttppost_update(CurlObject *obj, struct curl_httppost *httppost, PyObject *reflist);
 
@@ -649,49 +826,43 @@ debug_callback(CURL *curlobj, curl_infotype type,
 PYCURL_INTERNAL curlioerr
 ioctl_callback(CURL *curlobj, int cmd, void *stream);
 #if defined(HAVE_CURL_OPENSSL)
+PYCURL_INTERNAL int
+add_ca_certs(pycurl_state *st, X509_STORE *store, void *data, Py_ssize_t len);
 PYCURL_INTERNAL CURLcode
 ssl_ctx_callback(CURL *curl, void *ssl_ctx, void *ptr);
 #endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+PYCURL_INTERNAL int
+ssl_session_cache_attach(SslSessionCache *cache, CURL *curl, SSL_CTX *ctx);
+PYCURL_INTERNAL int
+ssl_session_cache_init(void);
+#endif
+
+/* Type specs, the types themselves live in the module state */
+extern PyType_Spec Curl_Type_spec;
+extern PyType_Spec CurlSlist_Type_spec;
+extern PyType_Spec CurlHttppost_Type_spec;
+extern PyType_Spec CurlMulti_Type_spec;
+extern PyType_Spec CurlShare_Type_spec;
+#if defined(HAVE_PYCURL_CA_STORE)
+extern PyType_Spec CurlCaStore_Type_spec;
+#endif
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+extern PyType_Spec CurlSslSessionCache_Type_spec;
+#endif
+
+extern PyModuleDef curlmodule;
 
 #if !defined(PYCURL_SINGLE_FILE)
-/* Type objects */
-extern PyTypeObject Curl_Type;
-extern PyTypeObject CurlSlist_Type;
-extern PyTypeObject CurlHttppost_Type;
-extern PyTypeObject CurlMulti_Type;
-extern PyTypeObject CurlShare_Type;
-
-extern PyObject *ErrorObject;
-extern PyTypeObject *p_Curl_Type;
-extern PyTypeObject *p_CurlSlist_Type;
-extern PyTypeObject *p_CurlHttppost_Type;
-extern PyTypeObject *p_CurlMulti_Type;
-extern PyTypeObject *p_CurlShare_Type;
-extern PyObject *khkey_type;
-extern PyObject *curl_sockaddr_type;
-
-extern PyObject *curlobject_constants;
-extern PyObject *curlmultiobject_constants;
-extern PyObject *curlshareobject_constants;
-
-extern char *g_pycurl_useragent;
 
 extern PYCURL_INTERNAL char *empty_keywords[];
-extern PYCURL_INTERNAL PyObject *bytesio;
-extern PYCURL_INTERNAL PyObject *stringio;
 
-#if PY_MAJOR_VERSION >= 3
 extern PyMethodDef curlobject_methods[];
 extern PyMethodDef curlshareobject_methods[];
 extern PyMethodDef curlmultiobject_methods[];
-#endif
 #endif /* !PYCURL_SINGLE_FILE */
 
-#if PY_MAJOR_VERSION >= 3
-# define PYCURL_TYPE_FLAGS Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_BASETYPE
-#else
-# define PYCURL_TYPE_FLAGS Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_HAVE_WEAKREFS | Py_TPFLAGS_BASETYPE
-#endif
+#define PYCURL_TYPE_FLAGS Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_BASETYPE
 
 #if PY_MAJOR_VERSION >= 3 && PY_MINOR_VERSION >= 8
 # define CPy_TRASHCAN_BEGIN(op, dealloc) Py_TRASHCAN_BEGIN(op, dealloc)
@@ -11,7 +11,7 @@ static void
 assert_share_state(const CurlShareObject *self)
 {
     assert(self != NULL);
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_CurlShare_Type) == 1);
+    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) PYCURL_STATE(self)->curl_share_type) == 1);
 #ifdef WITH_THREAD
     assert(self->lock != NULL);
 #endif
@@ -22,6 +22,10 @@ static int
 check_share_state(const CurlShareObject *self, int flags, const char *name)
 {
     assert_share_state(self);
+    if ((flags & 1) && PYCURL_INHERITED(self)) {
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - share handle was inherited across fork()", name);
+        return -1;
+    }
     return 0;
 }
 
@@ -38,7 +42,7 @@ do_share_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
 #endif
     int *ptr;
     
-    if (subtype == p_CurlShare_Type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
+    if (subtype == pycurl_get_state_by_type(subtype)->curl_share_type && !PyArg_ParseTupleAndKeywords(args, kwds, "", empty_keywords)) {
         return NULL;
     }
 
@@ -55,6 +59,7 @@ do_share_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
             assert(*ptr == 0);
     }
     
+    self->fork_generation = pycurl_fork_generation;
 #ifdef WITH_THREAD
     self->lock = share_lock_new();
     assert(self->lock != NULL);
@@ -64,7 +69,7 @@ do_share_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
     self->share_handle = curl_share_init();
     if (self->share_handle == NULL) {
         Py_DECREF(self);
-        PyErr_SetString(ErrorObject, "initializing curl-share failed");
+        PyErr_SetString(pycurl_get_state_by_type(subtype)->error, "initializing curl-share failed");
         return NULL;
     }
 
@@ -89,6 +94,7 @@ do_share_traverse(CurlShareObject *self, visitproc visit, void *arg)
 #undef VISIT
 #define VISIT(v)    if ((v) != NULL && ((err = visit(v, arg)) != 0)) return err
 
+    VISIT((PyObject *) Py_TYPE(self));
     VISIT(self->dict);
 
     return 0;
@@ -110,7 +116,11 @@ util_share_close(CurlShareObject *self){
     if (self->share_handle != NULL) {
         CURLSH *share_handle = self->share_handle;
         self->share_handle = NULL;
-        curl_share_cleanup(share_handle);
+        /* a share inherited across fork() is leaked, its locks may have
+         * been held by threads that do not exist in this process */
+        if (!PYCURL_INHERITED(self)) {
+            curl_share_cleanup(share_handle);
+        }
     }
 }
 
@@ -118,6 +128,8 @@ util_share_close(CurlShareObject *self){
 PYCURL_INTERNAL void
 do_share_dealloc(CurlShareObject *self)
 {
+    PyTypeObject *tp = Py_TYPE(self);
+
     PyObject_GC_UnTrack(self);
     CPy_TRASHCAN_BEGIN(self, do_share_dealloc);
 
@@ -125,14 +137,17 @@ do_share_dealloc(CurlShareObject *self)
     util_share_close(self);
 
 #ifdef WITH_THREAD
-    share_lock_destroy(self->lock);
+    if (!PYCURL_INHERITED(self)) {
+        share_lock_destroy(self->lock);
+    }
 #endif
 
     if (self->weakreflist != NULL) {
         PyObject_ClearWeakRefs((PyObject *) self);
     }
-     
-    CurlShare_Type.tp_free(self);
+
+    tp->tp_free(self);
+    Py_DECREF(tp);
     CPy_TRASHCAN_END(self);
 }
 
@@ -212,6 +227,59 @@ error:
 }
 
 
+/* --------------- stats --------------- */
+
+static PyObject *
+do_curlshare_stats(CurlShareObject *self)
+{
+    PyObject *ret;
+    ShareLockStats stats[CURL_LOCK_DATA_LAST];
+    int data;
+
+    if (check_share_state(self, 1, "stats") != 0)
+        return NULL;
+
+    ret = PyDict_New();
+    if (ret == NULL)
+        return NULL;
+#ifdef WITH_THREAD
+    Py_BEGIN_ALLOW_THREADS
+    for (data = CURL_LOCK_DATA_SHARE; data < CURL_LOCK_DATA_LAST; ++data) {
+        share_lock_get_stats(self->lock, (curl_lock_data) data, &stats[data]);
+    }
+    Py_END_ALLOW_THREADS
+
+    for (data = CURL_LOCK_DATA_SHARE; data < CURL_LOCK_DATA_LAST; ++data) {
+        PyObject *key, *item;
+        int res;
+
+        item = Py_BuildValue("{s:k,s:k,s:d,s:d}",
+                             "acquisitions", stats[data].acquisitions,
+                             "contended", stats[data].contended,
+                             "wait_time", stats[data].wait_ns / 1e9,
+                             "max_wait", stats[data].max_wait_ns / 1e9);
+        if (item == NULL)
+            goto error;
+        key = PyInt_FromLong(data);
+        if (key == NULL) {
+            Py_DECREF(item);
+            goto error;
+        }
+        res = PyDict_SetItem(ret, key, item);
+        Py_DECREF(key);
+        Py_DECREF(item);
+        if (res != 0)
+            goto error;
+    }
+#endif
+    return ret;
+
+error:
+    Py_DECREF(ret);
+    return NULL;
+}
+
+
 static PyObject *do_curlshare_getstate(CurlShareObject *self)
 {
     PyErr_SetString(PyExc_TypeError, "CurlShare objects do not support serialization");
@@ -232,9 +300,14 @@ static PyObject *do_curlshare_setstate(CurlShareObject *self, PyObject *args)
 
 /* --------------- methods --------------- */
 
+PYCURL_LOCKED_METHOD_NOARGS(do_share_close_locked, do_share_close, CurlShareObject)
+PYCURL_LOCKED_METHOD_VARARGS(do_curlshare_setopt_locked, do_curlshare_setopt, CurlShareObject)
+PYCURL_LOCKED_METHOD_NOARGS(do_curlshare_stats_locked, do_curlshare_stats, CurlShareObject)
+
 PYCURL_INTERNAL PyMethodDef curlshareobject_methods[] = {
-    {"close", (PyCFunction)do_share_close, METH_NOARGS, share_close_doc},
-    {"setopt", (PyCFunction)do_curlshare_setopt, METH_VARARGS, share_setopt_doc},
+    {"close", (PyCFunction)do_share_close_locked, METH_NOARGS, share_close_doc},
+    {"setopt", (PyCFunction)do_curlshare_setopt_locked, METH_VARARGS, share_setopt_doc},
+    {"stats", (PyCFunction)do_curlshare_stats_locked, METH_NOARGS, share_stats_doc},
     {"__getstate__", (PyCFunction)do_curlshare_getstate, METH_NOARGS, NULL},
     {"__setstate__", (PyCFunction)do_curlshare_setstate, METH_VARARGS, NULL},
     {NULL, NULL, 0, 0}
@@ -243,9 +316,6 @@ PYCURL_INTERNAL PyMethodDef curlshareobject_methods[] = {
 
 /* --------------- setattr/getattr --------------- */
 
-
-#if PY_MAJOR_VERSION >= 3
-
 PYCURL_INTERNAL PyObject *
 do_share_getattro(PyObject *o, PyObject *n)
 {
@@ -256,7 +326,7 @@ do_share_getattro(PyObject *o, PyObject *n)
     {
         PyErr_Clear();
         v = my_getattro(o, n, ((CurlShareObject *)o)->dict,
-                        curlshareobject_constants, curlshareobject_methods);
+                        PYCURL_STATE(o)->curlshareobject_constants, curlshareobject_methods);
     }
     return v;
 }
@@ -268,80 +338,34 @@ do_share_setattro(PyObject *o, PyObject *n, PyObject *v)
     return my_setattro(&((CurlShareObject *)o)->dict, n, v);
 }
 
-#else /* PY_MAJOR_VERSION >= 3 */
 
-PYCURL_INTERNAL PyObject *
-do_share_getattr(CurlShareObject *cso, char *name)
-{
-    assert_share_state(cso);
-    return my_getattr((PyObject *)cso, name, cso->dict,
-                      curlshareobject_constants, curlshareobject_methods);
-}
 
-PYCURL_INTERNAL int
-do_share_setattr(CurlShareObject *so, char *name, PyObject *v)
-{
-    assert_share_state(so);
-    return my_setattr(&so->dict, name, v);
-}
+/* --------------- type --------------- */
+
+static PyMemberDef curlshareobject_members[] = {
+    {"__weaklistoffset__", T_PYSSIZET, offsetof(CurlShareObject, weakreflist), READONLY},
+    {NULL}
+};
 
-#endif /* PY_MAJOR_VERSION >= 3 */
+static PyType_Slot CurlShare_Type_slots[] = {
+    {Py_tp_dealloc, do_share_dealloc},
+    {Py_tp_getattro, do_share_getattro},
+    {Py_tp_setattro, do_share_setattro},
+    {Py_tp_doc, (void *) share_doc},
+    {Py_tp_traverse, do_share_traverse},
+    {Py_tp_clear, do_share_clear},
+    {Py_tp_methods, curlshareobject_methods},
+    {Py_tp_members, curlshareobject_members},
+    {Py_tp_new, do_share_new},
+    {0, NULL}
+};
 
-PYCURL_INTERNAL PyTypeObject CurlShare_Type = {
-#if PY_MAJOR_VERSION >= 3
-    PyVarObject_HEAD_INIT(NULL, 0)
-#else
-    PyObject_HEAD_INIT(NULL)
-    0,                          /* ob_size */
-#endif
-    "pycurl.CurlShare",         /* tp_name */
-    sizeof(CurlShareObject),    /* tp_basicsize */
-    0,                          /* tp_itemsize */
-    (destructor)do_share_dealloc, /* tp_dealloc */
-    0,                          /* tp_print */
-#if PY_MAJOR_VERSION >= 3
-    0,                          /* tp_getattr */
-    0,                          /* tp_setattr */
-#else
-    (getattrfunc)do_share_getattr,  /* tp_getattr */
-    (setattrfunc)do_share_setattr,  /* tp_setattr */
-#endif
-    0,                          /* tp_reserved */
-    0,                          /* tp_repr */
-    0,                          /* tp_as_number */
-    0,                          /* tp_as_sequence */
-    0,                          /* tp_as_mapping */
-    0,                          /* tp_hash  */
-    0,                          /* tp_call */
-    0,                          /* tp_str */
-#if PY_MAJOR_VERSION >= 3
-    (getattrofunc)do_share_getattro, /* tp_getattro */
-    (setattrofunc)do_share_setattro, /* tp_setattro */
-#else
-    0,                          /* tp_getattro */
-    0,                          /* tp_setattro */
-#endif
-    0,                          /* tp_as_buffer */
-    PYCURL_TYPE_FLAGS,          /* tp_flags */
-    share_doc,                  /* tp_doc */
-    (traverseproc)do_share_traverse, /* tp_traverse */
-    (inquiry)do_share_clear,    /* tp_clear */
-    0,                          /* tp_richcompare */
-    offsetof(CurlShareObject, weakreflist), /* tp_weaklistoffset */
-    0,                          /* tp_iter */
-    0,                          /* tp_iternext */
-    curlshareobject_methods,    /* tp_methods */
-    0,                          /* tp_members */
-    0,                          /* tp_getset */
-    0,                          /* tp_base */
-    0,                          /* tp_dict */
-    0,                          /* tp_descr_get */
-    0,                          /* tp_descr_set */
-    0,                          /* tp_dictoffset */
-    0,                          /* tp_init */
-    PyType_GenericAlloc,        /* tp_alloc */
-    (newfunc)do_share_new,      /* tp_new */
-    PyObject_GC_Del,            /* tp_free */
+PyType_Spec CurlShare_Type_spec = {
+    "pycurl.CurlShare",
+    sizeof(CurlShareObject),
+    0,
+    PYCURL_TYPE_FLAGS,
+    CurlShare_Type_slots
 };
 
 /* vi:ts=4:et:nowrap
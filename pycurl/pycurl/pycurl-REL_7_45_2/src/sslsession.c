@@ -0,0 +1,695 @@
+#include "pycurl.h"
+#include "docstrings.h"
+
+#if defined(HAVE_PYCURL_SSL_SESSION_CACHE)
+
+/*************************************************************************
+// SslSessionCache
+**************************************************************************/
+
+/* The cache is shared by the Python object and by every SSL context it
+ * was attached to. Contexts can outlive the handle that created them (the
+ * connection stays in the connection cache) and are freed without the GIL,
+ * so the cache is reference counted separately and only uses its own lock. */
+
+static int ssl_session_link_index = -1;
+
+
+static void
+ssl_session_entry_free(SslSessionEntry *entry)
+{
+    SSL_SESSION_free(entry->session);
+    PyMem_RawFree(entry->key);
+    PyMem_RawFree(entry);
+}
+
+
+static SslSessionCache *
+ssl_session_cache_new(int max_entries)
+{
+    SslSessionCache *cache;
+
+    cache = PyMem_RawCalloc(1, sizeof(SslSessionCache));
+    if (cache == NULL) {
+        return NULL;
+    }
+    cache->lock = PyThread_allocate_lock();
+    if (cache->lock == NULL) {
+        PyMem_RawFree(cache);
+        return NULL;
+    }
+    cache->refcount = 1;
+    cache->max_entries = max_entries;
+    return cache;
+}
+
+
+static void
+ssl_session_cache_incref(SslSessionCache *cache)
+{
+    PyThread_acquire_lock(cache->lock, 1);
+    ++cache->refcount;
+    PyThread_release_lock(cache->lock);
+}
+
+
+static void
+ssl_session_cache_decref(SslSessionCache *cache)
+{
+    SslSessionEntry *entry, *next;
+    int refcount;
+
+    PyThread_acquire_lock(cache->lock, 1);
+    refcount = --cache->refcount;
+    PyThread_release_lock(cache->lock);
+    if (refcount > 0) {
+        return;
+    }
+    for (entry = cache->entries; entry != NULL; entry = next) {
+        next = entry->next;
+        ssl_session_entry_free(entry);
+    }
+    PyThread_free_lock(cache->lock);
+    PyMem_RawFree(cache);
+}
+
+
+/* the time after which the session cannot be resumed */
+static PY_LONG_LONG
+ssl_session_expires(const SSL_SESSION *session)
+{
+    PY_LONG_LONG expires, hint;
+
+    expires = (PY_LONG_LONG) SSL_SESSION_get_time(session) + SSL_SESSION_get_timeout(session);
+    hint = (PY_LONG_LONG) SSL_SESSION_get_ticket_lifetime_hint(session);
+    if (hint > 0 && SSL_SESSION_get_time(session) + hint < expires) {
+        expires = SSL_SESSION_get_time(session) + hint;
+    }
+    return expires;
+}
+
+
+/* Returns a copy of session that no connection uses. OpenSSL marks the
+ * session of a connection that was not shut down cleanly as not resumable
+ * when it removes it, so the cache never shares its sessions with live
+ * connections. Returns NULL if the session cannot be encoded or out of
+ * memory. */
+static SSL_SESSION *
+ssl_session_copy(SSL_SESSION *session)
+{
+    unsigned char *der, *p;
+    const unsigned char *q;
+    SSL_SESSION *copy;
+    int len;
+
+    len = i2d_SSL_SESSION(session, NULL);
+    if (len <= 0) {
+        return NULL;
+    }
+    der = PyMem_RawMalloc(len);
+    if (der == NULL) {
+        return NULL;
+    }
+    p = der;
+    i2d_SSL_SESSION(session, &p);
+    q = der;
+    copy = d2i_SSL_SESSION(NULL, &q, len);
+    PyMem_RawFree(der);
+    return copy;
+}
+
+
+/* Unlinks and frees *link, the caller holds the lock. */
+static void
+ssl_session_cache_unlink(SslSessionCache *cache, SslSessionEntry **link)
+{
+    SslSessionEntry *entry = *link;
+
+    *link = entry->next;
+    --cache->count;
+    ssl_session_entry_free(entry);
+}
+
+
+/* Stores session under key, replacing an existing session for the same key
+ * and evicting the oldest entry when the cache is full. Takes a reference
+ * to session. The caller holds the lock. Returns -1 if out of memory. */
+static int
+ssl_session_cache_put(SslSessionCache *cache, const char *key, SSL_SESSION *session, PY_LONG_LONG expires)
+{
+    SslSessionEntry *entry, **link;
+    size_t key_len = strlen(key);
+
+    for (link = &cache->entries; *link != NULL; link = &(*link)->next) {
+        if (strcmp((*link)->key, key) == 0) {
+            ssl_session_cache_unlink(cache, link);
+            break;
+        }
+    }
+
+    entry = PyMem_RawMalloc(sizeof(SslSessionEntry));
+    if (entry == NULL) {
+        return -1;
+    }
+    entry->key = PyMem_RawMalloc(key_len + 1);
+    if (entry->key == NULL) {
+        PyMem_RawFree(entry);
+        return -1;
+    }
+    memcpy(entry->key, key, key_len + 1);
+    SSL_SESSION_up_ref(session);
+    entry->session = session;
+    entry->expires = expires;
+    entry->next = cache->entries;
+    cache->entries = entry;
+    ++cache->count;
+
+    if (cache->count > cache->max_entries) {
+        for (link = &cache->entries; (*link)->next != NULL; link = &(*link)->next)
+            ;
+        ssl_session_cache_unlink(cache, link);
+    }
+    return 0;
+}
+
+
+/* --------------- SSL context hooks --------------- */
+
+/* What an SSL context needs to find its cache entry, stored as ex_data of
+ * the context by ssl_session_cache_attach(). */
+typedef struct {
+    SslSessionCache *cache;
+    char *key;                      /* "host:port" of the transfer */
+    char *host;                     /* expected server name indication */
+    int (*new_cb)(SSL *, SSL_SESSION *);    /* set by libcurl */
+} SslSessionLink;
+
+
+static void
+ssl_session_link_free(void *parent, void *ptr, CRYPTO_EX_DATA *ad, int idx, long argl, void *argp)
+{
+    SslSessionLink *link = (SslSessionLink *) ptr;
+
+    UNUSED(parent);
+    UNUSED(ad);
+    UNUSED(idx);
+    UNUSED(argl);
+    UNUSED(argp);
+
+    if (link == NULL) {
+        return;
+    }
+    ssl_session_cache_decref(link->cache);
+    curl_free(link->key);
+    curl_free(link->host);
+    PyMem_RawFree(link);
+}
+
+
+/* libcurl calls the SSL context callback for proxy connections as well,
+ * only sessions with the origin are cached */
+static SslSessionLink *
+ssl_session_get_link(const SSL *ssl)
+{
+    SslSessionLink *link;
+    const char *servername;
+
+    link = SSL_CTX_get_ex_data(SSL_get_SSL_CTX(ssl), ssl_session_link_index);
+    if (link == NULL) {
+        return NULL;
+    }
+    servername = SSL_get_servername(ssl, TLSEXT_NAMETYPE_host_name);
+    /* there is no server name indication for ip addresses */
+    if (servername != NULL && !curl_strequal(servername, link->host)) {
+        return NULL;
+    }
+    return link;
+}
+
+
+/* There is no remove callback: OpenSSL removes the session of every
+ * connection that was not shut down cleanly, which includes servers that
+ * close the connection after the response. As in libcurl's own cache,
+ * sessions are only replaced by newer ones or expire. The cache stores a
+ * copy, which the removal does not mark as not resumable. */
+static int
+ssl_session_new_callback(SSL *ssl, SSL_SESSION *session)
+{
+    SslSessionLink *link;
+    SslSessionCache *cache;
+    SSL_SESSION *copy;
+    int res = 0;
+
+    link = SSL_CTX_get_ex_data(SSL_get_SSL_CTX(ssl), ssl_session_link_index);
+    assert(link != NULL);
+    /* libcurl's own callback keeps the session for this process */
+    if (link->new_cb != NULL) {
+        res = link->new_cb(ssl, session);
+    }
+    if (ssl_session_get_link(ssl) == NULL || !SSL_SESSION_is_resumable(session)) {
+        return res;
+    }
+
+    copy = ssl_session_copy(session);
+    if (copy == NULL) {
+        ERR_clear_error();
+        return res;
+    }
+    cache = link->cache;
+    PyThread_acquire_lock(cache->lock, 1);
+    if (ssl_session_cache_put(cache, link->key, copy, ssl_session_expires(copy)) == 0) {
+        ++cache->stored;
+    }
+    PyThread_release_lock(cache->lock);
+    SSL_SESSION_free(copy);
+    /* ownership of session stays with the caller unless libcurl's
+     * callback took it */
+    return res;
+}
+
+
+/* Offers a cached session when a handshake starts, unless libcurl resumes
+ * one of its own, and counts abbreviated handshakes. The new session
+ * callback is chained here rather than in ssl_session_cache_attach()
+ * because libcurl is done setting up the context by now. */
+static void
+ssl_session_info_callback(const SSL *ssl, int where, int ret)
+{
+    SslSessionLink *link;
+    SslSessionCache *cache;
+    SSL_CTX *ctx = SSL_get_SSL_CTX(ssl);
+    SslSessionEntry **entry;
+    SSL_SESSION *session = NULL;
+
+    UNUSED(ret);
+
+    link = ssl_session_get_link(ssl);
+    if (link == NULL) {
+        return;
+    }
+    cache = link->cache;
+
+    if (where & SSL_CB_HANDSHAKE_START) {
+        if (SSL_CTX_sess_get_new_cb(ctx) != ssl_session_new_callback) {
+            link->new_cb = SSL_CTX_sess_get_new_cb(ctx);
+            SSL_CTX_set_session_cache_mode(ctx, SSL_CTX_get_session_cache_mode(ctx) |
+                                                SSL_SESS_CACHE_CLIENT | SSL_SESS_CACHE_NO_INTERNAL);
+            SSL_CTX_sess_set_new_cb(ctx, ssl_session_new_callback);
+        }
+        if (SSL_get_session(ssl) != NULL) {
+            return;
+        }
+
+        PyThread_acquire_lock(cache->lock, 1);
+        for (entry = &cache->entries; *entry != NULL; entry = &(*entry)->next) {
+            if (strcmp((*entry)->key, link->key) == 0) {
+                if ((*entry)->expires <= (PY_LONG_LONG) time(NULL) ||
+                    !SSL_SESSION_is_resumable((*entry)->session)) {
+                    ssl_session_cache_unlink(cache, entry);
+                } else {
+                    /* the connection gets its own copy, see ssl_session_copy() */
+                    session = ssl_session_copy((*entry)->session);
+                    if (session == NULL) {
+                        ERR_clear_error();
+                    } else {
+                        ++cache->offered;
+                    }
+                }
+                break;
+            }
+        }
+        PyThread_release_lock(cache->lock);
+
+        if (session != NULL) {
+            SSL_set_session((SSL *) ssl, session);
+            SSL_SESSION_free(session);
+        }
+    } else if ((where & SSL_CB_HANDSHAKE_DONE) && SSL_session_reused((SSL *) ssl)) {
+        PyThread_acquire_lock(cache->lock, 1);
+        ++cache->resumed;
+        PyThread_release_lock(cache->lock);
+    }
+}
+
+
+/* Called from ssl_ctx_callback() for every new SSL context of a handle with
+ * a session cache. Does not need the GIL. */
+PYCURL_INTERNAL int
+ssl_session_cache_attach(SslSessionCache *cache, CURL *curl, SSL_CTX *ctx)
+{
+    SslSessionLink *link;
+    char *url = NULL;
+    char *host = NULL, *port = NULL;
+    CURLU *u;
+    CURLUcode uc;
+
+    if (curl_easy_getinfo(curl, CURLINFO_EFFECTIVE_URL, &url) != CURLE_OK || url == NULL) {
+        /* nothing to key the sessions by, connect without the cache */
+        return 0;
+    }
+    u = curl_url();
+    if (u == NULL) {
+        return -1;
+    }
+    uc = curl_url_set(u, CURLUPART_URL, url, 0);
+    if (uc == CURLUE_OK) {
+        uc = curl_url_get(u, CURLUPART_HOST, &host, 0);
+    }
+    if (uc == CURLUE_OK) {
+        uc = curl_url_get(u, CURLUPART_PORT, &port, CURLU_DEFAULT_PORT);
+    }
+    curl_url_cleanup(u);
+    if (uc != CURLUE_OK) {
+        curl_free(host);
+        curl_free(port);
+        return uc == CURLUE_OUT_OF_MEMORY ? -1 : 0;
+    }
+
+    link = PyMem_RawCalloc(1, sizeof(SslSessionLink));
+    if (link == NULL) {
+        curl_free(host);
+        curl_free(port);
+        return -1;
+    }
+    link->host = host;
+    link->key = curl_maprintf("%s:%s", host, port);
+    curl_free(port);
+    if (link->key == NULL) {
+        curl_free(link->host);
+        PyMem_RawFree(link);
+        return -1;
+    }
+    ssl_session_cache_incref(cache);
+    link->cache = cache;
+    if (!SSL_CTX_set_ex_data(ctx, ssl_session_link_index, link)) {
+        ssl_session_link_free(NULL, link, NULL, 0, 0, NULL);
+        return -1;
+    }
+    SSL_CTX_set_info_callback(ctx, ssl_session_info_callback);
+    return 0;
+}
+
+
+/* process wide, called once from module initialization */
+PYCURL_INTERNAL int
+ssl_session_cache_init(void)
+{
+    if (ssl_session_link_index < 0) {
+        ssl_session_link_index = SSL_CTX_get_ex_new_index(0, NULL, NULL, NULL, ssl_session_link_free);
+        if (ssl_session_link_index < 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+
+/*************************************************************************
+// CurlSslSessionCacheObject
+**************************************************************************/
+
+static char *ssl_session_cache_keywords[] = {"max_entries", NULL};
+
+
+static int
+check_ssl_session_cache_state(const CurlSslSessionCacheObject *self, const char *name)
+{
+    if (PYCURL_INHERITED(self)) {
+        PyErr_Format(PYCURL_STATE(self)->error, "cannot invoke %s() - session cache was inherited across fork()", name);
+        return -1;
+    }
+    return 0;
+}
+
+
+/* constructor */
+PYCURL_INTERNAL CurlSslSessionCacheObject *
+do_ssl_session_cache_new(PyTypeObject *subtype, PyObject *args, PyObject *kwds)
+{
+    CurlSslSessionCacheObject *self;
+    int max_entries = 1024;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:SslSessionCache", ssl_session_cache_keywords, &max_entries)) {
+        return NULL;
+    }
+    if (max_entries <= 0) {
+        PyErr_SetString(PyExc_ValueError, "max_entries must be greater than zero");
+        return NULL;
+    }
+
+    self = (CurlSslSessionCacheObject *) subtype->tp_alloc(subtype, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->fork_generation = pycurl_fork_generation;
+    self->cache = ssl_session_cache_new(max_entries);
+    if (self->cache == NULL) {
+        Py_DECREF(self);
+        return (CurlSslSessionCacheObject *) PyErr_NoMemory();
+    }
+    return self;
+}
+
+
+PYCURL_INTERNAL void
+do_ssl_session_cache_dealloc(CurlSslSessionCacheObject *self)
+{
+    PyTypeObject *tp = Py_TYPE(self);
+
+    if (self->weakreflist != NULL) {
+        PyObject_ClearWeakRefs((PyObject *) self);
+    }
+    /* the lock of an inherited cache may have been held by a thread that
+     * does not exist in this process, leak it */
+    if (self->cache != NULL && !PYCURL_INHERITED(self)) {
+        ssl_session_cache_decref(self->cache);
+    }
+    self->cache = NULL;
+    tp->tp_free(self);
+    Py_DECREF(tp);
+}
+
+
+static Py_ssize_t
+do_ssl_session_cache_len(CurlSslSessionCacheObject *self)
+{
+    Py_ssize_t count;
+
+    if (check_ssl_session_cache_state(self, "len") != 0) {
+        return -1;
+    }
+    PyThread_acquire_lock(self->cache->lock, 1);
+    count = self->cache->count;
+    PyThread_release_lock(self->cache->lock);
+    return count;
+}
+
+
+/* --------------- methods --------------- */
+
+static PyObject *
+do_ssl_session_cache_dump(CurlSslSessionCacheObject *self)
+{
+    SslSessionCache *cache = self->cache;
+    SslSessionEntry *entry;
+    PyObject *ret, *item;
+    unsigned char *der, *p;
+    PY_LONG_LONG now = (PY_LONG_LONG) time(NULL);
+    int len;
+
+    if (check_ssl_session_cache_state(self, "dump") != 0) {
+        return NULL;
+    }
+    ret = PyList_New(0);
+    if (ret == NULL) {
+        return NULL;
+    }
+
+    PyThread_acquire_lock(cache->lock, 1);
+    for (entry = cache->entries; entry != NULL; entry = entry->next) {
+        if (entry->expires <= now) {
+            continue;
+        }
+        len = i2d_SSL_SESSION(entry->session, NULL);
+        if (len <= 0) {
+            continue;
+        }
+        der = PyMem_Malloc(len);
+        if (der == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
+        p = der;
+        i2d_SSL_SESSION(entry->session, &p);
+        item = Py_BuildValue("(sy#L)", entry->key, der, (Py_ssize_t) len, entry->expires);
+        PyMem_Free(der);
+        if (item == NULL) {
+            goto error;
+        }
+        if (PyList_Append(ret, item) != 0) {
+            Py_DECREF(item);
+            goto error;
+        }
+        Py_DECREF(item);
+    }
+    PyThread_release_lock(cache->lock);
+    /* oldest first, so that loading the list keeps the eviction order */
+    if (PyList_Reverse(ret) != 0) {
+        Py_DECREF(ret);
+        return NULL;
+    }
+    return ret;
+
+error:
+    PyThread_release_lock(cache->lock);
+    Py_DECREF(ret);
+    return NULL;
+}
+
+
+static PyObject *
+do_ssl_session_cache_load(CurlSslSessionCacheObject *self, PyObject *args)
+{
+    SslSessionCache *cache = self->cache;
+    PyObject *items, *iter, *item;
+    const char *key;
+    const unsigned char *der;
+    Py_ssize_t len;
+    PY_LONG_LONG expires, now = (PY_LONG_LONG) time(NULL);
+    SSL_SESSION *session;
+    long loaded = 0;
+    int res;
+
+    if (!PyArg_ParseTuple(args, "O:load", &items)) {
+        return NULL;
+    }
+    if (check_ssl_session_cache_state(self, "load") != 0) {
+        return NULL;
+    }
+    iter = PyObject_GetIter(items);
+    if (iter == NULL) {
+        return NULL;
+    }
+    while ((item = PyIter_Next(iter)) != NULL) {
+        if (!PyTuple_Check(item)) {
+            PyErr_SetString(PyExc_TypeError, "load items must be (key, der, expires) tuples");
+            Py_DECREF(item);
+            goto error;
+        }
+        if (!PyArg_ParseTuple(item, "sy#L:load", &key, &der, &len, &expires)) {
+            Py_DECREF(item);
+            goto error;
+        }
+        /* expired sessions and sessions that this TLS library cannot
+         * decode are skipped, the file may have been written by another
+         * version */
+        session = expires > now ? d2i_SSL_SESSION(NULL, &der, (long) len) : NULL;
+        if (session == NULL) {
+            ERR_clear_error();
+            Py_DECREF(item);
+            continue;
+        }
+        PyThread_acquire_lock(cache->lock, 1);
+        res = ssl_session_cache_put(cache, key, session, expires);
+        PyThread_release_lock(cache->lock);
+        SSL_SESSION_free(session);
+        Py_DECREF(item);
+        if (res != 0) {
+            PyErr_NoMemory();
+            goto error;
+        }
+        ++loaded;
+    }
+    Py_DECREF(iter);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    return PyInt_FromLong(loaded);
+
+error:
+    Py_DECREF(iter);
+    return NULL;
+}
+
+
+static PyObject *
+do_ssl_session_cache_clear(CurlSslSessionCacheObject *self)
+{
+    SslSessionCache *cache = self->cache;
+
+    if (check_ssl_session_cache_state(self, "clear") != 0) {
+        return NULL;
+    }
+    PyThread_acquire_lock(cache->lock, 1);
+    while (cache->entries != NULL) {
+        ssl_session_cache_unlink(cache, &cache->entries);
+    }
+    PyThread_release_lock(cache->lock);
+    Py_RETURN_NONE;
+}
+
+
+static PyObject *
+do_ssl_session_cache_stats(CurlSslSessionCacheObject *self)
+{
+    SslSessionCache *cache = self->cache;
+    unsigned long stored, offered, resumed;
+
+    if (check_ssl_session_cache_state(self, "stats") != 0) {
+        return NULL;
+    }
+    PyThread_acquire_lock(cache->lock, 1);
+    stored = cache->stored;
+    offered = cache->offered;
+    resumed = cache->resumed;
+    PyThread_release_lock(cache->lock);
+    return Py_BuildValue("{s:k,s:k,s:k}", "stored", stored, "offered", offered, "resumed", resumed);
+}
+
+
+static PyObject *do_ssl_session_cache_getstate(CurlSslSessionCacheObject *self)
+{
+    PyErr_SetString(PyExc_TypeError, "SslSessionCache objects do not support serialization, use dump()");
+    return NULL;
+}
+
+
+PYCURL_INTERNAL PyMethodDef curlsslsessioncacheobject_methods[] = {
+    {"dump", (PyCFunction)do_ssl_session_cache_dump, METH_NOARGS, ssl_session_cache_dump_doc},
+    {"load", (PyCFunction)do_ssl_session_cache_load, METH_VARARGS, ssl_session_cache_load_doc},
+    {"clear", (PyCFunction)do_ssl_session_cache_clear, METH_NOARGS, ssl_session_cache_clear_doc},
+    {"stats", (PyCFunction)do_ssl_session_cache_stats, METH_NOARGS, ssl_session_cache_stats_doc},
+    {"__getstate__", (PyCFunction)do_ssl_session_cache_getstate, METH_NOARGS, NULL},
+    {NULL, NULL, 0, 0}
+};
+
+
+/* --------------- type --------------- */
+
+static PyMemberDef curlsslsessioncacheobject_members[] = {
+    {"__weaklistoffset__", T_PYSSIZET, offsetof(CurlSslSessionCacheObject, weakreflist), READONLY},
+    {NULL}
+};
+
+static PyType_Slot CurlSslSessionCache_Type_slots[] = {
+    {Py_tp_dealloc, do_ssl_session_cache_dealloc},
+    {Py_tp_doc, (void *) ssl_session_cache_doc},
+    {Py_tp_methods, curlsslsessioncacheobject_methods},
+    {Py_tp_members, curlsslsessioncacheobject_members},
+    {Py_tp_new, do_ssl_session_cache_new},
+    {Py_mp_length, do_ssl_session_cache_len},
+    {0, NULL}
+};
+
+PyType_Spec CurlSslSessionCache_Type_spec = {
+    "pycurl.SslSessionCache",
+    sizeof(CurlSslSessionCacheObject),
+    0,
+    Py_TPFLAGS_DEFAULT,
+    CurlSslSessionCache_Type_slots
+};
+
+#endif /* HAVE_PYCURL_SSL_SESSION_CACHE */
+
+/* vi:ts=4:et:nowrap
+ */
@@ -13,7 +13,7 @@ pycurl_get_thread_state(const CurlObject *self)
      */
     if (self == NULL)
         return NULL;
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_Curl_Type) == 1);
+    assert(PyObject_TypeCheck((PyObject *) self, PYCURL_STATE(self)->curl_type));
     if (self->state != NULL)
     {
         /* inside perform() */
@@ -43,7 +43,7 @@ pycurl_get_thread_state_multi(const CurlMultiObject *self)
      */
     if (self == NULL)
         return NULL;
-    assert(PyObject_IsInstance((PyObject *) self, (PyObject *) p_CurlMulti_Type) == 1);
+    assert(PyObject_TypeCheck((PyObject *) self, PYCURL_STATE(self)->curl_multi_type));
     if (self->state != NULL)
     {
         /* inside multi_perform() */
@@ -275,10 +275,72 @@ pycurl_ssl_cleanup(void)
 // CurlShareObject
 **************************************************************************/
 
+static PY_LONG_LONG
+share_lock_clock_ns(void)
+{
+#if defined(WIN32)
+    static LARGE_INTEGER frequency;
+    LARGE_INTEGER counter;
+
+    if (frequency.QuadPart == 0) {
+        QueryPerformanceFrequency(&frequency);
+    }
+    QueryPerformanceCounter(&counter);
+    return (PY_LONG_LONG) (counter.QuadPart * 1000000000.0 / frequency.QuadPart);
+#else
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (PY_LONG_LONG) ts.tv_sec * 1000000000 + ts.tv_nsec;
+#endif
+}
+
+/* Acquires lock, trying without blocking first so that the clock is only
+ * read when the lock is contended. Returns the time spent waiting in
+ * nanoseconds, or -1 if the lock was free. */
+static PY_LONG_LONG
+share_lock_acquire_timed(PyThread_type_lock lock)
+{
+    PY_LONG_LONG start;
+
+    if (PyThread_acquire_lock(lock, 0)) {
+        return -1;
+    }
+    start = share_lock_clock_ns();
+    PyThread_acquire_lock(lock, 1);
+    return share_lock_clock_ns() - start;
+}
+
+static void
+share_lock_count(ShareLockStats *stats, PY_LONG_LONG wait_ns)
+{
+    ++stats->acquisitions;
+    if (wait_ns >= 0) {
+        ++stats->contended;
+        stats->wait_ns += wait_ns;
+        if (wait_ns > stats->max_wait_ns) {
+            stats->max_wait_ns = wait_ns;
+        }
+    }
+}
+
 PYCURL_INTERNAL void
 share_lock_lock(ShareLock *lock, curl_lock_data data)
+{
+    PY_LONG_LONG wait_ns;
+
+    wait_ns = share_lock_acquire_timed(lock->locks[data]);
+    share_lock_count(&lock->stats[data], wait_ns);
+}
+
+/* Copies the statistics for data. Takes the lock exclusively, the caller
+ * must not hold the GIL. */
+PYCURL_INTERNAL void
+share_lock_get_stats(ShareLock *lock, curl_lock_data data, ShareLockStats *stats)
 {
     PyThread_acquire_lock(lock->locks[data], 1);
+    *stats = lock->stats[data];
+    PyThread_release_lock(lock->locks[data]);
 }
 
 PYCURL_INTERNAL void
@@ -296,6 +358,7 @@ share_lock_new(void)
         PyErr_NoMemory();
         return NULL;
     }
+    memset(lock, 0, sizeof(ShareLock));
 
     for (i = 0; i < CURL_LOCK_DATA_LAST; ++i) {
         lock->locks[i] = PyThread_allocate_lock();
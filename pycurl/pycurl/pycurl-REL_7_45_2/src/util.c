@@ -25,7 +25,7 @@ create_and_set_error_object(CurlObject *self, int code)
     self->error[sizeof(self->error) - 1] = 0;
     e = create_error_object(self, code);
     if (e != NULL) {
-        PyErr_SetObject(ErrorObject, e);
+        PyErr_SetObject(PYCURL_STATE(self)->error, e);
         Py_DECREF(e);
     }
 }
@@ -30,6 +30,33 @@ def forbidden():
 def not_found():
     return bottle.HTTPResponse('not found', 404)
 
+@app.route('/status/503')
+def service_unavailable():
+    return bottle.HTTPResponse('service unavailable', 503)
+
+@app.route('/sleep')
+def sleep():
+    _time.sleep(float(bottle.request.query.get('t', 0.5)))
+    return 'success'
+
+fail_once_seen = set()
+
+@app.route('/fail_once/<key>')
+def fail_once(key):
+    # 503 on the first request for each key, then behaves like /sleep
+    if key not in fail_once_seen:
+        fail_once_seen.add(key)
+        return bottle.HTTPResponse('service unavailable', 503)
+    return sleep()
+
+@app.route('/bytes/<size:int>')
+def sized_body(size):
+    return b'x' * size
+
+@app.route('/upload', method='post')
+def upload():
+    return str(len(bottle.request.body.read()))
+
 @app.route('/postfields', method='get')
 @app.route('/postfields', method='post')
 def postfields():
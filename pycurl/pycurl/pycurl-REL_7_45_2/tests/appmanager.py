@@ -38,6 +38,7 @@ def run_standalone():
     funcs.append(setup(('app', 8382)))
     funcs.append(setup(('app', 8383, dict(ssl=True))))
     funcs.append(setup(('app', 8384, dict(ssl=True))))
+    funcs.append(setup(('app', 8385, dict(threaded=True))))
 
     for setup_func, teardown_func in funcs:
         setup_func(sys.modules[__name__])
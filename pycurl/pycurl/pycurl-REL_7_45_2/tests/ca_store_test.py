@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import gc
+import os
+import weakref
+import pycurl
+import pytest
+import unittest
+
+from . import appmanager
+from . import util
+
+setup_module, teardown_module = appmanager.setup(('app', 8384, dict(ssl=True)))
+
+CA_FILE = os.path.join(os.path.dirname(__file__), 'certs', 'ca.crt')
+SERVER_CERT_FILE = os.path.join(os.path.dirname(__file__), 'certs', 'server.crt')
+
+def fetch(curl):
+    sio = util.BytesIO()
+    curl.setopt(pycurl.URL, 'https://localhost:8384/success')
+    curl.setopt(pycurl.WRITEFUNCTION, sio.write)
+    # self signed certificate, the store must provide the ca cert
+    curl.setopt(pycurl.SSL_VERIFYPEER, 1)
+    curl.perform()
+    return sio.getvalue().decode()
+
+@pytest.mark.skipif(not hasattr(pycurl, 'CaStore'), reason='requires libcurl with OpenSSL 1.1.0 or newer')
+class CaStoreTest(unittest.TestCase):
+    def test_cafile(self):
+        store = pycurl.CaStore(cafile=CA_FILE)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+
+    def test_cadata(self):
+        with open(CA_FILE, 'rb') as stream:
+            cadata = stream.read().decode('ASCII')
+        store = pycurl.CaStore(cadata=cadata)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+
+    def test_shared_by_handles(self):
+        store = pycurl.CaStore(cafile=CA_FILE)
+        handles = [util.DefaultCurlLocalhost(8384) for _ in range(3)]
+        for curl in handles:
+            curl.set_ca_store(store)
+        # the handles keep the store alive
+        ref = weakref.ref(store)
+        del store
+        gc.collect()
+        assert ref() is not None
+        for curl in handles:
+            # no connection reuse, every request verifies a new connection
+            curl.setopt(pycurl.FORBID_REUSE, 1)
+            self.assertEqual('success', fetch(curl))
+        clone = handles[0].duphandle()
+        self.assertEqual('success', fetch(clone))
+        for curl in handles + [clone]:
+            curl.close()
+        gc.collect()
+        assert ref() is None
+
+    def test_reset_removes_store(self):
+        store = pycurl.CaStore(cafile=CA_FILE)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        curl.reset()
+        try:
+            fetch(curl)
+            self.fail('the ca cert should have been removed by reset()')
+        except pycurl.error as e:
+            assert e.args[0] in (pycurl.E_SSL_CACERT, pycurl.E_PEER_FAILED_VERIFICATION)
+        curl.close()
+
+    def test_ca_options_refused_with_store(self):
+        store = pycurl.CaStore(cafile=CA_FILE)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        # the store would silently replace the certificates of these options
+        for option in (pycurl.CAINFO, pycurl.CAPATH, pycurl.CRLFILE):
+            with pytest.raises(pycurl.error):
+                curl.setopt(option, CA_FILE)
+        curl.setopt(pycurl.CAINFO, None)
+        curl.setopt(pycurl.CAPATH, None)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+
+    def test_detach_store(self):
+        store = pycurl.CaStore(cafile=CA_FILE)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        curl.set_ca_store(None)
+        curl.setopt(pycurl.FORBID_REUSE, 1)
+        try:
+            fetch(curl)
+            self.fail('the ca cert should have been removed by set_ca_store(None)')
+        except pycurl.error as e:
+            assert e.args[0] in (pycurl.E_SSL_CACERT, pycurl.E_PEER_FAILED_VERIFICATION)
+        curl.setopt(pycurl.CAINFO, CA_FILE)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+
+    def test_keeps_partial_chain_flag(self):
+        # only the server certificate, its issuer is not in the store
+        store = pycurl.CaStore(cafile=SERVER_CERT_FILE)
+        curl = util.DefaultCurlLocalhost(8384)
+        curl.set_ca_store(store)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+
+    def test_requires_certificates(self):
+        with pytest.raises(TypeError):
+            pycurl.CaStore()
+
+    def test_missing_file(self):
+        with pytest.raises(pycurl.error):
+            pycurl.CaStore(cafile=os.path.join(os.path.dirname(__file__), 'certs', 'missing.crt'))
+
+    def test_bogus_cadata(self):
+        with pytest.raises(pycurl.error):
+            pycurl.CaStore(cadata='hello world')
+        with pytest.raises(TypeError):
+            pycurl.CaStore(cadata=42)
+
+    def test_set_ca_store_bogus_type(self):
+        curl = util.DefaultCurl()
+        with pytest.raises(TypeError):
+            curl.set_ca_store(CA_FILE)
+        curl.close()
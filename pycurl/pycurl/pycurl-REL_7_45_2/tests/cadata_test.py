@@ -31,6 +31,22 @@ class CaCertsTest(unittest.TestCase):
         self.curl.perform()
         assert sio.getvalue().decode() == 'success'
 
+    @util.only_ssl_backends('openssl')
+    def test_duphandle(self):
+        with open(os.path.join(os.path.dirname(__file__), 'certs', 'ca.crt'), 'rb') as stream:
+            cadata = stream.read().decode('ASCII')
+        self.curl.setopt(pycurl.URL, 'https://localhost:8384/success')
+        self.curl.set_ca_certs(cadata)
+        self.curl.setopt(pycurl.SSL_VERIFYPEER, 1)
+        dup = self.curl.duphandle()
+        # the clone must not call back with the original handle
+        self.curl.close()
+        sio = util.BytesIO()
+        dup.setopt(pycurl.WRITEFUNCTION, sio.write)
+        dup.perform()
+        dup.close()
+        assert sio.getvalue().decode() == 'success'
+
     @util.only_ssl_backends('openssl')
     def test_set_ca_certs_bytes(self):
         self.curl.set_ca_certs(util.b('hello world\x02\xe0'))
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import time
+import asyncio
+import threading
+import pytest
+import unittest
+
+from . import localhost
+from . import appmanager
+from . import util
+
+pycurl_client = util.import_pycurl_client()
+
+setup_module, teardown_module = appmanager.setup(('app', 8385, dict(threaded=True)))
+
+url = 'http://%s:8385/' % localhost
+# hashes to the other shard of a two-shard RequestAsyncSharded
+other_url = 'http://localhost:8385/'
+
+# 1 MB/s; the buckets allow a burst of a tenth of a second
+cap = 1024 * 1024
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientBandwidthThreadTest(unittest.TestCase):
+    def test_recv_cap(self):
+        client = pycurl_client.RequestThread(max_clients=4, max_recv_speed=cap)
+        try:
+            start = time.monotonic()
+            responses = run_threads([lambda: client.get(url + 'bytes/262144')] * 4)
+            elapsed = time.monotonic() - start
+            self.assertEqual([262144] * 4, [len(response.content) for response in responses])
+            self.assertGreater(elapsed, 0.8)
+            self.assertLess(elapsed, 1.5)
+        finally:
+            client.close()
+
+    def test_send_cap(self):
+        client = pycurl_client.RequestThread(max_clients=2, max_send_speed=cap)
+        try:
+            start = time.monotonic()
+            responses = run_threads([lambda: client.post(url + 'upload', body='y' * 524288)] * 2)
+            elapsed = time.monotonic() - start
+            self.assertEqual([b'524288'] * 2, [response.content for response in responses])
+            self.assertGreater(elapsed, 0.8)
+            self.assertLess(elapsed, 1.5)
+        finally:
+            client.close()
+
+    def test_capped_handle_is_reused(self):
+        client = pycurl_client.RequestThread(max_clients=1, max_recv_speed=cap)
+        try:
+            for _ in range(3):
+                self.assertEqual(65536, len(client.get(url + 'bytes/65536').content))
+            self.assertEqual(1, client.pool_stats()['size'])
+        finally:
+            client.close()
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientBandwidthAsyncTest(unittest.TestCase):
+    def test_recv_cap(self):
+        async def check():
+            client = await pycurl_client.RequestAsync.create(max_clients=4, max_recv_speed=cap)
+            try:
+                start = time.monotonic()
+                responses = await asyncio.gather(*[client.get(url + 'bytes/262144') for _ in range(4)])
+                elapsed = time.monotonic() - start
+                self.assertEqual([262144] * 4, [len(response.content) for response in responses])
+                self.assertGreater(elapsed, 0.8)
+                self.assertLess(elapsed, 1.5)
+            finally:
+                client.close()
+        asyncio.run(check())
+
+    def test_cancel_while_paused(self):
+        async def check():
+            client = await pycurl_client.RequestAsync.create(max_clients=1, max_recv_speed=cap)
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(client.get(url + 'bytes/4194304'), 0.3)
+                self.assertEqual(0, client.pool_stats()['in_use'])
+                # the cancelled transfer no longer draws from the bucket
+                await asyncio.sleep(0.2)
+                start = time.monotonic()
+                self.assertEqual(65536, len((await client.get(url + 'bytes/65536')).content))
+                self.assertLess(time.monotonic() - start, 0.5)
+            finally:
+                client.close()
+        asyncio.run(check())
+
+    def test_shards_share_one_cap(self):
+        async def check():
+            client = await pycurl_client.RequestAsyncSharded.create(shards=2, max_clients=2, max_recv_speed=cap)
+            try:
+                self.assertIsNot(client._get_shard(url), client._get_shard(other_url))
+                start = time.monotonic()
+                responses = await asyncio.gather(client.get(url + 'bytes/524288'),
+                                                 client.get(other_url + 'bytes/524288'))
+                elapsed = time.monotonic() - start
+                self.assertEqual([524288] * 2, [len(response.content) for response in responses])
+                self.assertGreater(elapsed, 0.8)
+                self.assertLess(elapsed, 1.5)
+                # a single busy shard can use the whole cap
+                start = time.monotonic()
+                self.assertEqual(1048576, len((await client.get(url + 'bytes/1048576')).content))
+                self.assertLess(time.monotonic() - start, 1.5)
+            finally:
+                await client.close()
+        asyncio.run(check())
+
+def run_threads(targets):
+    '''Runs the targets in threads and returns their results.'''
+    results = [None] * len(targets)
+
+    def run(index):
+        results[index] = targets[index]()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(targets))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import time
+import asyncio
+import threading
+import pycurl
+import pytest
+import unittest
+
+from . import localhost
+from . import appmanager
+from . import util
+
+pycurl_client = util.import_pycurl_client()
+
+setup_module, teardown_module = appmanager.setup(('app', 8385, dict(threaded=True)))
+
+url = 'http://%s:8385/' % localhost
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientCoalesceAsyncTest(unittest.TestCase):
+    def run_client(self, check, **kwargs):
+        async def run():
+            client = await pycurl_client.RequestAsync.create(max_clients=4, coalesce=True, **kwargs)
+            try:
+                await check(client)
+            finally:
+                client.close()
+        asyncio.run(run())
+
+    def coalesced(self, client):
+        return client.host_stats()['%s:8385' % localhost]['coalesced']
+
+    def test_identical_requests_share_one_transfer(self):
+        async def check(client):
+            responses = await asyncio.gather(*[client.get(url + 'sleep?t=0.2') for _ in range(3)])
+            self.assertEqual([b'success'] * 3, [response.content for response in responses])
+            self.assertEqual(2, self.coalesced(client))
+        self.run_client(check)
+
+    def test_new_request_after_all_waiters_time_out(self):
+        async def retry_after_timeout(client):
+            try:
+                return await asyncio.wait_for(client.get(url + 'sleep?t=0.3'), 0.05)
+            except asyncio.TimeoutError:
+                # the abandoned transfer is still being cancelled; this request must not join it
+                return await client.get(url + 'sleep?t=0.3')
+
+        async def check(client):
+            results = await asyncio.gather(retry_after_timeout(client), retry_after_timeout(client))
+            self.assertEqual([b'success'] * 2, [response.content for response in results])
+        self.run_client(check)
+
+    def test_follower_deadline_outlives_leader(self):
+        async def check(client):
+            leader = asyncio.ensure_future(client.get(url + 'sleep?t=0.3', deadline=time.monotonic() + 0.1))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(client.get(url + 'sleep?t=0.3'))
+            with self.assertRaises(asyncio.TimeoutError):
+                await leader
+            self.assertEqual(b'success', (await follower).content)
+            self.assertEqual(1, self.coalesced(client))
+        self.run_client(check)
+
+    def test_transfer_options_are_part_of_the_key(self):
+        async def check(client):
+            await asyncio.gather(
+                client.get(url + 'sleep?t=0.1'),
+                client.get(url + 'sleep?t=0.1', verify=False),
+                client.get(url + 'sleep?t=0.1', headers={'Cookie': 'a=1'}),
+                client.get(url + 'sleep?t=0.1', timeout=5),
+                client.get(url + 'sleep?t=0.1', retry=False))
+            self.assertEqual(0, self.coalesced(client))
+        self.run_client(check, max_host_clients=8)
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientCoalesceThreadTest(unittest.TestCase):
+    def setUp(self):
+        self.client = pycurl_client.RequestThread(max_clients=4, coalesce=True)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_identical_requests_share_one_transfer(self):
+        sent = []
+        request = self.client._request
+
+        def counting_request(*args):
+            sent.append(args)
+            return request(*args)
+        self.client._request = counting_request
+        responses = run_threads([lambda: self.client.get(url + 'sleep?t=0.2')] * 3)
+        self.assertEqual([b'success'] * 3, [response.content for response in responses])
+        self.assertEqual(1, len(sent))
+
+    def test_options_are_part_of_the_key(self):
+        sent = []
+        request = self.client._request
+
+        def counting_request(*args):
+            sent.append(args)
+            return request(*args)
+        self.client._request = counting_request
+        run_threads([lambda: self.client.get(url + 'sleep?t=0.2'),
+                     lambda: self.client.get(url + 'sleep?t=0.2', verify=False)])
+        self.assertEqual(2, len(sent))
+
+    def test_leader_interrupt_is_not_shared(self):
+        request = self.client._request
+        calls = []
+
+        def interrupted_request(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise KeyboardInterrupt
+            return request(*args)
+        self.client._request = interrupted_request
+        outcome = {}
+
+        def get(name):
+            try:
+                outcome[name] = self.client.get(url + 'success').content
+            except BaseException as e:
+                outcome[name] = type(e)
+        threads = [threading.Thread(target=get, args=(name,)) for name in ('leader', 'follower')]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        # the follower sends its own request instead of receiving KeyboardInterrupt
+        self.assertEqual({'leader': KeyboardInterrupt, 'follower': b'success'}, outcome)
+        self.assertEqual(2, len(calls))
+
+    def test_leader_error_is_shared(self):
+        sent = []
+
+        def failing_request(*args):
+            sent.append(args)
+            time.sleep(0.2)
+            raise pycurl.error(pycurl.E_RECV_ERROR, 'recv failure')
+        self.client._request = failing_request
+        results = run_threads([lambda: self.client.get(url + 'success')] * 2)
+        self.assertEqual([pycurl.error] * 2, [type(result) for result in results])
+        self.assertEqual(1, len(sent))
+
+def run_threads(targets):
+    '''Starts the targets in threads 20ms apart and returns their results
+    or exceptions.'''
+    results = [None] * len(targets)
+
+    def run(index):
+        try:
+            results[index] = targets[index]()
+        except Exception as e:
+            results[index] = e
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(targets))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import time
+import asyncio
+import pycurl
+import pytest
+import unittest
+
+from . import localhost
+from . import appmanager
+from . import util
+
+pycurl_client = util.import_pycurl_client()
+
+setup_module, teardown_module = appmanager.setup(('app', 8385, dict(threaded=True)))
+
+url = 'http://%s:8385/' % localhost
+host = '%s:8385' % localhost
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientHedgeTest(unittest.TestCase):
+    def run_client(self, check, **kwargs):
+        async def run():
+            kwargs.setdefault('max_clients', 4)
+            client = await pycurl_client.RequestAsync.create(**kwargs)
+            try:
+                await check(client)
+            finally:
+                client.close()
+        asyncio.run(run())
+
+    def slow_first_attempt(self, client, delay):
+        '''Delays the first attempt so that the hedged one finishes first.'''
+        attempt = client._attempt
+        calls = []
+
+        async def delayed(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                await asyncio.sleep(delay)
+            return await attempt(*args)
+        client._attempt = delayed
+        return calls
+
+    def test_hedged_request_counts_once_in_retry_budget(self):
+        retry = pycurl_client.Retry(total=3)
+
+        async def check(client):
+            response = await client.get(url + 'sleep?t=0.3', hedge_after=0.05, retry=retry)
+            self.assertEqual(200, response.http_code)
+            self.assertEqual(1, client.host_stats()[host]['hedged'])
+            self.assertEqual(1, retry.stats()['window_requests'])
+        self.run_client(check)
+
+    def test_hedge_wins_and_loser_is_cancelled(self):
+        async def check(client):
+            calls = self.slow_first_attempt(client, 0.5)
+            response = await client.get(url + 'success', hedge_after=0.05)
+            self.assertEqual(b'success', response.content)
+            self.assertEqual(2, len(calls))
+            stats = client.host_stats()[host]
+            self.assertEqual(1, stats['hedged'])
+            self.assertEqual(1, stats['hedge_won'])
+            self.assertEqual(0, client.pool_stats()['in_use'])
+        self.run_client(check)
+
+    def test_loser_in_backoff_does_not_cancel_other_requests(self):
+        # the first attempt gets a 503 and waits out a long backoff; the hedge
+        # then takes the only handle, and hands it to an unrelated request
+        retry = pycurl_client.Retry(total=3, backoff=2, jitter=False)
+
+        async def check(client):
+            start = time.monotonic()
+            hedged = asyncio.ensure_future(
+                client.get(url + 'fail_once/backoff?t=0.3', hedge_after=0.1, retry=retry))
+            await asyncio.sleep(0.2)
+            other = asyncio.ensure_future(client.get(url + 'sleep?t=0.3'))
+            self.assertEqual(b'success', (await hedged).content)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(b'success', (await other).content)
+            self.assertEqual(0, client.pool_stats()['in_use'])
+        self.run_client(check, max_clients=1)
+
+    def test_fast_request_is_not_hedged(self):
+        async def check(client):
+            response = await client.get(url + 'success', hedge_after=1)
+            self.assertEqual(b'success', response.content)
+            stats = client.host_stats()[host]
+            self.assertEqual(0, stats['hedged'])
+            self.assertEqual(0, stats['hedge_won'])
+        self.run_client(check)
+
+    def test_first_error_is_raised_when_both_fail(self):
+        async def check(client):
+            calls = []
+
+            async def failing(*args):
+                calls.append(args)
+                index = len(calls)
+                await asyncio.sleep(0.1)
+                raise pycurl.error(pycurl.E_RECV_ERROR, 'attempt %d' % index)
+            client._attempt = failing
+            with self.assertRaises(pycurl.error) as context:
+                await client.get(url + 'success', hedge_after=0.05, retry=False)
+            self.assertEqual(2, len(calls))
+            self.assertEqual('attempt 1', context.exception.args[1])
+        self.run_client(check)
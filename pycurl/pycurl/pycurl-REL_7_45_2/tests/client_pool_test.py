@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import time
+import asyncio
+import threading
+import pytest
+import unittest
+
+from . import localhost
+from . import appmanager
+from . import util
+
+pycurl_client = util.import_pycurl_client()
+
+setup_module, teardown_module = appmanager.setup(('app', 8385, dict(threaded=True)))
+
+url = 'http://%s:8385/' % localhost
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientPoolTest(unittest.TestCase):
+    def test_thread_acquire_timeout(self):
+        client = pycurl_client.RequestThread(max_clients=1, acquire_timeout=0.1)
+        try:
+            busy = threading.Thread(target=client.get, args=(url + 'sleep?t=0.5',))
+            busy.start()
+            wait_until_busy(client)
+            self.assertRaises(TimeoutError, client.get, url + 'success')
+            busy.join()
+            self.assertEqual(1, client.pool_stats()['timeouts'])
+            # the handle went back to the pool
+            self.assertEqual(b'success', client.get(url + 'success').content)
+        finally:
+            client.close()
+
+    def test_thread_setup_error_returns_handle(self):
+        client = pycurl_client.RequestThread(max_clients=1, acquire_timeout=1)
+        try:
+            self.assertRaises(ValueError, client.get, url + 'success', body='x')
+            self.assertEqual(b'success', client.get(url + 'success').content)
+        finally:
+            client.close()
+
+    def test_thread_evicts_idle_handles(self):
+        client = pycurl_client.RequestThread(max_clients=4, min_clients=1, max_idle_time=0.2)
+        try:
+            threads = [threading.Thread(target=client.get, args=(url + 'sleep?t=0.2',)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(4, client.pool_stats()['size'])
+            time.sleep(0.3)
+            client.get(url + 'success')
+            stats = client.pool_stats()
+            self.assertEqual(1, stats['size'])
+            self.assertEqual(3, stats['evicted'])
+        finally:
+            client.close()
+
+    def test_async_acquire_timeout(self):
+        async def check():
+            client = await pycurl_client.RequestAsync.create(max_clients=1, acquire_timeout=0.1)
+            try:
+                busy = asyncio.ensure_future(client.get(url + 'sleep?t=0.5'))
+                await asyncio.sleep(0.05)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.get(url + 'success')
+                self.assertEqual(200, (await busy).http_code)
+                self.assertEqual(b'success', (await client.get(url + 'success')).content)
+                self.assertEqual(0, client.pool_stats()['in_use'])
+            finally:
+                client.close()
+        asyncio.run(check())
+
+    def test_async_cancelled_transfer_returns_handle(self):
+        async def check():
+            client = await pycurl_client.RequestAsync.create(max_clients=1)
+            try:
+                for _ in range(3):
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await asyncio.wait_for(client.get(url + 'sleep?t=0.5'), 0.05)
+                stats = client.pool_stats()
+                self.assertEqual(0, stats['in_use'])
+                self.assertEqual(1, stats['idle'])
+                self.assertEqual(b'success', (await client.get(url + 'success')).content)
+            finally:
+                client.close()
+        asyncio.run(check())
+
+    def test_async_deadline(self):
+        async def check():
+            client = await pycurl_client.RequestAsync.create(max_clients=1)
+            try:
+                start = time.monotonic()
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.get(url + 'sleep?t=0.5', deadline=time.monotonic() + 0.1)
+                self.assertLess(time.monotonic() - start, 0.4)
+                self.assertEqual(b'success', (await client.get(url + 'success')).content)
+            finally:
+                client.close()
+        asyncio.run(check())
+
+def wait_until_busy(client, timeout=1):
+    '''Waits until every handle of a RequestThread is checked out.'''
+    end = time.monotonic() + timeout
+    while client.pool_stats()['idle'] and time.monotonic() < end:
+        time.sleep(0.01)
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import time
+import pytest
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from . import localhost
+from . import appmanager
+from . import util
+
+pycurl_client = util.import_pycurl_client()
+
+setup_module, teardown_module = appmanager.setup(('app', 8385, dict(threaded=True)))
+
+url = 'http://%s:8385/' % localhost
+
+@pytest.mark.skipif(pycurl_client is None, reason='requires pycurl_client and curl-impersonate')
+class ClientProcessPoolTest(unittest.TestCase):
+    def test_map(self):
+        pool = pycurl_client.RequestProcessPool(workers=2, max_clients=2)
+        try:
+            urls = [url + 'success', url + 'bytes/100000', url + 'status/404'] * 2
+            responses = list(pool.map(urls))
+            self.assertEqual([200, 200, 404] * 2, [response.http_code for response in responses])
+            self.assertEqual(100000, len(responses[1].content))
+        finally:
+            pool.close()
+
+    def test_forwards_client_options(self):
+        # max_host_clients=1 serialises the two requests inside the worker
+        pool = pycurl_client.RequestProcessPool(workers=1, max_clients=2, max_host_clients=1)
+        try:
+            start = time.monotonic()
+            futures = [pool.submit('get', url + 'sleep?t=0.3') for _ in range(2)]
+            self.assertEqual([200, 200], [future.result(5).http_code for future in futures])
+            self.assertGreater(time.monotonic() - start, 0.55)
+        finally:
+            pool.close()
+
+    def test_rejects_unknown_options(self):
+        self.assertRaises(TypeError, pycurl_client.RequestProcessPool, workers=1, no_such_option=1)
+
+    def test_worker_exit_fails_pending_requests(self):
+        pool = pycurl_client.RequestProcessPool(workers=1, max_clients=2)
+        try:
+            futures = [pool.submit('get', url + 'sleep?t=3') for _ in range(3)]
+            time.sleep(0.5)
+            pool._processes[0].kill()
+            for future in futures:
+                self.assertRaises(BrokenProcessPool, future.result, 5)
+            self.assertRaises(BrokenProcessPool, pool.submit, 'get', url + 'success')
+        finally:
+            start = time.monotonic()
+            pool.close()
+            self.assertLess(time.monotonic() - start, 2)
+
+    def test_other_workers_keep_serving(self):
+        pool = pycurl_client.RequestProcessPool(workers=2, max_clients=2)
+        try:
+            pool._processes[0].kill()
+            pool._processes[0].join()
+            time.sleep(0.1)
+            responses = [pool.submit('get', url + 'success') for _ in range(4)]
+            self.assertEqual([b'success'] * 4, [future.result(5).content for future in responses])
+        finally:
+            pool.close()
+
+    def test_close_timeout(self):
+        pool = pycurl_client.RequestProcessPool(workers=1, max_clients=1)
+        future = pool.submit('get', url + 'sleep?t=3')
+        time.sleep(0.3)
+        start = time.monotonic()
+        pool.close(timeout=0.2)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertRaises(BrokenProcessPool, future.result, 0)
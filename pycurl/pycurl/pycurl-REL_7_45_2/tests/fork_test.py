@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+from . import localhost
+import os
+import pycurl
+import pytest
+import unittest
+
+from . import appmanager
+from . import util
+
+setup_module, teardown_module = appmanager.setup(('app', 8380))
+
+def run_in_child(func):
+    # returns the exit status of func() run in a forked child,
+    # 0 if func returns normally and 1 if it raises
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            func()
+            code = 0
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status)
+
+def expect_error(func, *args):
+    try:
+        func(*args)
+    except pycurl.error:
+        return
+    raise AssertionError('%s did not raise pycurl.error' % func.__name__)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+class ForkTest(unittest.TestCase):
+    def test_inherited_curl_is_stale(self):
+        curl = util.DefaultCurl()
+        curl.setopt(pycurl.URL, 'http://%s:8380/success' % localhost)
+        curl.perform_rb()
+
+        def child():
+            expect_error(curl.setopt, pycurl.URL, 'http://%s:8380/success' % localhost)
+            expect_error(curl.perform)
+            expect_error(curl.getinfo, pycurl.RESPONSE_CODE)
+            # closing leaks the libcurl handle instead of failing
+            curl.close()
+
+        self.assertEqual(0, run_in_child(child))
+        # the parent's handle is unaffected
+        self.assertEqual('success', curl.perform_rb().decode())
+        curl.close()
+
+    def test_clone_template_in_child(self):
+        template = util.DefaultCurl()
+        template.setopt(pycurl.URL, 'http://%s:8380/success' % localhost)
+
+        def child():
+            clone = template.duphandle()
+            assert clone.perform_rb().decode() == 'success'
+            assert clone.getinfo(pycurl.RESPONSE_CODE) == 200
+            clone.close()
+
+        self.assertEqual(0, run_in_child(child))
+        template.close()
+
+    def test_inherited_share_and_multi(self):
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        multi = pycurl.CurlMulti()
+        added = util.DefaultCurl()
+        multi.add_handle(added)
+
+        def child():
+            expect_error(share.setopt, pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+            curl = util.DefaultCurl()
+            expect_error(curl.setopt, pycurl.SHARE, share)
+            expect_error(multi.add_handle, curl)
+            expect_error(multi.perform)
+            # objects created in the child work as usual
+            fresh_share = pycurl.CurlShare()
+            fresh_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            curl.setopt(pycurl.SHARE, fresh_share)
+            fresh_multi = pycurl.CurlMulti()
+            fresh_multi.add_handle(curl)
+            fresh_multi.remove_handle(curl)
+            curl.close()
+            fresh_multi.close()
+            fresh_share.close()
+            added.close()
+            multi.close()
+            share.close()
+
+        self.assertEqual(0, run_in_child(child))
+        multi.remove_handle(added)
+        added.close()
+        multi.close()
+        share.close()
+
+    @pytest.mark.skipif(not hasattr(pycurl, 'SslSessionCache'), reason='requires SslSessionCache')
+    def test_inherited_ssl_session_cache(self):
+        cache = pycurl.SslSessionCache()
+        template = util.DefaultCurl()
+        template.setopt(pycurl.URL, 'http://%s:8380/success' % localhost)
+        template.set_ssl_session_cache(cache)
+
+        def child():
+            expect_error(cache.stats)
+            expect_error(len, cache)
+            curl = util.DefaultCurl()
+            expect_error(curl.set_ssl_session_cache, cache)
+            curl.close()
+            # the clone does not use the inherited cache
+            clone = template.duphandle()
+            clone.set_ssl_session_cache(pycurl.SslSessionCache())
+            assert clone.perform_rb().decode() == 'success'
+            clone.close()
+
+        self.assertEqual(0, run_in_child(child))
+        self.assertEqual(0, len(cache))
+        template.close()
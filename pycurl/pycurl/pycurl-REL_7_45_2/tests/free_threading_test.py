@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import os
+import sys
+import sysconfig
+import threading
+import pycurl
+import pytest
+import unittest
+
+from . import util
+
+free_threaded = bool(sysconfig.get_config_var('Py_GIL_DISABLED'))
+# the module only declares that it does not need the GIL when built with
+# --enable-free-threading; set the same PYCURL_SETUP_OPTIONS when testing
+gil_not_used = '--enable-free-threading' in os.environ.get('PYCURL_SETUP_OPTIONS', '')
+
+def run_threads(target, count=8):
+    errors = []
+    def wrapper():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=wrapper) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+class FreeThreadingTest(unittest.TestCase):
+    @pytest.mark.skipif(not free_threaded or not gil_not_used,
+        reason='requires a free-threaded build with --enable-free-threading')
+    def test_gil_stays_disabled(self):
+        self.assertFalse(sys._is_gil_enabled())
+
+    def test_concurrent_setopt(self):
+        c = util.DefaultCurl()
+        def worker():
+            for i in range(500):
+                c.setopt(pycurl.URL, 'http://localhost/%d' % i)
+                c.setopt(pycurl.HTTPHEADER, ['X-N: %d' % i])
+                c.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+                c.unsetopt(pycurl.HTTPHEADER)
+                c.getinfo(pycurl.RESPONSE_CODE)
+                c.attr = i
+                getattr(c, 'attr')
+        self.assertEqual([], run_threads(worker))
+        c.close()
+
+    def test_concurrent_close(self):
+        c = util.DefaultCurl()
+        def worker():
+            c.setopt(pycurl.URL, 'http://localhost/')
+            c.close()
+        # every thread but the first one finds the handle closed
+        errors = run_threads(worker)
+        for e in errors:
+            self.assertTrue(isinstance(e, pycurl.error))
+
+    def test_concurrent_multi_add_remove(self):
+        m = pycurl.CurlMulti()
+        handles = [util.DefaultCurl() for _ in range(8)]
+        def worker():
+            for _ in range(200):
+                for c in handles:
+                    try:
+                        m.add_handle(c)
+                    except pycurl.error:
+                        # added by another thread
+                        pass
+                for c in handles:
+                    try:
+                        m.remove_handle(c)
+                    except pycurl.error:
+                        pass
+        self.assertEqual([], run_threads(worker))
+        for c in handles:
+            c.close()
+        m.close()
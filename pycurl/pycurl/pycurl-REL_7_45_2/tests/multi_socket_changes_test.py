@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+from . import localhost
+import pycurl
+import unittest
+import select
+import flaky
+
+from . import appmanager
+from . import util
+
+setup_module_1, teardown_module_1 = appmanager.setup(('app', 8380))
+setup_module_2, teardown_module_2 = appmanager.setup(('app', 8381))
+setup_module_3, teardown_module_3 = appmanager.setup(('app', 8382))
+
+def setup_module(mod):
+    setup_module_1(mod)
+    setup_module_2(mod)
+    setup_module_3(mod)
+
+def teardown_module(mod):
+    teardown_module_3(mod)
+    teardown_module_2(mod)
+    teardown_module_1(mod)
+
+@flaky.flaky(max_runs=3)
+class MultiSocketChangesTest(unittest.TestCase):
+    def test_socket_changes(self):
+        urls = [
+            'http://%s:8380/short_wait' % localhost,
+            'http://%s:8381/short_wait' % localhost,
+            'http://%s:8382/short_wait' % localhost,
+        ]
+
+        timers = []
+        def timer(timeout_ms):
+            timers.append(timeout_ms)
+
+        m = pycurl.CurlMulti()
+        m.setopt(pycurl.M_TIMERFUNCTION, timer)
+        m.record_socket_changes()
+        m.handles = []
+        for url in urls:
+            c = util.DefaultCurl()
+            c.body = util.BytesIO()
+            c.setopt(c.URL, url)
+            c.setopt(c.WRITEFUNCTION, c.body.write)
+            m.handles.append(c)
+            m.add_handle(c)
+
+        interest = {}
+        all_changes = []
+        _, running = m.socket_action_many([])
+        while running:
+            changes = m.socket_changes()
+            all_changes.extend(changes)
+            for fd, what in changes:
+                if what == pycurl.POLL_REMOVE:
+                    interest.pop(fd, None)
+                else:
+                    interest[fd] = what
+            rlist = [fd for fd, what in interest.items() if what & pycurl.POLL_IN]
+            wlist = [fd for fd, what in interest.items() if what & pycurl.POLL_OUT]
+            rr, wr, _ = select.select(rlist, wlist, [], 0.1)
+            actions = [(fd, pycurl.CSELECT_IN) for fd in rr]
+            actions += [(fd, pycurl.CSELECT_OUT) for fd in wr]
+            _, running = m.socket_action_many(actions)
+        all_changes.extend(m.socket_changes())
+
+        events = [what for fd, what in all_changes]
+        assert pycurl.POLL_IN in events
+        assert pycurl.POLL_REMOVE in events
+        for c in m.handles:
+            self.assertEqual('success', c.body.getvalue().decode())
+            self.assertEqual(200, c.getinfo(c.HTTP_CODE))
+            m.remove_handle(c)
+            c.close()
+        m.close()
+
+    def test_socket_changes_not_recording(self):
+        m = pycurl.CurlMulti()
+        try:
+            m.socket_changes()
+            self.fail('socket_changes should fail when not recording')
+        except pycurl.error:
+            pass
+
+        m.record_socket_changes()
+        self.assertEqual([], m.socket_changes())
+
+        # setting a socket function turns recording off
+        m.setopt(pycurl.M_SOCKETFUNCTION, lambda *args: None)
+        try:
+            m.socket_changes()
+            self.fail('socket_changes should fail when not recording')
+        except pycurl.error:
+            pass
+        m.close()
+
+    def test_socket_changes_refused_during_action(self):
+        m = pycurl.CurlMulti()
+        m.record_socket_changes()
+        errors = []
+        def write(data):
+            # the array is being filled without the GIL by this action
+            try:
+                m.socket_changes()
+            except pycurl.error as e:
+                errors.append(e)
+        c = util.DefaultCurl()
+        c.setopt(c.URL, 'http://%s:8380/success' % localhost)
+        c.setopt(c.WRITEFUNCTION, write)
+        m.add_handle(c)
+
+        interest = {}
+        _, running = m.socket_action_many([])
+        while running:
+            for fd, what in m.socket_changes():
+                if what == pycurl.POLL_REMOVE:
+                    interest.pop(fd, None)
+                else:
+                    interest[fd] = what
+            rlist = [fd for fd, what in interest.items() if what & pycurl.POLL_IN]
+            wlist = [fd for fd, what in interest.items() if what & pycurl.POLL_OUT]
+            rr, wr, _ = select.select(rlist, wlist, [], 0.1)
+            actions = [(fd, pycurl.CSELECT_IN) for fd in rr]
+            actions += [(fd, pycurl.CSELECT_OUT) for fd in wr]
+            _, running = m.socket_action_many(actions)
+
+        assert errors
+        assert 'currently running' in str(errors[0])
+        m.remove_handle(c)
+        c.close()
+        m.close()
+
+    def test_socket_action_many_bad_args(self):
+        m = pycurl.CurlMulti()
+        try:
+            m.socket_action_many(5)
+            self.fail('expected TypeError')
+        except TypeError:
+            pass
+        try:
+            m.socket_action_many([(1, 2, 3)])
+            self.fail('expected TypeError')
+        except TypeError:
+            pass
+        m.close()
@@ -27,6 +27,19 @@ class Server(bottle.WSGIRefServer):
     def serve(self):
         self.srv.serve_forever(poll_interval=0.1)
 
+class ThreadingServer(Server):
+    '''Serves each request in its own thread, for clients that keep
+    several requests in flight at once.'''
+
+    def make_server(self, handler):
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIServer
+        class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+            request_queue_size = 64
+        self.options['server_class'] = ThreadingWSGIServer
+        return Server.make_server(self, handler)
+
 # http://www.socouldanyone.com/2014/01/bottle-with-ssl.html
 # https://github.com/mfm24/miscpython/blob/master/bottle_ssl.py
 class SslServer(Server):
@@ -98,15 +111,21 @@ def app_runner_setup(*specs):
             if port in started_servers:
                 assert started_servers[port] == (app, kwargs)
             else:
+                # keep the spec intact so later modules can compare against it
+                server_kwargs = dict(kwargs)
                 server = Server
-                if 'server' in kwargs:
-                    server = kwargs['server']
-                    del kwargs['server']
-                elif 'ssl' in kwargs:
-                    if kwargs['ssl']:
+                if 'server' in server_kwargs:
+                    server = server_kwargs['server']
+                    del server_kwargs['server']
+                elif 'ssl' in server_kwargs:
+                    if server_kwargs['ssl']:
                         server = SslServer
-                    del kwargs['ssl']
-                self.servers.append(start_bottle_server(app, port, server, **kwargs))
+                    del server_kwargs['ssl']
+                elif 'threaded' in server_kwargs:
+                    if server_kwargs['threaded']:
+                        server = ThreadingServer
+                    del server_kwargs['threaded']
+                self.servers.append(start_bottle_server(app, port, server, **server_kwargs))
             started_servers[port] = (app, kwargs)
 
     def teardown(self):
@@ -48,6 +48,23 @@ class ShareTest(unittest.TestCase):
         self.assertEqual('success', t1.sio.getvalue().decode())
         self.assertEqual('success', t2.sio.getvalue().decode())
 
+    def test_share_many_threads(self):
+        s = pycurl.CurlShare()
+        s.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+        s.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        s.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+        threads = [WorkerThread(s) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        del s
+
+        for t in threads:
+            self.assertEqual('success', t.sio.getvalue().decode())
+
     def test_share_close(self):
         s = pycurl.CurlShare()
         s.close()
@@ -66,3 +83,31 @@ class ShareTest(unittest.TestCase):
     def test_keyword_arguments(self):
         with pytest.raises(TypeError):
             pycurl.CurlShare(a=1)
+
+    def test_stats_empty(self):
+        s = pycurl.CurlShare()
+        stats = s.stats()
+        for data in (pycurl.LOCK_DATA_SHARE, pycurl.LOCK_DATA_COOKIE,
+                     pycurl.LOCK_DATA_DNS, pycurl.LOCK_DATA_SSL_SESSION):
+            self.assertEqual({'acquisitions': 0, 'contended': 0, 'wait_time': 0.0, 'max_wait': 0.0},
+                             stats[data])
+        s.close()
+
+    def test_stats_counts_acquisitions(self):
+        s = pycurl.CurlShare()
+        s.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+
+        threads = [WorkerThread(s) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = s.stats()
+        dns = stats[pycurl.LOCK_DATA_DNS]
+        assert dns['acquisitions'] >= 8
+        assert dns['contended'] <= dns['acquisitions']
+        assert dns['max_wait'] <= dns['wait_time']
+        # cookies are not shared, libcurl never locks them
+        self.assertEqual(0, stats[pycurl.LOCK_DATA_COOKIE]['acquisitions'])
+        s.close()
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import gc
+import os
+import time
+import weakref
+import pycurl
+import pytest
+import unittest
+
+from . import appmanager
+from . import util
+
+setup_module, teardown_module = appmanager.setup(('app', 8384, dict(ssl=True)))
+
+CA_FILE = os.path.join(os.path.dirname(__file__), 'certs', 'ca.crt')
+
+def new_curl(cache):
+    curl = util.DefaultCurlLocalhost(8384)
+    curl.setopt(pycurl.URL, 'https://localhost:8384/success')
+    curl.setopt(pycurl.CAINFO, CA_FILE)
+    # every request makes a new connection
+    curl.setopt(pycurl.FORBID_REUSE, 1)
+    curl.set_ssl_session_cache(cache)
+    return curl
+
+def fetch(curl):
+    sio = util.BytesIO()
+    curl.setopt(pycurl.WRITEFUNCTION, sio.write)
+    curl.perform()
+    return sio.getvalue().decode()
+
+@pytest.mark.skipif(not hasattr(pycurl, 'SslSessionCache'), reason='requires libcurl with OpenSSL 1.1.1 or newer')
+class SslSessionCacheTest(unittest.TestCase):
+    def populated_cache(self):
+        cache = pycurl.SslSessionCache()
+        curl = new_curl(cache)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+        return cache
+
+    def test_store(self):
+        cache = self.populated_cache()
+        self.assertEqual(1, len(cache))
+        assert cache.stats()['stored'] >= 1
+        items = cache.dump()
+        self.assertEqual(1, len(items))
+        key, der, expires = items[0]
+        self.assertEqual('localhost:8384', key)
+        assert isinstance(der, bytes)
+        assert expires > time.time()
+
+    def test_resume_from_loaded_sessions(self):
+        items = self.populated_cache().dump()
+
+        # a new process would start with an empty cache and a new handle
+        cache = pycurl.SslSessionCache()
+        self.assertEqual(1, cache.load(items))
+        curl = new_curl(cache)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+        stats = cache.stats()
+        self.assertEqual(1, stats['offered'])
+        self.assertEqual(1, stats['resumed'])
+
+    def test_resume_from_sessions_stored_in_this_process(self):
+        # sessions captured by one handle are resumed by others sharing the
+        # cache, without a dump()/load() round trip
+        cache = self.populated_cache()
+        for _ in range(2):
+            curl = new_curl(cache)
+            self.assertEqual('success', fetch(curl))
+            curl.close()
+        stats = cache.stats()
+        self.assertEqual(2, stats['offered'])
+        self.assertEqual(2, stats['resumed'])
+
+    def test_resume_repeatedly_from_loaded_session(self):
+        items = self.populated_cache().dump()
+        cache = pycurl.SslSessionCache()
+        cache.load(items)
+        curl = new_curl(cache)
+        for _ in range(3):
+            self.assertEqual('success', fetch(curl))
+        curl.close()
+        self.assertEqual(3, cache.stats()['resumed'])
+
+    def test_without_cache_no_resumption(self):
+        cache = self.populated_cache()
+        curl = new_curl(cache)
+        curl.set_ssl_session_cache(None)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+        self.assertEqual(0, cache.stats()['offered'])
+
+    def test_with_ca_store(self):
+        if not hasattr(pycurl, 'CaStore'):
+            pytest.skip('requires CaStore')
+        items = self.populated_cache().dump()
+        cache = pycurl.SslSessionCache()
+        cache.load(items)
+        curl = new_curl(cache)
+        curl.set_ca_store(pycurl.CaStore(cafile=CA_FILE))
+        clone = curl.duphandle()
+        curl.close()
+        # the clone keeps both and calls back with itself
+        self.assertEqual('success', fetch(clone))
+        clone.close()
+        self.assertEqual(1, cache.stats()['resumed'])
+
+    def test_duphandle_keeps_cache(self):
+        cache = pycurl.SslSessionCache()
+        curl = new_curl(cache)
+        ref = weakref.ref(cache)
+        del cache
+        clone = curl.duphandle()
+        curl.close()
+        gc.collect()
+        assert ref() is not None
+        self.assertEqual('success', fetch(clone))
+        self.assertEqual(1, len(ref()))
+        clone.close()
+        gc.collect()
+        assert ref() is None
+
+    def test_reset_removes_cache(self):
+        cache = pycurl.SslSessionCache()
+        curl = new_curl(cache)
+        curl.reset()
+        curl.setopt(pycurl.URL, 'https://localhost:8384/success')
+        curl.setopt(pycurl.CAINFO, CA_FILE)
+        self.assertEqual('success', fetch(curl))
+        curl.close()
+        self.assertEqual(0, len(cache))
+
+    def test_expired_sessions_are_skipped(self):
+        key, der, expires = self.populated_cache().dump()[0]
+        cache = pycurl.SslSessionCache()
+        self.assertEqual(0, cache.load([(key, der, int(time.time()) - 1)]))
+        self.assertEqual(0, len(cache))
+        self.assertEqual([], cache.dump())
+
+    def test_max_entries(self):
+        key, der, expires = self.populated_cache().dump()[0]
+        cache = pycurl.SslSessionCache(max_entries=2)
+        self.assertEqual(3, cache.load([(k, der, expires) for k in ('a:1', 'b:2', 'c:3')]))
+        self.assertEqual(2, len(cache))
+        self.assertEqual(['b:2', 'c:3'], [item[0] for item in cache.dump()])
+        # storing an existing key replaces the session
+        cache.load([('b:2', der, expires)])
+        self.assertEqual(['c:3', 'b:2'], [item[0] for item in cache.dump()])
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+    def test_bogus_sessions(self):
+        cache = pycurl.SslSessionCache()
+        self.assertEqual(0, cache.load([('localhost:443', b'hello world', int(time.time()) + 60)]))
+        with pytest.raises(TypeError):
+            cache.load([42])
+        with pytest.raises(TypeError):
+            cache.load(42)
+        with pytest.raises(ValueError):
+            pycurl.SslSessionCache(max_entries=0)
+
+    def test_set_ssl_session_cache_bogus_type(self):
+        curl = util.DefaultCurl()
+        with pytest.raises(TypeError):
+            curl.set_ssl_session_cache({})
+        curl.close()
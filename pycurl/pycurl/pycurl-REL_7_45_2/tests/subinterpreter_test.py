@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vi:ts=4:et
+
+import gc
+import sys
+import threading
+import weakref
+import pycurl
+import pytest
+import unittest
+
+try:
+    import _interpreters as interpreters
+except ImportError:
+    try:
+        import _xxsubinterpreters as interpreters
+    except ImportError:
+        interpreters = None
+
+from . import util
+
+# interpreters with their own GIL: 3.12 creates them by default, 3.13 takes
+# a config
+own_gil = interpreters is not None and sys.version_info >= (3, 12)
+
+def create_isolated():
+    if hasattr(interpreters, 'new_config'):
+        interp = interpreters.create(interpreters.new_config('isolated'))
+        assert interpreters.get_config(interp).gil == 'own'
+        return interp
+    return interpreters.create(isolated=True)
+
+def run_string(interp, code):
+    # 3.13 returns the exception instead of raising it
+    error = interpreters.run_string(interp, code)
+    if error is not None:
+        raise AssertionError('%s: %s' % (error.type.__name__, error.msg))
+
+class SubinterpreterTest(unittest.TestCase):
+    @pytest.mark.skipif(interpreters is None, reason='requires the subinterpreters module')
+    def test_import_in_subinterpreter(self):
+        code = '''if 1:
+            import pycurl
+            c = pycurl.Curl()
+            c.setopt(pycurl.URL, 'http://localhost/')
+            m = pycurl.CurlMulti()
+            m.add_handle(c)
+            m.remove_handle(c)
+            m.close()
+            c.close()
+            try:
+                pycurl.Curl().perform()
+            except pycurl.error:
+                pass
+        '''
+        interp = interpreters.create()
+        try:
+            run_string(interp, code)
+        finally:
+            interpreters.destroy(interp)
+        # the main interpreter's module is unaffected
+        c = util.DefaultCurl()
+        c.setopt(pycurl.URL, 'http://localhost/')
+        c.close()
+
+    @pytest.mark.skipif(not own_gil, reason='requires subinterpreters with their own GIL (3.12+)')
+    def test_own_gil_subinterpreters(self):
+        # importing fails in an isolated interpreter unless the module
+        # declares per-interpreter GIL support
+        code = '''if 1:
+            import pycurl
+            m = pycurl.CurlMulti()
+            s = pycurl.CurlShare()
+            s.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            for i in range(200):
+                c = pycurl.Curl()
+                c.setopt(pycurl.URL, 'http://localhost/%d' % i)
+                c.setopt(pycurl.SHARE, s)
+                c.setopt(pycurl.HTTPHEADER, ['X-N: %d' % i])
+                m.add_handle(c)
+                m.remove_handle(c)
+                c.close()
+            try:
+                pycurl.Curl().perform()
+            except pycurl.error:
+                pass
+            m.close()
+            s.close()
+        '''
+        interps = [create_isolated() for _ in range(4)]
+        errors = []
+        def run(interp):
+            try:
+                run_string(interp, code)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run, args=(interp,)) for interp in interps]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            for interp in interps:
+                interpreters.destroy(interp)
+        self.assertEqual([], errors)
+
+    def test_subclass_uses_module_state(self):
+        class MyCurl(pycurl.Curl):
+            pass
+        c = MyCurl()
+        try:
+            c.perform()
+            self.fail('perform without a URL should fail')
+        except pycurl.error:
+            pass
+        try:
+            c.setopt(pycurl.SHARE, object())
+            self.fail('expected TypeError')
+        except TypeError:
+            pass
+        c.setopt(pycurl.SHARE, pycurl.CurlShare())
+        c.close()
+
+    def test_types_are_collected(self):
+        c = pycurl.Curl()
+        c.setopt(pycurl.HTTPHEADER, ['X-Test: 1'])
+        ref = weakref.ref(c)
+        del c
+        gc.collect()
+        self.assertTrue(ref() is None)
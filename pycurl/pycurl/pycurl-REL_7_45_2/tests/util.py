@@ -275,6 +275,26 @@ def DefaultCurlLocalhost(port):
     
     return curl
 
+def import_pycurl_client():
+    '''Imports pycurl_client, the client module kept in the repository
+    root four directories up. Returns None when it is unavailable, for
+    example when pycurl was built without curl-impersonate.'''
+
+    import os.path
+    import pycurl
+
+    if not hasattr(pycurl.Curl, 'impersonate'):
+        return None
+    try:
+        import pycurl_client
+    except ImportError:
+        root = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')
+        if not os.path.exists(os.path.join(root, 'pycurl_client.py')):
+            return None
+        sys.path.insert(0, os.path.abspath(root))
+        import pycurl_client
+    return pycurl_client
+
 def with_real_write_file(fn):
     @functools.wraps(fn)
     def wrapper(*args):
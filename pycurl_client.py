@@ -1,6 +1,25 @@
+import os
 import json
-from urllib.parse import urlencode
-from queue import Queue
+import time
+import math
+import atexit
+import base64
+import random
+import email.utils
+import tempfile
+import zlib
+import bisect
+import inspect
+import itertools
+import weakref
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, CancelledError, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import wait as wait_processes
+from urllib.parse import urlencode, urlsplit
 import pycurl
 import asyncio
 import certifi
@@ -8,6 +27,565 @@ from io import BytesIO
 from pathlib import Path
 # asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+# fork之前创建的客户端，子进程中需要重建curl对象
+_fork_clients = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    """子进程中从父进程继承的curl/share/multi对象已经不可用，标记客户端在下一次请求时从模板重建"""
+    global _ca_stores_lock, _tls_session_caches, _tls_session_lock
+    # 证书库本身可以继续使用，只替换可能处于加锁状态的锁
+    _ca_stores_lock = threading.Lock()
+    # 继承的会话缓存在子进程中不可用，第一次使用时重新从文件加载
+    _tls_session_caches = {}
+    _tls_session_lock = threading.Lock()
+    for client in list(_fork_clients):
+        client._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+# 进程内所有curl对象共用的CA证书库，按证书文件路径缓存，每个证书文件只解析一次
+_ca_stores = {}
+_ca_stores_lock = threading.Lock()
+
+
+def _set_ca_path(curl, ca_path):
+    """设置curl对象信任的CA证书文件，pycurl支持CaStore(OpenSSL)时所有curl对象共用同一个已解析的证书库，
+    否则设置CAINFO，由libcurl在每次新建TLS连接时重新读取解析证书文件"""
+    if not hasattr(pycurl, 'CaStore'):
+        curl.setopt(pycurl.CAINFO, ca_path)
+        return
+    with _ca_stores_lock:
+        store = _ca_stores.get(ca_path)
+        if store is None:
+            store = _ca_stores[ca_path] = pycurl.CaStore(cafile=ca_path)
+    curl.set_ca_store(store)
+
+
+# 进程内按文件路径缓存的TLS会话缓存，进程重启后第一次连接各host时可以恢复之前的会话(简化握手)
+_tls_session_caches = {}
+_tls_session_lock = threading.Lock()
+
+
+def _get_tls_session_cache(path):
+    """取得会话缓存文件对应的SslSessionCache，第一次使用时从文件加载未过期的会话"""
+    with _tls_session_lock:
+        cache = _tls_session_caches.get(path)
+        if cache is None:
+            cache = _tls_session_caches[path] = pycurl.SslSessionCache()
+            try:
+                with open(path) as f:
+                    items = json.load(f)
+                cache.load((key, base64.b64decode(der), expires) for key, der, expires in items)
+            except (OSError, ValueError, TypeError):
+                # 文件不存在或已损坏时从空缓存开始
+                pass
+    return cache
+
+
+def _set_tls_session_file(curl, path):
+    """curl对象新建TLS连接时从会话缓存文件对应的缓存中恢复会话，pycurl不支持SslSessionCache时不做处理"""
+    if path is None or not hasattr(pycurl, 'SslSessionCache'):
+        return
+    curl.set_ssl_session_cache(_get_tls_session_cache(path))
+
+
+def _save_tls_sessions(path=None):
+    """把会话缓存写回文件，path为None时保存所有会话缓存文件，
+    会话中包含连接的主密钥，文件只允许当前用户读写(mkstemp创建的文件权限为0600)，先写临时文件再替换，多个进程同时保存时以最后一次为准"""
+    with _tls_session_lock:
+        caches = [(p, cache) for p, cache in _tls_session_caches.items() if path is None or p == path]
+    for p, cache in caches:
+        items = [[key, base64.b64encode(der).decode('ascii'), expires] for key, der, expires in cache.dump()]
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(p)), prefix='.tls-sessions-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(items, f)
+            os.replace(tmp_path, p)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+atexit.register(_save_tls_sessions)
+
+
+class _PoolStats(object):
+    """curl对象池的计数，utilization按时间加权：使用中的curl对象数对时间积分，除以max_clients和统计时长"""
+    def __init__(self):
+        self.acquired = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.evicted = 0
+        self.in_use = 0
+        self._busy_time = 0.0
+        self._since = self._changed = time.monotonic()
+
+    def _advance(self, now):
+        self._busy_time += self.in_use * (now - self._changed)
+        self._changed = now
+
+    def acquire(self, wait_time=None):
+        """记录取用了一个curl对象，wait_time为None表示没有等待"""
+        self._advance(time.monotonic())
+        self.in_use += 1
+        self.acquired += 1
+        if wait_time is not None:
+            self.waited += 1
+            self.wait_time += wait_time
+            self.max_wait = max(self.max_wait, wait_time)
+
+    def release(self):
+        """记录归还了一个curl对象"""
+        self._advance(time.monotonic())
+        self.in_use -= 1
+
+    def snapshot(self, size, idle, max_clients):
+        now = time.monotonic()
+        self._advance(now)
+        elapsed = now - self._since
+        return {
+            'size': size, 'idle': idle, 'in_use': self.in_use, 'max_clients': max_clients,
+            'acquired': self.acquired, 'waited': self.waited, 'wait_time': self.wait_time,
+            'max_wait': self.max_wait, 'timeouts': self.timeouts, 'created': self.created, 'evicted': self.evicted,
+            'utilization': self._busy_time / (max_clients * elapsed) if elapsed > 0 and max_clients else 0.0,
+        }
+
+
+class _QueueStats(object):
+    """加权公平队列中一个命名队列的权重和计数，deficit为DRR的余额，throughput为最近window秒内平均每秒完成的请求数"""
+    def __init__(self, weight=1, window=10):
+        self.weight = weight
+        self.deficit = 0.0
+        self.queued = 0
+        self.active = 0
+        self.admitted = 0
+        self.completed = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.window = window
+        # 每秒一项[秒, 完成数]，只保留window秒
+        self._completions = deque()
+
+    def _current(self, now):
+        second = int(now)
+        while self._completions and self._completions[0][0] <= second - self.window:
+            self._completions.popleft()
+        if not self._completions or self._completions[-1][0] != second:
+            self._completions.append([second, 0])
+        return self._completions[-1]
+
+    def admit(self, wait_time=None):
+        """记录分配到了curl对象，wait_time为None表示没有排队"""
+        self.active += 1
+        self.admitted += 1
+        if wait_time is not None:
+            self.wait_time += wait_time
+            self.max_wait = max(self.max_wait, wait_time)
+
+    def complete(self):
+        """记录归还了curl对象"""
+        self.active -= 1
+        self.completed += 1
+        self._current(time.monotonic())[1] += 1
+
+    def snapshot(self):
+        self._current(time.monotonic())
+        return {'weight': self.weight, 'queued': self.queued, 'active': self.active, 'admitted': self.admitted,
+                'completed': self.completed, 'wait_time': self.wait_time, 'max_wait': self.max_wait,
+                'throughput': sum(item[1] for item in self._completions) / self.window}
+
+
+class _TokenBucket(object):
+    """令牌桶：每秒补充rate个令牌，最多积累burst个，每个请求消耗一个；用于带宽时按字节消耗，余额可以为负"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1, burst or 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        return min(self.burst, self.tokens + (now - self.updated) * self.rate)
+
+    def delay(self, now):
+        """距离有可用令牌的秒数，0表示现在就有"""
+        tokens = self._refill(now)
+        return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, now, amount=1):
+        self.tokens = self._refill(now) - amount
+        self.updated = now
+
+
+def _bandwidth_limits(max_recv_speed, max_send_speed):
+    """带宽上限对应的(接收令牌桶, 发送令牌桶, 保护令牌桶的锁)，不限速的方向为None，令牌桶最多积累0.1秒的量"""
+    recv_bucket = None if max_recv_speed is None else _TokenBucket(max_recv_speed, max_recv_speed / 10)
+    send_bucket = None if max_send_speed is None else _TokenBucket(max_send_speed, max_send_speed / 10)
+    return recv_bucket, send_bucket, threading.Lock()
+
+
+def _throttled(callback, bucket, lock, pause, on_pause):
+    """包装收发数据的回调(WRITEFUNCTION/READFUNCTION)：收发的字节数从令牌桶中扣除，余额不足时调用on_pause(等待的秒数)
+    并返回pause暂停传输，恢复后libcurl会重新交给回调同一段数据；lock保护多个线程共用的令牌桶"""
+    def throttled(arg):
+        with lock:
+            now = time.monotonic()
+            delay = bucket.delay(now)
+            if delay <= 0:
+                result = callback(arg)
+                bucket.take(now, len(arg) if isinstance(arg, bytes) else len(result))
+                return result
+        on_pause(delay)
+        return pause
+    return throttled
+
+
+class _AimdLimit(object):
+    """单个host自适应的并发上限(AIMD)：请求正常且并发已用满时每个请求加1/limit，即每轮约加1；
+    出错、429/503时乘以backoff，首字节时间超过基线的tolerance倍时乘以latency_backoff，
+    减少后在一个首字节时间内不再重复减少，避免同一批请求的结果把上限连续减半"""
+    backoff = 0.5
+    latency_backoff = 0.9
+    initial = 4
+
+    def __init__(self, tolerance=2.0):
+        self.tolerance = tolerance
+        self.limit = float(self.initial)
+        self.baseline = None
+        self._hold_until = 0.0
+
+    def observe(self, latency, failed, in_flight, maximum, now):
+        """latency 首字节时间(秒)，failed 是否出错或429/503，in_flight 包括该请求在内的并发数，maximum 上限的上限"""
+        if latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # 基线缓慢跟随实际的首字节时间，服务端变慢后不会一直和过期的最小值比较
+                self.baseline += (latency - self.baseline) * 0.001
+        if failed or latency is not None and latency > self.baseline * self.tolerance:
+            if now >= self._hold_until:
+                self.limit = max(1.0, self.limit * (self.backoff if failed else self.latency_backoff))
+                self._hold_until = now + max(latency or 0, self.baseline or 0)
+        elif in_flight >= int(self.limit):
+            self.limit += 1 / self.limit
+        self.limit = min(self.limit, float(maximum))
+
+
+class _TimerWheel(object):
+    """单层时间轮：到期时间按tick取整放入slots个槽，只用一个事件循环定时器每tick推进一格，
+    同一个key只登记最早的到期时间，到期的key一起交给callback"""
+    def __init__(self, callback, tick=0.01, slots=512):
+        self.callback = callback
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self._when = {}
+        self._current = 0
+        self._handle = None
+
+    def schedule(self, key, when):
+        if self._handle is None:
+            self._current = int(time.monotonic() / self.tick)
+        tick = max(math.ceil(when / self.tick), self._current + 1)
+        old = self._when.get(key)
+        if old is not None:
+            if old <= tick:
+                return
+            self.slots[old % len(self.slots)].discard(key)
+        self._when[key] = tick
+        self.slots[tick % len(self.slots)].add(key)
+        if self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self.tick, self._advance)
+
+    def _advance(self):
+        self._handle = None
+        now = int(time.monotonic() / self.tick)
+        due = []
+        # 超过一圈没有推进时每个槽只需要检查一次
+        for tick in range(self._current + 1, min(now, self._current + len(self.slots)) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key in [key for key in slot if self._when[key] <= now]:
+                slot.discard(key)
+                del self._when[key]
+                due.append(key)
+        self._current = max(self._current, now)
+        if self._when:
+            self._handle = asyncio.get_running_loop().call_later(self.tick, self._advance)
+        if due:
+            self.callback(due)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for slot in self.slots:
+            slot.clear()
+        self._when = {}
+
+
+class Retry(object):
+    """重试策略，传给客户端的retry参数，或者在单个请求中用retry=覆盖(retry=False不重试)
+    样例：
+    http = RequestThread(retry=Retry(total=3))
+    response = http.get(url)
+    total 最多重试次数
+    statuses 需要重试的状态码, errors 传输中出错时需要重试的pycurl错误码，两者都只对methods中的(幂等)请求方法重试，
+    methods为None时所有方法都重试；connect_errors中的错误发生在请求发出之前，任何方法都会重试
+    backoff/max_backoff 第n次重试(从0开始)前最多等待min(max_backoff, backoff * 2 ** n)秒，jitter为True时在0到该值之间随机(full jitter)
+    respect_retry_after 响应带Retry-After时至少等待该时间(不超过max_backoff)
+    重试预算：最近budget_window秒内的重试数不超过请求数 * budget_ratio + budget_min，超出后不再重试，
+    服务端整体故障时重试不会把请求量放大数倍；同一个Retry对象可以在多个客户端间共用，预算随之共用"""
+    connect_errors = (pycurl.E_COULDNT_RESOLVE_PROXY, pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_CONNECT,
+                      pycurl.E_SSL_CONNECT_ERROR)
+
+    def __init__(self, total=3, statuses=(429, 502, 503, 504),
+                 errors=(pycurl.E_PARTIAL_FILE, pycurl.E_HTTP2, pycurl.E_OPERATION_TIMEDOUT, pycurl.E_GOT_NOTHING,
+                         pycurl.E_SEND_ERROR, pycurl.E_RECV_ERROR),
+                 methods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'), backoff=0.1, max_backoff=10.0, jitter=True,
+                 respect_retry_after=True, budget_ratio=0.2, budget_min=10, budget_window=10):
+        self.total = total
+        self.statuses = frozenset(statuses)
+        self.errors = frozenset(errors)
+        self.methods = None if methods is None else frozenset(methods)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.budget_window = budget_window
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+        # 每秒一项[秒, 请求数, 重试数]，只保留budget_window秒
+        self._window = deque()
+
+    def __getstate__(self):
+        # 传给RequestProcessPool的子进程时，预算在每个子进程中单独计算
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_window'] = deque()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _current(self, now):
+        second = int(now)
+        while self._window and self._window[0][0] <= second - self.budget_window:
+            self._window.popleft()
+        if not self._window or self._window[-1][0] != second:
+            self._window.append([second, 0, 0])
+        return self._window[-1]
+
+    def start(self):
+        """记录一个新的请求(重试不算)，每个请求增加budget_ratio次重试预算"""
+        with self._lock:
+            self._current(time.monotonic())[1] += 1
+
+    def delay(self, method, attempt, error=None, response=None):
+        """第attempt次重试(从0开始)前要等待的秒数，不需要重试或重试预算已用完时返回None"""
+        if attempt >= self.total:
+            return None
+        retry_after = None
+        if error is not None:
+            code = error.args[0]
+            if code not in self.connect_errors and (
+                    code not in self.errors or self.methods is not None and method not in self.methods):
+                return None
+        else:
+            if response.http_code not in self.statuses or self.methods is not None and method not in self.methods:
+                return None
+            if self.respect_retry_after:
+                retry_after = self._retry_after(response)
+        with self._lock:
+            current = self._current(time.monotonic())
+            requests = sum(item[1] for item in self._window)
+            retries = sum(item[2] for item in self._window)
+            if retries >= requests * self.budget_ratio + self.budget_min:
+                self.exhausted += 1
+                return None
+            current[2] += 1
+            self.retries += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    @staticmethod
+    def _retry_after(response):
+        """Retry-After的秒数，可以是秒数或HTTP日期"""
+        value = response.headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def stats(self):
+        """retries 累计重试次数, exhausted 因预算用完而放弃的重试次数, window_requests/window_retries 预算窗口内的请求数和重试数"""
+        with self._lock:
+            self._current(time.monotonic())
+            return {'retries': self.retries, 'exhausted': self.exhausted,
+                    'window_requests': sum(item[1] for item in self._window),
+                    'window_retries': sum(item[2] for item in self._window)}
+
+
+class CircuitOpenError(Exception):
+    """host的熔断器处于打开状态，请求没有发出"""
+
+
+class CircuitBreaker(object):
+    """按host的熔断器，传给客户端的circuit_breaker参数
+    样例：
+    http = RequestThread(circuit_breaker=CircuitBreaker())
+    最近window秒内某个host至少有min_requests个请求、且失败的比例达到failure_ratio时打开，
+    打开期间该host的请求不占用curl对象，直接抛出CircuitOpenError；open_time秒后进入半开状态，
+    只放行一个探测请求，成功则关闭，失败则重新打开
+    失败是指errors中的pycurl错误(默认连接失败和超时等)或statuses中的状态码；
+    同一个CircuitBreaker对象可以在多个客户端间共用，状态随之共用"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_ratio=0.5, min_requests=20, window=10, open_time=30,
+                 errors=(pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_CONNECT, pycurl.E_SSL_CONNECT_ERROR,
+                         pycurl.E_OPERATION_TIMEDOUT, pycurl.E_GOT_NOTHING, pycurl.E_SEND_ERROR,
+                         pycurl.E_RECV_ERROR),
+                 statuses=(500, 502, 503, 504)):
+        self.failure_ratio = failure_ratio
+        self.min_requests = min_requests
+        self.window = window
+        self.open_time = open_time
+        self.errors = frozenset(errors)
+        self.statuses = frozenset(statuses)
+        self._lock = threading.Lock()
+        # host -> 状态，窗口中每秒一项[秒, 请求数, 失败数]
+        self._hosts = {}
+
+    def __getstate__(self):
+        # 传给RequestProcessPool的子进程时，每个子进程单独统计
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_hosts'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {'state': self.CLOSED, 'window': deque(), 'opened_at': 0.0,
+                                         'probing': False, 'opened': 0, 'rejected': 0}
+        return state
+
+    def _current(self, state, now):
+        second = int(now)
+        window = state['window']
+        while window and window[0][0] <= second - self.window:
+            window.popleft()
+        if not window or window[-1][0] != second:
+            window.append([second, 0, 0])
+        return window[-1]
+
+    def failed(self, error=None, response=None):
+        """一次请求的结果是否算作失败"""
+        if error is not None:
+            return error.args[0] in self.errors
+        return response.http_code in self.statuses
+
+    def check(self, host):
+        """请求发出前调用，打开时抛出CircuitOpenError；返回True表示这是半开状态下的探测请求"""
+        with self._lock:
+            state = self._get_host(host)
+            if state['state'] == self.OPEN and time.monotonic() >= state['opened_at'] + self.open_time:
+                state['state'] = self.HALF_OPEN
+            if state['state'] == self.CLOSED:
+                return False
+            if state['state'] == self.HALF_OPEN and not state['probing']:
+                state['probing'] = True
+                return True
+            state['rejected'] += 1
+        raise CircuitOpenError('circuit open for %s' % host)
+
+    def record(self, host, probe, failed):
+        """请求结束后调用，failed为None表示没有结果(被取消、超过deadline等)，不计入统计"""
+        with self._lock:
+            state = self._get_host(host)
+            now = time.monotonic()
+            if probe:
+                state['probing'] = False
+                if failed is None:
+                    return
+                if failed:
+                    state['state'] = self.OPEN
+                    state['opened_at'] = now
+                    state['opened'] += 1
+                else:
+                    state['state'] = self.CLOSED
+                    state['window'].clear()
+                return
+            if failed is None or state['state'] != self.CLOSED:
+                return
+            current = self._current(state, now)
+            current[1] += 1
+            if failed:
+                current[2] += 1
+                requests = sum(item[1] for item in state['window'])
+                failures = sum(item[2] for item in state['window'])
+                if requests >= self.min_requests and failures >= requests * self.failure_ratio:
+                    state['state'] = self.OPEN
+                    state['opened_at'] = now
+                    state['opened'] += 1
+
+    def state(self, host):
+        """host当前的状态：closed/open/half_open"""
+        with self._lock:
+            state = self._get_host(host)
+            if state['state'] == self.OPEN and time.monotonic() >= state['opened_at'] + self.open_time:
+                return self.HALF_OPEN
+            return state['state']
+
+    def stats(self):
+        """每个host的状态：state 当前状态, requests/failures 窗口内的请求数和失败数,
+        opened 累计打开次数, rejected 因打开而直接失败的请求数"""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for host, state in self._hosts.items():
+                self._current(state, now)
+                current = state['state']
+                if current == self.OPEN and now >= state['opened_at'] + self.open_time:
+                    current = self.HALF_OPEN
+                result[host] = {'state': current, 'requests': sum(item[1] for item in state['window']),
+                                'failures': sum(item[2] for item in state['window']),
+                                'opened': state['opened'], 'rejected': state['rejected']}
+        return result
+
+
+def _coalesce_key(method, url, retry, kwargs, names):
+    """合并请求的键：请求方法、url、重试策略、names和Cookie/Authorization中的请求头(不区分大小写)，
+    以及其余所有影响传输的参数(verify、proxy_url、timeout等)，这些参数不同的请求不会合并"""
+    headers = kwargs.get('headers')
+    values = {name.lower(): value for name, value in headers.items()} if headers else {}
+    options = tuple(sorted((name, value) for name, value in kwargs.items() if name != 'headers'))
+    return (method, url, retry, options) + tuple(values.get(name.lower())
+                                                 for name in ('cookie', 'authorization') + tuple(names))
+
 
 class Response(object):
     """pycurl返回的响应对象，effective_url是最终的请求链接"""
@@ -16,6 +594,10 @@ class Response(object):
     http_code = 200
     effective_url = ''
 
+    def __init__(self):
+        # 每个响应单独的响应头，类属性的字典会被所有响应共用
+        self.headers = {}
+
 
 class Request(object):
     """单线程使用的http请求客户端
@@ -28,7 +610,7 @@ class Request(object):
         """生成单个curl对象"""
         self.handle = pycurl.Curl()
         self.set_option(pycurl.ENCODING, '')
-        self.set_option(pycurl.CAINFO, certifi.where().encode('utf-8'))
+        _set_ca_path(self.handle, certifi.where())
         self.set_option(pycurl.FOLLOWLOCATION, 1)
         self.set_option(pycurl.MAXREDIRS, 10)
         self.headers = {}
@@ -134,45 +716,312 @@ class RequestThread(object):
        http = RequestThread()
        response = http.get(url)
        """
-    def __init__(self, max_clients=5, target='chrome104', default_headers=1, enable_cookie=False, cookie_path='E:\pycharm\TEST\wiley\wiley2023\cookie.txt'):
-        """根据max_clients生成多个curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径"""
-        self.curl_queue = Queue()
-        self.share = pycurl.CurlShare()
-        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
-        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
-        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+    def __init__(self, max_clients=5, target='chrome104', default_headers=1, enable_cookie=False, cookie_path='E:\pycharm\TEST\wiley\wiley2023\cookie.txt',
+                 share_connections=False, prefork=False, tls_session_file=None, min_clients=None, max_idle_time=None,
+                 acquire_timeout=None, retry=None, coalesce=False, coalesce_headers=(), circuit_breaker=None,
+                 queue_weights=None, max_recv_speed=None, max_send_speed=None):
+        """根据max_clients生成多个curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径
+        share_connections 所有curl对象共用一个连接池，请求可以复用其他curl对象建立的空闲连接(需要libcurl>=7.57)，
+        但HTTP/2连接不会在不同线程间多路复用
+        prefork 在fork子进程之前创建时设为True，只生成一个完成impersonate的模板，curl对象在第一次请求时(即子进程中)从模板克隆，
+        未设置时fork后子进程同样会在第一次请求时丢弃继承的curl对象并从模板重建
+        tls_session_file TLS会话缓存文件的路径，启动时加载其中未过期的会话，close()和进程退出时写回，
+        重启后第一次连接各host时恢复会话，省去完整握手(需要libcurl使用OpenSSL 1.1.1以上版本)
+        min_clients 连接池至少保留的curl对象数，默认等于max_clients即固定大小，小于max_clients时请求多了再克隆，最多max_clients个
+        max_idle_time curl对象空闲超过该秒数后关闭(至少保留min_clients个)，同时作为连接的最长空闲时间(MAXAGE_CONN)，
+        空闲回收在取用和归还curl对象时进行，默认不回收
+        acquire_timeout 等待空闲curl对象的最长秒数，超时抛出TimeoutError，默认一直等待
+        retry 重试策略(Retry)，默认不重试，等待重试时curl对象归还给连接池
+        coalesce 合并相同的GET/HEAD请求：同一个请求(方法、url、coalesce_headers和Cookie/Authorization请求头、
+        其余参数都相同)正在进行时，其他线程等待它完成并得到同一个Response对象(不要修改)或同一个异常，
+        发出请求的线程被KeyboardInterrupt等中断时，等待的线程各自重新发出请求，单个请求可以用coalesce=覆盖
+        circuit_breaker 按host的熔断器(CircuitBreaker)，打开时请求不等待curl对象，直接抛出CircuitOpenError
+        queue_weights 命名队列的权重{队列名: 权重}，请求用queue=指定队列(默认'default'，权重默认1)，
+        等待curl对象的线程按队列的权重以DRR轮流分配，大任务排满时小任务不会饿死，可以用set_queue_weight修改
+        max_recv_speed/max_send_speed 所有curl对象合计每秒最多接收/发送的字节数，默认不限制；
+        设置后传输改由每个curl对象自己的CurlMulti驱动，收发数据的回调按字节数从共用的令牌桶中扣除，
+        余额不足时暂停该传输，由发出请求的线程在multi调用之间等到余额恢复后继续，期间libcurl仍然处理超时"""
+        self.tls_session_file = tls_session_file
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.queue_weights = dict(queue_weights or {})
+        if any(weight <= 0 for weight in self.queue_weights.values()):
+            raise ValueError('queue weight must be positive')
+        self.coalesce = coalesce
+        self.coalesce_headers = tuple(coalesce_headers)
+        self._recv_bucket, self._send_bucket, self._bandwidth_lock = _bandwidth_limits(max_recv_speed, max_send_speed)
+        # 因带宽上限暂停的传输 -> 恢复的时间，curl对象 -> 限速时驱动传输的CurlMulti
+        self._paused = {}
+        self._multis = {}
+        # 进行中的请求，合并请求的键 -> Future
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.share_connections = share_connections
+        self.max_clients = max_clients
+        self.min_clients = max_clients if min_clients is None else min(min_clients, max_clients)
+        self.max_idle_time = max_idle_time
+        self.acquire_timeout = acquire_timeout
+        self.share = self._create_share()
         self.follow_redirects = True
         self.max_redirects = 5
         self.verify = True
         self.proxy_url = None
         self.timeout = None
         self.ca_path = certifi.where()
-        for _ in range(max_clients):
-            curl = self.create_curl(enable_cookie=enable_cookie, cookie_path=cookie_path, target=target,
-                                    default_headers=default_headers)
-            self.curl_queue.put(curl)
+        self._template = self._create_template(enable_cookie=enable_cookie, cookie_path=cookie_path, target=target,
+                                               default_headers=default_headers)
+        self._pool_lock = threading.Lock()
+        self._pool_cond = threading.Condition(self._pool_lock)
+        # 空闲的curl对象和空闲开始时间，后归还的先取出，空闲最久的在队首等待回收
+        self._idle = deque()
+        # 现有的curl对象数，包括使用中的
+        self._size = 0
+        self._pool_stats = _PoolStats()
+        # 队列名 -> _QueueStats；等待curl对象的线程按队列排队：队列名 -> [Condition, 是否已分配, curl对象]，
+        # _waiting_queues为有线程等待的队列，按DRR轮流
+        self._queue_stats = {}
+        self._waiters = {}
+        self._waiting_queues = deque()
+        # 使用中的curl对象 -> 队列名
+        self._curl_queues = {}
+        self._pool_ready = False
+        if not prefork:
+            self._build_pool()
+        _fork_clients.add(self)
+
+    def _create_share(self):
+        """生成所有curl对象共用的CurlShare对象"""
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        if self.share_connections:
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+        return share
+
+    def _create_template(self, enable_cookie=False, cookie_path='', target='chrome104', default_headers=1):
+        """生成不关联share的模板curl对象，只用于duphandle克隆，克隆只复制选项，不复制连接和ssl会话"""
+        curl = pycurl.Curl()
+        curl.setopt(pycurl.NOSIGNAL, 1)
+        curl.setopt(pycurl.ENCODING, '')
+        if self.share_connections:
+            # 共享连接池的容量由curl对象的MAXCONNECTS决定(默认5)，按每个curl对象5个连接放大，否则访问多个host时连接会被频繁淘汰
+            curl.setopt(pycurl.MAXCONNECTS, 5 * self.max_clients)
+        if self.max_idle_time is not None:
+            # 共享连接池中的连接不属于某个curl对象，关闭curl对象不会关闭它们，由libcurl关闭空闲过久的连接
+            curl.setopt(pycurl.MAXAGE_CONN, max(1, int(self.max_idle_time)))
+        _set_ca_path(curl, self.ca_path)
+        curl.impersonate(target, default_headers)
+        if enable_cookie:
+            curl.setopt(pycurl.COOKIEFILE, cookie_path)
+        return curl
+
+    def _clone_curl(self):
+        """从模板克隆curl对象并关联share，duphandle不复制share，每个克隆都要重新设置"""
+        curl = self._template.duphandle()
+        curl.setopt(pycurl.SHARE, self.share)
+        # 会话缓存不设置在模板上，fork后子进程克隆时使用子进程自己的缓存
+        _set_tls_session_file(curl, self.tls_session_file)
+        return curl
+
+    def _after_fork(self):
+        """fork后在子进程中调用，此时子进程只有一个线程，继承的锁可能处于加锁状态，直接替换"""
+        self._pool_lock = threading.Lock()
+        self._pool_cond = threading.Condition(self._pool_lock)
+        self._pool_ready = False
+        self._waiters = {}
+        self._waiting_queues = deque()
+        self._curl_queues = {}
+        self._bandwidth_lock = threading.Lock()
+        self._paused = {}
+        self._multis = {}
+        # 父进程中进行的请求不会在子进程中完成
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _build_pool(self):
+        """从模板克隆min_clients个curl对象，调用时持有_pool_cond或尚未开始使用"""
+        now = time.monotonic()
+        self._idle = deque((self._clone_curl(), now) for _ in range(self.min_clients))
+        self._size = self.min_clients
+        self._pool_ready = True
+
+    def _evict_idle(self, now):
+        """取出空闲超过max_idle_time的curl对象，由调用方在锁外关闭，调用时持有_pool_cond"""
+        evicted = []
+        if self.max_idle_time is None:
+            return evicted
+        while self._idle and self._size > self.min_clients and now - self._idle[0][1] >= self.max_idle_time:
+            evicted.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._pool_stats.evicted += 1
+        return evicted
+
+    def _close_curl(self, curl):
+        """关闭curl对象和限速时为它创建的CurlMulti"""
+        multi = self._multis.pop(curl, None)
+        if multi is not None:
+            multi.close()
+        curl.close()
+
+    def _get_queue_stats(self, queue):
+        stats = self._queue_stats.get(queue)
+        if stats is None:
+            stats = self._queue_stats[queue] = _QueueStats(self.queue_weights.get(queue, 1))
+        return stats
+
+    def _can_take(self):
+        return self._idle or self._size < self.max_clients
+
+    def _grant(self):
+        """把空闲的curl对象按DRR分配给等待的线程：轮到的队列余额加上权重，余额每够1分配一个，
+        没有空闲对象但不足max_clients个时分配一个名额，由等待的线程自己克隆；调用时持有_pool_cond"""
+        while self._waiting_queues and self._can_take():
+            queue = self._waiting_queues[0]
+            stats = self._queue_stats[queue]
+            waiters = self._waiters[queue]
+            if stats.deficit < 1:
+                stats.deficit += stats.weight
+            while waiters and stats.deficit >= 1 and self._can_take():
+                waiter = waiters.popleft()
+                if self._idle:
+                    waiter[2] = self._idle.pop()[0]
+                else:
+                    self._size += 1
+                    self._pool_stats.created += 1
+                waiter[1] = True
+                stats.deficit -= 1
+                waiter[0].notify()
+            if not waiters:
+                self._waiting_queues.popleft()
+                del self._waiters[queue]
+                stats.deficit = 0.0
+            elif stats.deficit < 1:
+                self._waiting_queues.rotate(-1)
+
+    def _get_curl(self, queue='default'):
+        """取得一个空闲的curl对象：优先取最近归还的，没有空闲对象且不足max_clients个时克隆新的，否则按queue排队等待归还，
+        等待超过acquire_timeout抛出TimeoutError；curl对象池尚未建立(prefork或fork后的子进程)时先从模板克隆"""
+        start = time.monotonic()
+        deadline = None if self.acquire_timeout is None else start + self.acquire_timeout
+        curl = None
+        with self._pool_cond:
+            if not self._pool_ready:
+                # 继承的curl/share对象由pycurl标记为失效，释放时不会触碰父进程的连接
+                self.share = self._create_share()
+                self._pool_stats = _PoolStats()
+                self._queue_stats = {}
+                self._build_pool()
+            stats = self._get_queue_stats(queue)
+            wait_time = None
+            if self._waiting_queues or not self._can_take():
+                waiter = [threading.Condition(self._pool_lock), False, None]
+                waiters = self._waiters.get(queue)
+                if waiters is None:
+                    waiters = self._waiters[queue] = deque()
+                    self._waiting_queues.append(queue)
+                waiters.append(waiter)
+                stats.queued += 1
+                try:
+                    while not waiter[1]:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._pool_stats.timeouts += 1
+                            raise TimeoutError('no idle curl object within %s seconds' % self.acquire_timeout)
+                        waiter[0].wait(remaining)
+                finally:
+                    stats.queued -= 1
+                    if not waiter[1]:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            self._waiting_queues.remove(queue)
+                            del self._waiters[queue]
+                            stats.deficit = 0.0
+                curl = waiter[2]
+                wait_time = time.monotonic() - start
+            elif self._idle:
+                curl = self._idle.pop()[0]
+            else:
+                self._size += 1
+                self._pool_stats.created += 1
+            self._pool_stats.acquire(wait_time)
+            stats.admit(wait_time)
+            evicted = self._evict_idle(time.monotonic())
+        for idle_curl in evicted:
+            self._close_curl(idle_curl)
+        if curl is None:
+            try:
+                curl = self._clone_curl()
+            except BaseException:
+                with self._pool_cond:
+                    self._size -= 1
+                    self._pool_stats.release()
+                    stats.active -= 1
+                    self._grant()
+                raise
+        self._curl_queues[curl] = queue
+        return curl
+
+    def _put_curl(self, curl):
+        """归还curl对象并分配给等待的线程，同时关闭空闲过久的curl对象"""
+        now = time.monotonic()
+        with self._pool_cond:
+            self._pool_stats.release()
+            self._get_queue_stats(self._curl_queues.pop(curl, 'default')).complete()
+            self._idle.append((curl, now))
+            self._grant()
+            evicted = self._evict_idle(now)
+        for idle_curl in evicted:
+            self._close_curl(idle_curl)
+
+    def set_queue_weight(self, queue, weight):
+        """设置命名队列的权重，等待curl对象时按权重的比例分配"""
+        if weight <= 0:
+            raise ValueError('queue weight must be positive')
+        with self._pool_cond:
+            self.queue_weights[queue] = weight
+            self._get_queue_stats(queue).weight = weight
+
+    def queue_stats(self):
+        """各命名队列的情况：weight 权重, queued 等待curl对象的线程数, active 使用中的curl对象数, admitted 累计分配次数,
+        completed 累计完成数, wait_time 累计等待时间(秒), max_wait 最长等待时间(秒), throughput 最近10秒平均每秒完成的请求数"""
+        with self._pool_cond:
+            return {queue: stats.snapshot() for queue, stats in self._queue_stats.items()}
+
+    def pool_stats(self):
+        """curl对象池的使用情况：size 现有curl对象数, idle 空闲数, in_use 使用中数, acquired 累计取用次数,
+        waited 需要等待的次数, wait_time 累计等待时间(秒), max_wait 最长等待时间(秒), timeouts 等待超时次数,
+        created 按需克隆的次数, evicted 空闲回收的次数, utilization 使用中的curl对象数占max_clients的时间平均比例"""
+        with self._pool_cond:
+            return self._pool_stats.snapshot(self._size, len(self._idle), self.max_clients)
 
     def create_curl(self, enable_cookie=False, cookie_path='E:\pycharm\TEST\wiley\wiley2023\cookie.txt', target='chrome104', default_headers=1):
-        """生成curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径"""
+        """不经过模板单独生成curl对象，用于需要与连接池不同设置的场景，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径"""
         curl = pycurl.Curl()
         curl.setopt(pycurl.NOSIGNAL, 1)
         curl.setopt(pycurl.ENCODING, '')
         curl.setopt(pycurl.SHARE, self.share)
-        curl.setopt(pycurl.CAINFO, self.ca_path)
+        if self.share_connections:
+            # 共享连接池的容量由curl对象的MAXCONNECTS决定(默认5)，按每个curl对象5个连接放大，否则访问多个host时连接会被频繁淘汰
+            curl.setopt(pycurl.MAXCONNECTS, 5 * self.max_clients)
+        _set_ca_path(curl, self.ca_path)
+        _set_tls_session_file(curl, self.tls_session_file)
         curl.impersonate(target, default_headers)
         if enable_cookie:
             curl.setopt(pycurl.COOKIEFILE, cookie_path)
         return curl
 
     def close(self):
-        """释放curl对象"""
-        while True:
-            try:
-                curl = self.curl_queue.get(timeout=1)
-                curl.close()
-            except:
-                break
+        """释放空闲的curl对象，并写回TLS会话缓存文件"""
+        with self._pool_cond:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+        for curl, _ in idle:
+            self._close_curl(curl)
+        self._template.close()
         self.share.close()
+        if self.tls_session_file is not None:
+            _save_tls_sessions(self.tls_session_file)
 
     def _curl_setup_request(self, curl, url, response_headers, method, headers=None, body=None, timeout=None,
                             follow_redirects=None, max_redirects=None, proxy_url=None, verify=None):
@@ -272,7 +1121,8 @@ class RequestThread(object):
                 if cmd == curl.IOCMD_RESTARTREAD:  # type: ignore
                     request_buffer.seek(0)
 
-            curl.setopt(pycurl.READFUNCTION, request_buffer.read)
+            curl.setopt(pycurl.READFUNCTION,
+                        self._throttle(curl, request_buffer.read, self._send_bucket, pycurl.READFUNC_PAUSE))
             curl.setopt(pycurl.IOCTLFUNCTION, ioctl)
             if method == "POST":
                 curl.setopt(pycurl.POSTFIELDSIZE, len(body or ""))
@@ -283,61 +1133,170 @@ class RequestThread(object):
     def _finish(self, curl, response):
         """填充response对象"""
         try:
-            response.content = curl.perform_rb()
+            if self._recv_bucket is None and self._send_bucket is None:
+                response.content = curl.perform_rb()
+            else:
+                response.content = self._perform_limited(curl)
             response.http_code = curl.getinfo(pycurl.RESPONSE_CODE)
             response.effective_url = curl.getinfo(pycurl.EFFECTIVE_URL)
         finally:
-            self.curl_queue.put(curl)
+            self._put_curl(curl)
         return response
 
-    def get(self, url, **kwargs):
-        """发送GET请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "GET", **kwargs)
-        return self._finish(curl, response)
+    def _throttle(self, curl, callback, bucket, pause):
+        """有带宽上限时包装收发数据的回调，暂停时记录恢复的时间，由_perform_limited在multi调用之间恢复"""
+        if bucket is None:
+            return callback
+
+        def paused(delay):
+            self._paused[curl] = time.monotonic() + delay
+        return _throttled(callback, bucket, self._bandwidth_lock, pause, paused)
+
+    def _perform_limited(self, curl):
+        """有带宽上限时代替perform_rb：easy接口暂停的传输约1秒才调用一次进度回调，无法及时恢复，
+        所以用curl对象自己的CurlMulti驱动传输(连接缓存随之保留)，在multi调用之间恢复到期的暂停"""
+        multi = self._multis.get(curl)
+        if multi is None:
+            multi = self._multis[curl] = pycurl.CurlMulti()
+        buffer = BytesIO()
+        curl.setopt(pycurl.WRITEFUNCTION, self._throttle(curl, buffer.write, self._recv_bucket, pycurl.WRITEFUNC_PAUSE))
+        multi.add_handle(curl)
+        try:
+            while True:
+                ret, active = multi.perform()
+                if ret == pycurl.E_CALL_MULTI_PERFORM:
+                    continue
+                if not active:
+                    break
+                timeout = multi.timeout() / 1000
+                resume = self._paused.get(curl)
+                if resume is not None:
+                    delay = resume - time.monotonic()
+                    if delay <= 0:
+                        del self._paused[curl]
+                        curl.pause(pycurl.PAUSE_CONT)
+                        continue
+                    timeout = delay if timeout < 0 else min(timeout, delay)
+                multi.select(1.0 if timeout < 0 else timeout)
+            _, _, failed = multi.info_read()
+            if failed:
+                raise pycurl.error(failed[0][1], failed[0][2])
+        finally:
+            multi.remove_handle(curl)
+            self._paused.pop(curl, None)
+        return buffer.getvalue()
 
-    def post(self, url, **kwargs):
-        """发送POST请求"""
-        curl = self.curl_queue.get()
+    def _send(self, method, url, queue, kwargs):
+        """从queue取得curl对象发送一次请求"""
+        curl = self._get_curl(queue)
         response = Response()
-        self._curl_setup_request(curl, url, response.headers, "POST", **kwargs)
+        try:
+            self._curl_setup_request(curl, url, response.headers, method, **kwargs)
+        except BaseException:
+            self._put_curl(curl)
+            raise
         return self._finish(curl, response)
 
-    def put(self, url, **kwargs):
-        """发送PUT请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "PUT", **kwargs)
-        return self._finish(curl, response)
+    def _attempt(self, method, url, queue, kwargs):
+        """发送一次请求，有熔断器时先检查host的状态，再把结果计入统计"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._send(method, url, queue, kwargs)
+        host = urlsplit(url).netloc.lower()
+        probe = breaker.check(host)
+        failed = None
+        try:
+            response = self._send(method, url, queue, kwargs)
+            failed = breaker.failed(response=response)
+            return response
+        except pycurl.error as e:
+            failed = breaker.failed(error=e)
+            raise
+        finally:
+            breaker.record(host, probe, failed)
+
+    def _request(self, method, url, retry, queue, kwargs):
+        """发送请求并按重试策略重试，retry为None时使用客户端的策略，False不重试；
+        等待重试时curl对象先归还，重试时优先取回最近归还的，通常还是同一个curl对象和连接"""
+        retry = self.retry if retry is None else retry or None
+        if retry is not None:
+            retry.start()
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(method, url, queue, kwargs)
+            except pycurl.error as e:
+                delay = None if retry is None else retry.delay(method, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = None if retry is None else retry.delay(method, attempt, response=response)
+                if delay is None:
+                    return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _coalesce(self, method, url, retry, queue, kwargs):
+        """相同的请求正在进行时等待它的结果，否则由当前线程发出请求并把结果交给等待的线程；
+        发出请求的线程被KeyboardInterrupt等中断时取消Future，等待的线程改为自己发出请求"""
+        key = _coalesce_key(method, url, retry, kwargs, self.coalesce_headers)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            try:
+                return future.result()
+            except CancelledError:
+                return self._request(method, url, retry, queue, kwargs)
+        try:
+            response = self._request(method, url, retry, queue, kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
 
-    def head(self, url, **kwargs):
-        """发送HEAD请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "HEAD", **kwargs)
-        return self._finish(curl, response)
+    def get(self, url, retry=None, coalesce=None, queue='default', **kwargs):
+        """发送GET请求，retry 覆盖客户端的重试策略，False不重试，coalesce 覆盖客户端的合并请求设置，
+        queue 等待curl对象时所在的命名队列"""
+        if coalesce or coalesce is None and self.coalesce:
+            return self._coalesce("GET", url, retry, queue, kwargs)
+        return self._request("GET", url, retry, queue, kwargs)
 
-    def options(self, url, **kwargs):
-        """发送OPTIONS请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "OPTIONS", **kwargs)
-        return self._finish(curl, response)
+    def post(self, url, retry=None, queue='default', **kwargs):
+        """发送POST请求，retry和queue同get"""
+        return self._request("POST", url, retry, queue, kwargs)
 
-    def patch(self, url, **kwargs):
-        """发送PATCH请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "PATCH", **kwargs)
-        return self._finish(curl, response)
+    def put(self, url, retry=None, queue='default', **kwargs):
+        """发送PUT请求，retry和queue同get"""
+        return self._request("PUT", url, retry, queue, kwargs)
 
-    def delete(self, url, **kwargs):
-        """发送DELETE请求"""
-        curl = self.curl_queue.get()
-        response = Response()
-        self._curl_setup_request(curl, url, response.headers, "DELETE", **kwargs)
-        return self._finish(curl, response)
+    def head(self, url, retry=None, coalesce=None, queue='default', **kwargs):
+        """发送HEAD请求，retry、coalesce和queue同get"""
+        if coalesce or coalesce is None and self.coalesce:
+            return self._coalesce("HEAD", url, retry, queue, kwargs)
+        return self._request("HEAD", url, retry, queue, kwargs)
+
+    def options(self, url, retry=None, queue='default', **kwargs):
+        """发送OPTIONS请求，retry和queue同get"""
+        return self._request("OPTIONS", url, retry, queue, kwargs)
+
+    def patch(self, url, retry=None, queue='default', **kwargs):
+        """发送PATCH请求，retry和queue同get"""
+        return self._request("PATCH", url, retry, queue, kwargs)
+
+    def delete(self, url, retry=None, queue='default', **kwargs):
+        """发送DELETE请求，retry和queue同get"""
+        return self._request("DELETE", url, retry, queue, kwargs)
 
 
 class RequestAsync(object):
@@ -346,47 +1305,247 @@ class RequestAsync(object):
          http = await RequestAsync.create()
          response = await http.get(url)
          """
+    # 限速时间轮的精度(秒)
+    rate_tick = 0.01
+    # hedge_after按百分位计算时，每个host保留最近多少个请求的耗时，以及至少需要多少个
+    latency_window = 200
+    min_latency_samples = 20
+
     @classmethod
-    async def create(cls, max_clients=5, target='chrome110', default_headers=1, enable_cookie=False, cookie_path=''):
-        """根据max_clients生成多个curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径"""
+    async def create(cls, max_clients=5, target='chrome110', default_headers=1, enable_cookie=False, cookie_path='',
+                     share=None, pipelining=pycurl.PIPE_MULTIPLEX, max_host_connections=0, max_total_connections=0,
+                     max_concurrent_streams=100, pipewait=True, max_host_clients=None, prefork=False,
+                     tls_session_file=None, min_clients=None, max_idle_time=None, acquire_timeout=None,
+                     host_rate=None, host_burst=None, proxy_rate=None, proxy_burst=None, max_proxy_clients=None,
+                     adaptive=False, latency_tolerance=2.0, retry=None, coalesce=False, coalesce_headers=(),
+                     circuit_breaker=None, queue_weights=None, max_recv_speed=None, max_send_speed=None,
+                     bandwidth=None):
+        """根据max_clients生成多个curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径
+        share 传入已有的CurlShare对象时与其他客户端共享cookie/dns/ssl会话，关闭时不会释放该share
+        连接策略：pipelining 是否在HTTP/2连接上多路复用(PIPE_MULTIPLEX/PIPE_NOTHING),
+        max_host_connections 每个host的最大连接数, max_total_connections 总连接数上限(0表示不限制),
+        max_concurrent_streams 每个HTTP/2连接的最大并发流数,
+        pipewait 新请求是否等待已有连接确认可以多路复用，而不是立即新建连接和TLS握手
+        max_host_clients 同一个host最多同时占用的curl对象数量，默认不限制，
+        等待curl对象的请求按host排队，空闲的curl对象轮流分配给各个host
+        prefork 在fork子进程之前创建时设为True，只生成模板，curl对象在第一次请求时(即子进程中)从模板克隆，
+        未设置时fork后子进程同样会在第一次请求时丢弃继承的multi/share/curl对象并从模板重建
+        tls_session_file TLS会话缓存文件的路径，启动时加载其中未过期的会话，close()和进程退出时写回
+        min_clients 至少保留的curl对象数，默认等于max_clients即固定大小，小于max_clients时请求多了再克隆，最多max_clients个
+        max_idle_time curl对象空闲超过该秒数后关闭(至少保留min_clients个)，同时作为连接的最长空闲时间(MAXAGE_CONN)，
+        multi连接池中空闲过久的连接由libcurl关闭，默认不回收
+        acquire_timeout 等待空闲curl对象的最长秒数，超时抛出asyncio.TimeoutError，默认一直等待
+        限速：host_rate 每个host每秒最多发出的请求数, host_burst 允许连续发出的请求数(默认1)，
+        proxy_rate/proxy_burst/max_proxy_clients 对每个代理(proxy_url)的同样限制，默认都不限制，
+        超出限制的请求排队等待，不占用curl对象；单个host的限制可以用set_host_limit单独设置
+        adaptive 按host自动调整并发数(AIMD)，从4开始，max_host_clients(或set_host_limit的max_clients)为上限，
+        出错、429/503时减半，首字节时间(不含建立连接)超过该host最短首字节时间的latency_tolerance倍时减少10%
+        retry 重试策略(Retry)，默认不重试，等待重试时不占用curl对象，重试后超过deadline时不再重试
+        coalesce 合并相同的GET/HEAD请求：同一个请求(方法、url、coalesce_headers和Cookie/Authorization请求头、
+        其余参数都相同，deadline除外)正在进行时，
+        其他协程等待它完成并得到同一个Response对象(不要修改)或同一个异常，priority、hedge_after等以最先发出的请求为准，
+        单个请求可以用coalesce=覆盖
+        circuit_breaker 按host的熔断器(CircuitBreaker)，打开时请求不排队等待curl对象，直接抛出CircuitOpenError
+        queue_weights 命名队列的权重{队列名: 权重}，请求用queue=指定队列(默认'default'，权重默认1)，
+        同一priority内空闲的curl对象按队列的权重以DRR轮流分配，队列内再轮流分配给各host，可以用set_queue_weight修改
+        max_recv_speed/max_send_speed 所有传输合计每秒最多接收/发送的字节数，默认不限制；
+        收发数据的回调按字节数从共用的令牌桶中扣除，余额为负时暂停该传输(WRITEFUNC_PAUSE/READFUNC_PAUSE)，
+        余额恢复后继续，暂停期间libcurl不读写该连接，带宽由正在收发的传输共用
+        bandwidth 与其他客户端共用的带宽限制(由_bandwidth_limits生成)，给出时忽略max_recv_speed/max_send_speed"""
         self = RequestAsync()
-        self._share = pycurl.CurlShare()
-        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
-        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
-        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
-        self._curls = [self._create_curl(enable_cookie=enable_cookie, cookie_path=cookie_path, target=target,
-                                         default_headers=default_headers) for i in range(max_clients)]
-        self._free_queue = asyncio.Queue()
-        for _ in self._curls:
-            await self._free_queue.put(_)
+        self.tls_session_file = tls_session_file
+        self.min_clients = max_clients if min_clients is None else min(min_clients, max_clients)
+        self.max_idle_time = max_idle_time
+        self.acquire_timeout = acquire_timeout
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.proxy_rate = proxy_rate
+        self.proxy_burst = proxy_burst
+        self.max_proxy_clients = max_proxy_clients
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.queue_weights = dict(queue_weights or {})
+        if any(weight <= 0 for weight in self.queue_weights.values()):
+            raise ValueError('queue weight must be positive')
+        self.coalesce = coalesce
+        self.coalesce_headers = tuple(coalesce_headers)
+        if bandwidth is None:
+            bandwidth = _bandwidth_limits(max_recv_speed, max_send_speed)
+        self._recv_bucket, self._send_bucket, self._bandwidth_lock = bandwidth
+        self._multi_options = [
+            (pycurl.M_PIPELINING, pipelining),
+            (pycurl.M_MAX_HOST_CONNECTIONS, max_host_connections),
+            (pycurl.M_MAX_TOTAL_CONNECTIONS, max_total_connections),
+            (pycurl.M_MAX_CONCURRENT_STREAMS, max_concurrent_streams),
+        ]
+        for option, value in self._multi_options:
+            self._multi.setopt(option, value)
+        self.pipewait = pipewait
+        self._own_share = share is None
+        if share is None:
+            share = self._create_share()
+        self._share = share
+        self.max_clients = max_clients
+        self._template = self._create_template(enable_cookie=enable_cookie, cookie_path=cookie_path, target=target,
+                                               default_headers=default_headers)
+        self._pool_ready = False
+        if not prefork:
+            self._build_pool()
+        self.max_host_clients = max_host_clients or max_clients
+        _fork_clients.add(self)
         return self
 
     def __init__(self):
-        self._multi = pycurl.CurlMulti()
-        self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_callback)
-        self._multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_callback)
+        self._multi_options = []
+        self._multi = self._create_multi()
         self.follow_redirects = True
         self.max_redirects = 5
         self.verify = True
         self.proxy_url = None
         self.timeout = None
         self.ca_path = certifi.where()
+        self.tls_session_file = None
+        self.min_clients = 0
+        self.max_idle_time = None
+        self.acquire_timeout = None
+        self.host_rate = None
+        self.host_burst = None
+        self.proxy_rate = None
+        self.proxy_burst = None
+        self.max_proxy_clients = None
+        self.adaptive = False
+        self.latency_tolerance = 2.0
+        self.retry = None
+        self.circuit_breaker = None
+        self.queue_weights = {}
+        self.coalesce = False
+        self.coalesce_headers = ()
+        self._recv_bucket = None
+        self._send_bucket = None
+        self._bandwidth_lock = threading.Lock()
+        self.pipewait = True
         self._timer = None
         self._transfers = {}
         self._fds = set()
-
-    def _create_curl(self, enable_cookie=False, cookie_path='', target='chrome110', default_headers=1):
-        """生成curl对象，target模拟浏览器的目标, default_headers是否携带默认头, enable_cookie是否开启cookie记录, cookie_path cookie文件的路径"""
+        self._curls = []
+        self._free_curls = []
+        self.max_clients = 0
+        self.max_host_clients = None
+        # (priority, queue, host) -> 排队中的请求，_waiting_hosts[(priority, queue)]为该队列中有请求排队的host，
+        # _waiting_queues[priority]为有请求排队的队列(按DRR轮流)，_priorities为其中的priority升序
+        self._host_queues = {}
+        self._waiting_hosts = {}
+        self._waiting_queues = {}
+        self._priorities = []
+        self._host_active = {}
+        self._proxy_active = {}
+        self._host_stats = {}
+        # 队列名 -> _QueueStats，deficit在队列没有请求排队时清零
+        self._queue_stats = {}
+        # 使用中的curl对象 -> (host, proxy, queue)
+        self._acquired = {}
+        # set_host_limit设置的host -> (rate, burst, max_clients)，令牌桶按host或('proxy', proxy_url)保存
+        self._host_limits = {}
+        self._buckets = {}
+        self._wheel = _TimerWheel(self._wake, self.rate_tick)
+        # adaptive时每个host的_AimdLimit
+        self._adaptive = {}
+        # 每个host最近成功请求的TOTAL_TIME，用于hedge_after='p95'这样的百分位延迟
+        self._latencies = {}
+        # 进行中的请求，合并请求的键 -> [任务, 等待的协程数]
+        self._inflight = {}
+        # 空闲curl对象的空闲开始时间，_free_curls栈底是空闲最久的
+        self._idle_since = {}
+        self._evict_timer = None
+        # 因带宽上限暂停的传输 -> 恢复的定时器
+        self._paused = {}
+        self._pool_stats = _PoolStats()
+        self._template = None
+        self._pool_ready = True
+        self._forked = False
+
+    def _create_multi(self):
+        """生成multi对象并设置回调和连接策略"""
+        multi = pycurl.CurlMulti()
+        multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_callback)
+        multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_callback)
+        for option, value in self._multi_options:
+            multi.setopt(option, value)
+        return multi
+
+    @staticmethod
+    def _create_share():
+        """生成共享cookie/dns/ssl会话的CurlShare对象"""
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        return share
+
+    def _create_template(self, enable_cookie=False, cookie_path='', target='chrome110', default_headers=1):
+        """生成不关联share的模板curl对象，只用于duphandle克隆，克隆只复制选项，不复制连接和ssl会话"""
         curl = pycurl.Curl()
         curl.setopt(pycurl.NOSIGNAL, 1)
         curl.setopt(pycurl.ENCODING, '')
-        curl.setopt(pycurl.SHARE, self._share)
-        curl.setopt(pycurl.CAINFO, self.ca_path)
+        _set_ca_path(curl, self.ca_path)
         curl.impersonate(target, default_headers)
+        if self.pipewait:
+            curl.setopt(pycurl.PIPEWAIT, 1)
+        if self.max_idle_time is not None:
+            # 连接在multi的连接池中，关闭curl对象不会关闭它们，由libcurl关闭空闲过久的连接
+            curl.setopt(pycurl.MAXAGE_CONN, max(1, int(self.max_idle_time)))
         if enable_cookie:
             curl.setopt(pycurl.COOKIEFILE, cookie_path)
         return curl
 
+    def _clone_curl(self):
+        """从模板克隆curl对象并关联share，duphandle不复制share，每个克隆都要重新设置"""
+        curl = self._template.duphandle()
+        curl.setopt(pycurl.SHARE, self._share)
+        # 会话缓存不设置在模板上，fork后子进程克隆时使用子进程自己的缓存
+        _set_tls_session_file(curl, self.tls_session_file)
+        return curl
+
+    def _after_fork(self):
+        """fork后在子进程中调用，继承的multi/share/curl对象和父进程事件循环上的请求都不能再使用"""
+        self._forked = True
+        self._pool_ready = False
+
+    def _build_pool(self):
+        """从模板克隆curl对象池，fork后的子进程还要换掉继承的multi和share，并丢弃父进程中进行的请求"""
+        if self._forked:
+            self._multi = self._create_multi()
+            # 外部传入的share同样来自父进程，子进程改用自己的share
+            self._share = self._create_share()
+            self._own_share = True
+            self._timer = None
+            self._transfers = {}
+            self._fds = set()
+            self._host_queues = {}
+            self._waiting_hosts = {}
+            self._waiting_queues = {}
+            self._priorities = []
+            self._host_active = {}
+            self._proxy_active = {}
+            self._host_stats = {}
+            self._queue_stats = {}
+            self._acquired = {}
+            self._buckets = {}
+            self._wheel = _TimerWheel(self._wake, self.rate_tick)
+            self._evict_timer = None
+            self._paused = {}
+            self._bandwidth_lock = threading.Lock()
+            self._pool_stats = _PoolStats()
+            self._inflight = {}
+            self._forked = False
+        self._curls = [self._clone_curl() for _ in range(self.min_clients)]
+        self._free_curls = list(self._curls)
+        now = time.monotonic()
+        self._idle_since = {curl: now for curl in self._curls}
+        self._pool_ready = True
+
     def _socket_callback(self, ev_bitmask, sock_fd, multi, data):
         loop = asyncio.get_running_loop()
 
@@ -412,7 +1571,8 @@ class RequestAsync(object):
             self._timer = None
         else:
             loop = asyncio.get_running_loop()
-            self._timer = loop.call_later(timeout_ms / 1000, self._multi.socket_action, pycurl.SOCKET_TIMEOUT, 0)
+            # 超时处理中也可能有传输完成(例如复用已有连接时)，和套接字事件一样检查完成的传输
+            self._timer = loop.call_later(timeout_ms / 1000, self._socket_action, pycurl.SOCKET_TIMEOUT, 0)
 
     def _socket_action(self, sock_fd, ev_bitmask):
         status, handle_count = self._multi.socket_action(sock_fd, ev_bitmask)
@@ -444,6 +1604,9 @@ class RequestAsync(object):
         self._multi.remove_handle(handle)
 
         future = self._transfers.pop(handle)
+        if future.done():
+            # 等待传输的任务已被取消，传输在同一轮事件循环中结束
+            return
         if cancel:
             future.cancel()
         elif exception:
@@ -457,13 +1620,365 @@ class RequestAsync(object):
     def _cancel(self, handle: pycurl.Curl):
         self._remove_handle(handle, cancel=True)
 
+    async def _acquire(self, url, priority=0, deadline=None, proxy=None, queue='default'):
+        """为url取得一个空闲的curl对象，没有空闲对象或该host/代理受到并发或速率限制时按priority、queue和host排队等待，
+        priority越小越先分配；deadline为time.monotonic()的截止时间，已过或排队中到期时不再分配curl对象，抛出asyncio.TimeoutError"""
+        if not self._pool_ready:
+            self._build_pool()
+        host = urlsplit(url).netloc.lower()
+        loop = asyncio.get_running_loop()
+        stats = self._get_host_stats(host)
+        queue_stats = self._get_queue_stats(queue)
+        if deadline is not None and deadline <= time.monotonic():
+            stats['expired'] += 1
+            raise asyncio.TimeoutError('deadline exceeded before a curl object was available')
+        if not stats['queued'] and self._has_curl() and not self._limited(host, proxy, time.monotonic()):
+            curl = self._take_curl()
+            self._admit(host, proxy, queue, curl)
+            return curl
+
+        future = loop.create_future()
+        waiting = self._host_queues.get((priority, queue, host))
+        if waiting is None:
+            waiting = self._host_queues[priority, queue, host] = deque()
+            hosts = self._waiting_hosts.get((priority, queue))
+            if hosts is None:
+                hosts = self._waiting_hosts[priority, queue] = deque()
+                queues = self._waiting_queues.get(priority)
+                if queues is None:
+                    queues = self._waiting_queues[priority] = deque()
+                    bisect.insort(self._priorities, priority)
+                queues.append(queue)
+            hosts.append(host)
+        waiting.append((future, loop.time(), deadline, proxy))
+        stats['queued'] += 1
+        queue_stats.queued += 1
+        if self._has_curl():
+            # 队列中可能只剩已取消的请求，此时空闲的curl对象可以直接分配
+            self._dispatch()
+        timer = None
+        if not future.done():
+            delays = []
+            if self.acquire_timeout is not None:
+                delays.append(self.acquire_timeout)
+            if deadline is not None:
+                delays.append(deadline - time.monotonic())
+            if delays:
+                timer = loop.call_later(min(delays), self._acquire_timeout, future, deadline)
+        try:
+            return await future
+        except asyncio.TimeoutError:
+            stats['queued'] -= 1
+            queue_stats.queued -= 1
+            if deadline is not None and deadline <= time.monotonic():
+                stats['expired'] += 1
+            else:
+                self._pool_stats.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # 取消时已经分配到了curl对象，归还给其他请求
+                self._release(future.result())
+            else:
+                stats['queued'] -= 1
+                queue_stats.queued -= 1
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _get_host_stats(self, host):
+        stats = self._host_stats.get(host)
+        if stats is None:
+            stats = self._host_stats[host] = {'queued': 0, 'active': 0, 'admitted': 0, 'wait_time': 0.0,
+                                              'max_wait': 0.0, 'expired': 0, 'hedged': 0, 'hedge_won': 0,
+                                              'coalesced': 0}
+        return stats
+
+    def _get_queue_stats(self, queue):
+        stats = self._queue_stats.get(queue)
+        if stats is None:
+            stats = self._queue_stats[queue] = _QueueStats(self.queue_weights.get(queue, 1))
+        return stats
+
+    def _acquire_timeout(self, future, deadline=None):
+        """等待超过acquire_timeout或到达deadline，排队中的请求由_dispatch跳过"""
+        if future.done():
+            return
+        if deadline is not None and deadline <= time.monotonic():
+            future.set_exception(asyncio.TimeoutError('deadline exceeded before a curl object was available'))
+        else:
+            future.set_exception(asyncio.TimeoutError('no idle curl object within %s seconds' % self.acquire_timeout))
+
+    def _has_curl(self):
+        return bool(self._free_curls) or len(self._curls) < self.max_clients
+
+    def _take_curl(self):
+        """取出最近归还的空闲curl对象，没有空闲对象时从模板克隆，调用前由_has_curl确认"""
+        if self._free_curls:
+            curl = self._free_curls.pop()
+            del self._idle_since[curl]
+            return curl
+        curl = self._clone_curl()
+        self._curls.append(curl)
+        self._pool_stats.created += 1
+        return curl
+
+    def _limited(self, host, proxy, now):
+        """host或代理已达到并发上限或暂时没有令牌时返回True，没有令牌的令牌桶登记到时间轮，补充令牌后重新分配"""
+        rate, burst, max_clients = self._host_limits.get(host, (self.host_rate, self.host_burst, self.max_host_clients))
+        if self.adaptive:
+            max_clients = self._adaptive_limit(host, max_clients)
+        if self._host_active.get(host, 0) >= max_clients:
+            return True
+        buckets = [(host, rate, burst)]
+        if proxy is not None:
+            if self.max_proxy_clients is not None and self._proxy_active.get(proxy, 0) >= self.max_proxy_clients:
+                return True
+            buckets.append((('proxy', proxy), self.proxy_rate, self.proxy_burst))
+        for key, rate, burst in buckets:
+            if rate is None:
+                continue
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _TokenBucket(rate, burst)
+            delay = bucket.delay(now)
+            if delay > 0:
+                self._wheel.schedule(key, now + delay)
+                return True
+        return False
+
+    def _adaptive_limit(self, host, max_clients):
+        """adaptive时host当前的并发上限"""
+        limiter = self._adaptive.get(host)
+        if limiter is None:
+            limiter = self._adaptive[host] = _AimdLimit(self.latency_tolerance)
+        return max(1, min(max_clients, int(limiter.limit)))
+
+    def _observe(self, curl, failed):
+        """传输结束后按首字节时间和状态码调整host的并发上限，在归还curl对象之前调用"""
+        host = self._acquired[curl][0]
+        latency = None
+        if not failed:
+            failed = curl.getinfo(pycurl.RESPONSE_CODE) in (429, 503)
+        if not failed:
+            latency = curl.getinfo(pycurl.STARTTRANSFER_TIME) - curl.getinfo(pycurl.PRETRANSFER_TIME)
+        max_clients = self._host_limits.get(host, (None, None, self.max_host_clients))[2]
+        self._adaptive[host].observe(latency, failed, self._host_active[host], max_clients, time.monotonic())
+
+    def _wake(self, keys):
+        """时间轮回调：令牌桶已补充令牌，重新分配排队中的请求"""
+        self._dispatch()
+
+    def set_host_limit(self, host, rate=None, burst=None, max_clients=None):
+        """单独设置host(如example.com:443，与url中的写法一致)的限制：rate 每秒最多请求数, burst 允许连续发出的请求数,
+        max_clients 最多同时占用的curl对象数，未设置的项不限制(max_clients默认同max_host_clients)"""
+        host = host.lower()
+        self._host_limits[host] = (rate, burst, max_clients or self.max_host_clients)
+        self._buckets.pop(host, None)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        # 放宽限制后排队中的请求可以立即分配
+        self._dispatch()
+
+    def _admit(self, host, proxy, queue, curl, wait_time=None):
+        """记录host、代理和队列占用了curl对象并消耗令牌，wait_time为None表示没有排队"""
+        now = time.monotonic()
+        for key in (host, ('proxy', proxy)):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.take(now)
+        self._host_active[host] = self._host_active.get(host, 0) + 1
+        if proxy is not None:
+            self._proxy_active[proxy] = self._proxy_active.get(proxy, 0) + 1
+        self._acquired[curl] = (host, proxy, queue)
+        self._pool_stats.acquire(wait_time)
+        self._queue_stats[queue].admit(wait_time)
+        stats = self._host_stats[host]
+        stats['active'] += 1
+        stats['admitted'] += 1
+        if wait_time is not None:
+            stats['wait_time'] += wait_time
+            stats['max_wait'] = max(stats['max_wait'], wait_time)
+
+    def _release(self, curl):
+        """归还curl对象，并分配给排队中的请求"""
+        host, proxy, queue = self._acquired.pop(curl)
+        timer = self._paused.pop(curl, None)
+        if timer is not None:
+            timer.cancel()
+        self._host_stats[host]['active'] -= 1
+        self._queue_stats[queue].complete()
+        self._host_active[host] -= 1
+        if not self._host_active[host]:
+            del self._host_active[host]
+        if proxy is not None:
+            self._proxy_active[proxy] -= 1
+            if not self._proxy_active[proxy]:
+                del self._proxy_active[proxy]
+        self._pool_stats.release()
+        self._free_curls.append(curl)
+        self._idle_since[curl] = time.monotonic()
+        self._dispatch()
+        self._schedule_evict()
+
+    def _throttle(self, curl, callback, bucket, pause):
+        """有带宽上限时包装收发数据的回调，暂停时安排定时器，等余额恢复后由_resume继续"""
+        if bucket is None:
+            return callback
+
+        def paused(delay):
+            if curl not in self._paused:
+                self._paused[curl] = asyncio.get_running_loop().call_later(delay, self._resume, curl)
+        return _throttled(callback, bucket, self._bandwidth_lock, pause, paused)
+
+    def _resume(self, curl):
+        """恢复因带宽上限暂停的传输，在事件循环的定时器中执行，此时没有在执行multi"""
+        del self._paused[curl]
+        if curl in self._transfers:
+            curl.pause(pycurl.PAUSE_CONT)
+
+    def _schedule_evict(self):
+        """在空闲最久的curl对象到期时回收，已经安排过或没有可回收的对象时不做处理"""
+        if self.max_idle_time is None or self._evict_timer is not None or not self._free_curls or \
+                len(self._curls) <= self.min_clients:
+            return
+        delay = self._idle_since[self._free_curls[0]] + self.max_idle_time - time.monotonic()
+        self._evict_timer = asyncio.get_running_loop().call_later(max(delay, 0), self._evict_idle)
+
+    def _evict_idle(self):
+        """关闭空闲超过max_idle_time的curl对象，至少保留min_clients个"""
+        self._evict_timer = None
+        now = time.monotonic()
+        while self._free_curls and len(self._curls) > self.min_clients and \
+                now - self._idle_since[self._free_curls[0]] >= self.max_idle_time:
+            curl = self._free_curls.pop(0)
+            del self._idle_since[curl]
+            self._curls.remove(curl)
+            self._pool_stats.evicted += 1
+            curl.close()
+        self._schedule_evict()
+
+    def _dispatch(self):
+        """把空闲的curl对象分配给排队中的请求：priority小的先分配，同一priority内各队列按权重以DRR轮流分配，
+        轮到的队列余额加上权重，余额每够1分配一个，队列内再轮流分配给各host队列头部的请求，
+        跳过受到并发或速率限制的host，不足max_clients个时克隆新的curl对象；已取消的请求直接移除，deadline已过的请求不分配curl对象"""
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        index = 0
+        while self._has_curl() and index < len(self._priorities):
+            priority = self._priorities[index]
+            queues = self._waiting_queues[priority]
+            skipped = 0
+            while self._has_curl() and skipped < len(queues):
+                queue = queues[0]
+                stats = self._queue_stats[queue]
+                if stats.deficit < 1:
+                    stats.deficit += stats.weight
+                limited = self._dispatch_queue(priority, queue, loop, now)
+                if (priority, queue) not in self._waiting_hosts:
+                    queues.popleft()
+                    stats.deficit = 0.0
+                elif limited:
+                    queues.rotate(-1)
+                    skipped += 1
+                elif stats.deficit < 1:
+                    queues.rotate(-1)
+                    skipped = 0
+            if queues:
+                # 该priority剩下的队列都受到限制，空闲的curl对象留给下一级priority
+                index += 1
+            else:
+                del self._waiting_queues[priority]
+                del self._priorities[index]
+
+    def _dispatch_queue(self, priority, queue, loop, now):
+        """在余额内把空闲的curl对象轮流分配给队列中各host的请求，返回剩下的host是否都受到限制"""
+        stats = self._queue_stats[queue]
+        hosts = self._waiting_hosts[priority, queue]
+        skipped = 0
+        while self._has_curl() and stats.deficit >= 1 and skipped < len(hosts):
+            host = hosts.popleft()
+            waiting = self._host_queues[priority, queue, host]
+            while waiting and (waiting[0][0].done() or waiting[0][2] is not None and waiting[0][2] <= now):
+                future = waiting.popleft()[0]
+                self._acquire_timeout(future, now)
+            if not waiting:
+                del self._host_queues[priority, queue, host]
+                continue
+            if self._limited(host, waiting[0][3], now):
+                hosts.append(host)
+                skipped += 1
+                continue
+            future, queued_at, _, proxy = waiting.popleft()
+            curl = self._take_curl()
+            self._host_stats[host]['queued'] -= 1
+            stats.queued -= 1
+            stats.deficit -= 1
+            self._admit(host, proxy, queue, curl, loop.time() - queued_at)
+            future.set_result(curl)
+            if waiting:
+                hosts.append(host)
+            else:
+                del self._host_queues[priority, queue, host]
+            skipped = 0
+        if not hosts:
+            del self._waiting_hosts[priority, queue]
+            return False
+        return skipped >= len(hosts)
+
+    def host_stats(self):
+        """各host的排队情况：queued 排队中的请求数, active 占用的curl对象数, admitted 已分配的请求数,
+        wait_time 累计等待时间(秒), max_wait 最长等待时间(秒), expired 因deadline已过而放弃的请求数,
+        hedged 发出对冲请求的次数, hedge_won 对冲请求先完成的次数, coalesced 合并到进行中请求的次数,
+        adaptive时还有limit 当前的并发上限"""
+        result = {}
+        for host, stats in self._host_stats.items():
+            result[host] = dict(stats)
+            if host in self._adaptive:
+                max_clients = self._host_limits.get(host, (None, None, self.max_host_clients))[2]
+                result[host]['limit'] = self._adaptive_limit(host, max_clients)
+        return result
+
+    def set_queue_weight(self, queue, weight):
+        """设置命名队列的权重，同一priority内按权重的比例分配curl对象"""
+        if weight <= 0:
+            raise ValueError('queue weight must be positive')
+        self.queue_weights[queue] = weight
+        self._get_queue_stats(queue).weight = weight
+
+    def queue_stats(self):
+        """各命名队列的情况，各项含义同RequestThread.queue_stats"""
+        return {queue: stats.snapshot() for queue, stats in self._queue_stats.items()}
+
+    def pool_stats(self):
+        """curl对象池的使用情况，各项含义同RequestThread.pool_stats"""
+        return self._pool_stats.snapshot(len(self._curls), len(self._free_curls), self.max_clients)
+
     def close(self):
-        for handle in self._transfers.keys():
+        self._wheel.cancel()
+        if self._evict_timer is not None:
+            self._evict_timer.cancel()
+            self._evict_timer = None
+        for timer in self._paused.values():
+            timer.cancel()
+        self._paused = {}
+        if self._forked:
+            # 继承自父进程的请求不在子进程的multi对象上，直接丢弃
+            self._transfers = {}
+        for handle in list(self._transfers.keys()):
             self._stop(handle)
         for handle in self._curls:
             handle.close()
-        self._share.close()
+        if self._template is not None:
+            self._template.close()
+        if self._own_share:
+            self._share.close()
         self._multi.close()
+        if self.tls_session_file is not None:
+            _save_tls_sessions(self.tls_session_file)
 
     def _curl_setup_request(self, curl, url, response_headers, buffer, method, headers=None, body=None, timeout=None,
                             follow_redirects=None, max_redirects=None, proxy_url=None, verify=None):
@@ -472,7 +1987,7 @@ class RequestAsync(object):
               follow_redirects 设置是否跳转, max_redirects 设置最大跳转次数,
               proxy_url 设置代理链接, verify 设置是否验证https证书"""
         curl.setopt(pycurl.URL, url)
-        curl.setopt(pycurl.WRITEDATA, buffer)
+        curl.setopt(pycurl.WRITEFUNCTION, self._throttle(curl, buffer.write, self._recv_bucket, pycurl.WRITEFUNC_PAUSE))
         if headers is not None:
             if "Expect" not in headers:
                 headers["Expect"] = ""
@@ -563,7 +2078,8 @@ class RequestAsync(object):
                 if cmd == curl.IOCMD_RESTARTREAD:  # type: ignore
                     request_buffer.seek(0)
 
-            curl.setopt(pycurl.READFUNCTION, request_buffer.read)
+            curl.setopt(pycurl.READFUNCTION,
+                        self._throttle(curl, request_buffer.read, self._send_bucket, pycurl.READFUNC_PAUSE))
             curl.setopt(pycurl.IOCTLFUNCTION, ioctl)
             if method == "POST":
                 curl.setopt(pycurl.POSTFIELDSIZE, len(body or ""))
@@ -574,67 +2090,526 @@ class RequestAsync(object):
     async def _finish(self, curl, response, buffer):
         """填充response对象"""
         try:
-            await self._add_handle(curl)
+            try:
+                await self._add_handle(curl)
+            except asyncio.CancelledError:
+                if curl in self._transfers:
+                    # 等待的任务被取消(如asyncio.wait_for超时)时传输还在multi中，先移除以中止传输，再归还curl对象
+                    self._remove_handle(curl, cancel=True)
+                raise
+            except pycurl.error:
+                if self.adaptive:
+                    self._observe(curl, True)
+                raise
+            if self.adaptive:
+                self._observe(curl, False)
+            host = self._acquired[curl][0]
+            latencies = self._latencies.get(host)
+            if latencies is None:
+                latencies = self._latencies[host] = deque(maxlen=self.latency_window)
+            latencies.append(curl.getinfo(pycurl.TOTAL_TIME))
             response.content = buffer.getvalue()
             response.http_code = curl.getinfo(pycurl.RESPONSE_CODE)
             response.effective_url = curl.getinfo(pycurl.EFFECTIVE_URL)
         finally:
-            await self._free_queue.put(curl)
+            self._release(curl)
         return response
 
-    async def get(self, url, **kwargs):
-        """发送GET请求"""
-        curl = await self._free_queue.get()
+    def _hedge_delay(self, url, hedge_after):
+        """hedge_after为秒数时直接使用，为'p95'这样的字符串时取该host最近请求耗时的百分位，样本不足时返回None(不对冲)"""
+        if not isinstance(hedge_after, str):
+            return hedge_after
+        latencies = self._latencies.get(urlsplit(url).netloc.lower())
+        if not latencies or len(latencies) < self.min_latency_samples:
+            return None
+        latencies = sorted(latencies)
+        index = int(len(latencies) * float(hedge_after.lstrip('pP')) / 100)
+        return latencies[min(index, len(latencies) - 1)]
+
+    async def _send(self, method, url, priority, queue, deadline, kwargs):
+        """取得curl对象发送一次请求，
+        有deadline时剩余的时间作为整个传输(连接和收发)的超时，到期抛出asyncio.TimeoutError"""
+        curl = await self._acquire(url, priority, deadline, kwargs.get('proxy_url') or self.proxy_url, queue)
         buffer = BytesIO()
         response = Response()
-        self._curl_setup_request(curl, url, response.headers, buffer, "GET", **kwargs)
-        return await self._finish(curl, response, buffer)
+        try:
+            self._curl_setup_request(curl, url, response.headers, buffer, method, **kwargs)
+            curl.setopt(pycurl.TIMEOUT_MS, 0 if deadline is None else max(1, math.ceil((deadline - time.monotonic()) * 1000)))
+        except BaseException:
+            self._release(curl)
+            raise
+        try:
+            return await self._finish(curl, response, buffer)
+        except pycurl.error as e:
+            # 连接超时(timeout参数)等早于deadline的超时仍然抛出pycurl.error
+            if e.args[0] == pycurl.E_OPERATION_TIMEDOUT and deadline is not None and time.monotonic() >= deadline - 0.001:
+                raise asyncio.TimeoutError('deadline exceeded during transfer') from e
+            raise
+
+    async def _attempt(self, method, url, priority, queue, deadline, kwargs):
+        """发送一次请求，有熔断器时先检查host的状态(打开时不排队等待curl对象)，再把结果计入统计，
+        取消和超过deadline不计入"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return await self._send(method, url, priority, queue, deadline, kwargs)
+        host = urlsplit(url).netloc.lower()
+        probe = breaker.check(host)
+        failed = None
+        try:
+            response = await self._send(method, url, priority, queue, deadline, kwargs)
+            failed = breaker.failed(response=response)
+            return response
+        except pycurl.error as e:
+            failed = breaker.failed(error=e)
+            raise
+        finally:
+            breaker.record(host, probe, failed)
+
+    async def _request(self, method, url, priority, queue, deadline, retry, kwargs, started=False):
+        """发送请求并按重试策略重试，retry为None时使用客户端的策略，False不重试，started为True时已经计入了重试预算；
+        重试前的等待由事件循环的定时器完成，期间不占用curl对象，等待后会超过deadline时不再重试"""
+        retry = self.retry if retry is None else retry or None
+        if retry is not None and not started:
+            retry.start()
+        attempt = 0
+        while True:
+            try:
+                response = await self._attempt(method, url, priority, queue, deadline, kwargs)
+            except pycurl.error as e:
+                delay = None if retry is None else retry.delay(method, attempt, error=e)
+                if delay is None or deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+            else:
+                delay = None if retry is None else retry.delay(method, attempt, response=response)
+                if delay is None or deadline is not None and time.monotonic() + delay >= deadline:
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _hedge(self, method, url, priority, queue, deadline, retry, hedge_after, kwargs):
+        """请求在hedge_after之后仍未完成时用另一个curl对象再发一次，采用先成功的结果并取消另一个，
+        两次都失败时抛出先发出的请求的异常；两次只算一个请求计入重试预算"""
+        delay = self._hedge_delay(url, hedge_after)
+        policy = self.retry if retry is None else retry or None
+        if policy is not None:
+            policy.start()
+        stats = self._get_host_stats(urlsplit(url).netloc.lower())
+        attempts = []
+        errors = []
+
+        def launch():
+            task = asyncio.ensure_future(self._request(method, url, priority, queue, deadline, retry, kwargs,
+                                                       started=True))
+            attempts.append(task)
+            return task
+
+        pending = {launch()}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                stats['hedged'] += 1
+                pending.add(launch())
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not attempts[0]:
+                            stats['hedge_won'] += 1
+                        return task.result()
+                    errors.append(task)
+                if not pending:
+                    errors.sort(key=lambda task: task is not attempts[0])
+                    raise errors[0].exception()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # 传输中的请求被取消时由_finish先从multi中移除curl对象再归还，等待重试或curl对象的请求直接结束
+            losers = [task for task in attempts if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                # 等被取消的请求归还curl对象
+                await asyncio.wait(losers)
+
+    async def _coalesce(self, method, url, deadline, retry, kwargs, send):
+        """相同的请求正在进行时等待它的结果，否则用send()发出不带deadline的请求；各自的deadline只限制自己的等待，
+        等待的协程都已取消或超时后取消进行中的请求"""
+        key = _coalesce_key(method, url, retry, kwargs, self.coalesce_headers)
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = [asyncio.ensure_future(send()), 0]
+
+            def done(_):
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight[0].add_done_callback(done)
+        else:
+            self._get_host_stats(urlsplit(url).netloc.lower())['coalesced'] += 1
+        task = flight[0]
+        flight[1] += 1
+        try:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        finally:
+            flight[1] -= 1
+            if not flight[1] and not task.done():
+                # 先移除，取消完成之前到来的相同请求发出新的请求，不会等到被取消的结果
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                task.cancel()
+
+    async def get(self, url, priority=0, deadline=None, hedge_after=None, retry=None, coalesce=None, queue='default',
+                  **kwargs):
+        """发送GET请求，priority 等待curl对象时的优先级，越小越先分配，
+        deadline time.monotonic()的截止时间，包括等待curl对象、建立连接和传输，到期时放弃请求并抛出asyncio.TimeoutError，
+        hedge_after 对冲请求的延迟：秒数，或'p95'这样按该host最近请求耗时的百分位，超过后用另一个curl对象再发一次，
+        采用先完成的结果并取消另一个，retry 覆盖客户端的重试策略，False不重试，coalesce 覆盖客户端的合并请求设置，
+        queue 等待curl对象时所在的命名队列"""
+        if coalesce or coalesce is None and self.coalesce:
+            return await self._coalesce("GET", url, deadline, retry, kwargs, lambda: self.get(
+                url, priority, None, hedge_after, retry, False, queue, **kwargs))
+        if hedge_after is not None:
+            return await self._hedge("GET", url, priority, queue, deadline, retry, hedge_after, kwargs)
+        return await self._request("GET", url, priority, queue, deadline, retry, kwargs)
+
+    async def post(self, url, priority=0, deadline=None, retry=None, queue='default', **kwargs):
+        """发送POST请求，priority、deadline、retry和queue同get"""
+        return await self._request("POST", url, priority, queue, deadline, retry, kwargs)
+
+    async def put(self, url, priority=0, deadline=None, retry=None, queue='default', **kwargs):
+        """发送PUT请求，priority、deadline、retry和queue同get"""
+        return await self._request("PUT", url, priority, queue, deadline, retry, kwargs)
+
+    async def head(self, url, priority=0, deadline=None, retry=None, coalesce=None, queue='default', **kwargs):
+        """发送HEAD请求，priority、deadline、retry、coalesce和queue同get"""
+        if coalesce or coalesce is None and self.coalesce:
+            return await self._coalesce("HEAD", url, deadline, retry, kwargs, lambda: self.head(
+                url, priority, None, retry, False, queue, **kwargs))
+        return await self._request("HEAD", url, priority, queue, deadline, retry, kwargs)
+
+    async def options(self, url, priority=0, deadline=None, retry=None, queue='default', **kwargs):
+        """发送OPTIONS请求，priority、deadline、retry和queue同get"""
+        return await self._request("OPTIONS", url, priority, queue, deadline, retry, kwargs)
+
+    async def patch(self, url, priority=0, deadline=None, retry=None, queue='default', **kwargs):
+        """发送PATCH请求，priority、deadline、retry和queue同get"""
+        return await self._request("PATCH", url, priority, queue, deadline, retry, kwargs)
+
+    async def delete(self, url, priority=0, deadline=None, retry=None, queue='default', **kwargs):
+        """发送DELETE请求，priority、deadline、retry和queue同get"""
+        return await self._request("DELETE", url, priority, queue, deadline, retry, kwargs)
+
+
+
+class RequestAsyncSharded(object):
+    """多事件循环的异步http请求客户端，每个分片在独立线程中运行自己的事件循环和RequestAsync，
+    请求按host一致性哈希分配到分片，同一host的连接复用不受影响
+         样例：
+         http = await RequestAsyncSharded.create(shards=4)
+         response = await http.get(url)
+         """
+    # 每个分片在哈希环上的虚拟节点数
+    replicas = 64
+
+    @classmethod
+    async def create(cls, shards=4, max_clients=5, target='chrome110', default_headers=1, enable_cookie=False,
+                     cookie_path='', **kwargs):
+        """启动shards个事件循环线程，每个线程生成max_clients个curl对象，所有分片通过同一个CurlShare共享cookie/dns/ssl会话，
+        其余参数同RequestAsync.create，连接策略参数(pipelining等)原样传给每个分片，
+        带宽上限(max_recv_speed/max_send_speed)由所有分片共用同一组令牌桶，空闲分片的带宽可以被其他分片使用"""
+        self = RequestAsyncSharded()
+        bandwidth = _bandwidth_limits(kwargs.pop('max_recv_speed', None), kwargs.pop('max_send_speed', None))
+        for index in range(shards):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='pycurl-shard-%d' % index, daemon=True)
+            thread.start()
+            client = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                RequestAsync.create(max_clients=max_clients, target=target, default_headers=default_headers,
+                                    enable_cookie=enable_cookie, cookie_path=cookie_path, share=self._share,
+                                    bandwidth=bandwidth, **kwargs),
+                loop))
+            self._shards.append((loop, thread, client))
+            for replica in range(self.replicas):
+                self._ring.append((zlib.crc32(b'%d-%d' % (index, replica)), index))
+        self._ring.sort()
+        self._ring_keys = [key for key, _ in self._ring]
+        return self
+
+    def __init__(self):
+        self._share = pycurl.CurlShare()
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_COOKIE)
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        self._shards = []
+        self._ring = []
+        self._ring_keys = []
+
+    def _get_shard(self, url):
+        """根据url的host在哈希环上找到对应的分片"""
+        key = zlib.crc32(urlsplit(url).netloc.lower().encode('utf-8'))
+        index = bisect.bisect(self._ring_keys, key) % len(self._ring)
+        return self._shards[self._ring[index][1]]
+
+    async def _request(self, method, url, **kwargs):
+        """在分片的事件循环中发送请求，并在调用方的事件循环中等待结果"""
+        loop, _, client = self._get_shard(url)
+        future = asyncio.run_coroutine_threadsafe(getattr(client, method)(url, **kwargs), loop)
+        return await asyncio.wrap_future(future)
+
+    async def close(self):
+        """释放所有分片的curl对象并停止事件循环线程，在调用方的事件循环中等待各分片关闭"""
+        for loop, thread, client in self._shards:
+            if loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._close_shard(client), loop))
+                loop.call_soon_threadsafe(loop.stop)
+                await asyncio.get_running_loop().run_in_executor(None, thread.join)
+            loop.close()
+        self._shards = []
+        self._share.close()
+
+    @staticmethod
+    async def _close_shard(client):
+        client.close()
+
+    async def get(self, url, **kwargs):
+        """发送GET请求"""
+        return await self._request('get', url, **kwargs)
 
     async def post(self, url, **kwargs):
         """发送POST请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "POST", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('post', url, **kwargs)
 
     async def put(self, url, **kwargs):
         """发送PUT请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "PUT", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('put', url, **kwargs)
 
     async def head(self, url, **kwargs):
         """发送HEAD请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "HEAD", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('head', url, **kwargs)
 
     async def options(self, url, **kwargs):
         """发送OPTIONS请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "OPTIONS", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('options', url, **kwargs)
 
     async def patch(self, url, **kwargs):
         """发送PATCH请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "PATCH", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('patch', url, **kwargs)
 
     async def delete(self, url, **kwargs):
         """发送DELETE请求"""
-        curl = await self._free_queue.get()
-        response = Response()
-        buffer = BytesIO()
-        self._curl_setup_request(curl, url, response.headers, buffer, "DELETE", **kwargs)
-        return await self._finish(curl, response, buffer)
+        return await self._request('delete', url, **kwargs)
+
+
+def _dump_response(response, shm_threshold):
+    """把Response转换为可跨进程传递的元组，较大的响应体写入共享内存，只传递共享内存的名字和长度"""
+    content = response.content
+    if shm_threshold is not None and len(content) >= shm_threshold:
+        shm = shared_memory.SharedMemory(create=True, size=len(content))
+        shm.buf[:len(content)] = content
+        content = (shm.name, len(content))
+        shm.close()
+    return response.headers, content, response.http_code, response.effective_url
+
+
+def _load_response(data):
+    """从_dump_response的结果还原Response，并释放共享内存"""
+    response = Response()
+    response.headers, content, response.http_code, response.effective_url = data
+    if isinstance(content, tuple):
+        name, size = content
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            content = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+    response.content = content
+    return response
+
+
+async def _worker_request(client, task, results, slots, shm_threshold):
+    """在子进程中发送一个请求，把结果放入结果队列"""
+    task_id, method, url, kwargs = task
+    try:
+        response = await getattr(client, method)(url, **kwargs)
+        result = (task_id, None, _dump_response(response, shm_threshold))
+    except Exception as e:
+        result = (task_id, e, None)
+    finally:
+        slots.release()
+    results.put(result)
+
+
+async def _worker_loop(tasks, results, options, shm_threshold):
+    """子进程的事件循环，最多同时处理max_clients个请求，处理不过来的请求留在任务队列中"""
+    client = await RequestAsync.create(**options)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(options['max_clients'])
+    running = set()
+    while True:
+        await slots.acquire()
+        task = await loop.run_in_executor(None, tasks.get)
+        if task is None:
+            break
+        request = loop.create_task(_worker_request(client, task, results, slots, shm_threshold))
+        running.add(request)
+        request.add_done_callback(running.discard)
+    if running:
+        await asyncio.wait(running)
+    client.close()
+
+
+def _worker_main(tasks, results, options, shm_threshold):
+    """子进程入口"""
+    asyncio.run(_worker_loop(tasks, results, options, shm_threshold))
+
+
+class RequestProcessPool(object):
+    """多进程使用的http请求客户端，每个子进程运行一个RequestAsync，
+    大于shm_threshold字节的响应体通过共享内存传回主进程，避免pickle复制，
+    Windows的共享内存在创建它的进程关闭句柄后就会被释放，所以Windows下响应体仍通过队列传递
+         样例：
+         pool = RequestProcessPool(workers=4)
+         response = pool.submit('get', url).result()
+         for response in pool.map(urls):
+             ...
+         pool.close()
+         """
+    def __init__(self, workers=None, max_clients=5, target='chrome110', default_headers=1, max_pending=None,
+                 start_method=None, shm_threshold=64 * 1024, **kwargs):
+        """workers 子进程数量，默认为cpu核数, max_clients 每个子进程的curl对象数量,
+        max_pending 未完成的请求上限，超过时submit会阻塞, start_method 进程启动方式(fork/spawn/forkserver),
+        shm_threshold 使用共享内存传递响应体的最小字节数，None表示不使用共享内存，
+        其余参数原样传给每个子进程的RequestAsync.create(需要可以pickle)，不支持的参数直接抛出TypeError；
+        每个子进程有自己的任务队列，请求交给未完成请求最少的子进程，子进程异常退出时其上未完成的请求以BrokenProcessPool结束"""
+        options = dict(kwargs, max_clients=max_clients, target=target, default_headers=default_headers)
+        inspect.signature(RequestAsync.create).bind(**options)
+        ctx = multiprocessing.get_context(start_method)
+        if os.name == 'nt':
+            shm_threshold = None
+        else:
+            # 子进程沿用主进程的resource_tracker，共享内存由主进程unlink后不会被误报为泄漏
+            resource_tracker.ensure_running()
+        workers = workers or multiprocessing.cpu_count()
+        self.max_pending = max_pending or workers * max_clients * 2
+        self._results = ctx.Queue()
+        # 未完成的请求，task_id -> (Future, 子进程序号)
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # 每个子进程的任务队列和未完成的请求数
+        self._tasks = [ctx.Queue() for _ in range(workers)]
+        self._pending = [0] * workers
+        self._alive = set(range(workers))
+        self._processes = [ctx.Process(target=_worker_main, daemon=True,
+                                       args=(tasks, self._results, options, shm_threshold))
+                           for tasks in self._tasks]
+        for process in self._processes:
+            process.start()
+        self._collector = threading.Thread(target=self._collect, name='pycurl-pool-collector', daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name='pycurl-pool-monitor', daemon=True)
+        self._monitor.start()
+
+    def _collect(self):
+        """接收子进程返回的结果，完成对应的Future"""
+        while True:
+            result = self._results.get()
+            if result is None:
+                break
+            task_id, exception, data = result
+            with self._lock:
+                entry = self._futures.pop(task_id, None)
+                if entry is not None:
+                    self._pending[entry[1]] -= 1
+                    self._cond.notify()
+            if entry is None:
+                # 子进程异常退出后才收到的结果，Future已经以BrokenProcessPool结束，只释放共享内存
+                if data is not None:
+                    _load_response(data)
+                continue
+            future = entry[0]
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                try:
+                    future.set_result(_load_response(data))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _watch(self):
+        """等待子进程退出，异常退出(退出码不为0)的子进程上未完成的请求以BrokenProcessPool结束，
+        正常退出的子进程已经把结果都放入了结果队列"""
+        sentinels = {process.sentinel: index for index, process in enumerate(self._processes)}
+        while sentinels:
+            for sentinel in wait_processes(list(sentinels)):
+                index = sentinels.pop(sentinel)
+                process = self._processes[index]
+                process.join()
+                lost = []
+                with self._lock:
+                    self._alive.discard(index)
+                    if process.exitcode != 0:
+                        lost = [task_id for task_id, (_, worker) in self._futures.items() if worker == index]
+                        lost = [self._futures.pop(task_id)[0] for task_id in lost]
+                        self._pending[index] = 0
+                    self._cond.notify_all()
+                for future in lost:
+                    future.set_exception(BrokenProcessPool(
+                        'worker process %d exited with code %s' % (process.pid, process.exitcode)))
+
+    def submit(self, method, url, **kwargs):
+        """提交请求，返回concurrent.futures.Future，method为get/post等RequestAsync的方法名，
+        未完成的请求达到max_pending时阻塞，子进程都已退出时抛出BrokenProcessPool"""
+        future = Future()
+        with self._cond:
+            while self._alive and len(self._futures) >= self.max_pending:
+                self._cond.wait()
+            if not self._alive:
+                raise BrokenProcessPool('all worker processes have exited')
+            worker = min(self._alive, key=self._pending.__getitem__)
+            task_id = next(self._ids)
+            self._futures[task_id] = (future, worker)
+            self._pending[worker] += 1
+            self._tasks[worker].put((task_id, method, url, kwargs))
+        return future
 
+    def map(self, urls, method='get', ordered=True, **kwargs):
+        """批量发送请求并逐个返回Response，ordered为True时按urls的顺序返回，否则按完成顺序返回，
+        同时在途的请求不超过max_pending"""
+        if ordered:
+            pending = deque()
+            for url in urls:
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().result()
+                pending.append(self.submit(method, url, **kwargs))
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for url in urls:
+                if len(pending) >= self.max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(self.submit(method, url, **kwargs))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def close(self, timeout=30):
+        """等待已提交的请求完成后停止子进程，最多等待timeout秒(None为一直等待)，
+        超时后终止仍在运行的子进程，其上未完成的请求以BrokenProcessPool结束"""
+        with self._lock:
+            alive = list(self._alive)
+        for index in alive:
+            self._tasks[index].put(None)
+        end = None if timeout is None else time.monotonic() + timeout
+        for process in self._processes:
+            process.join(None if end is None else max(0, end - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._monitor.join()
+        self._results.put(None)
+        self._collector.join()